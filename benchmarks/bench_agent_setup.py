@@ -0,0 +1,113 @@
+# ruff: noqa: T201
+"""
+Measures the per call overhead of InvoiceService against a local OpenAI compatible stub, comparing agents built
+for every request (the old behaviour) with agents built once at start up.
+
+Usage: python -m benchmarks.bench_agent_setup --calls 200 --concurrency 1 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from service.invoice import InvoiceService
+from service.invoice.service import InvoiceSeviceConfig
+from service.pdf2img import PdfPage
+
+COMPLETION = json.dumps(
+    {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "bench",
+        "choices": [
+            {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "INVOICE No. 1"}}
+        ],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+).encode()
+
+
+class StubServer:
+    """Minimal HTTP/1.1 keep-alive server answering every request with the same chat completion."""
+
+    def __init__(self) -> None:
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while header := await reader.readuntil(b"\r\n\r\n"):
+                length = 0
+                for line in header.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(COMPLETION)}\r\n\r\n".encode()
+                    + COMPLETION
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _call(page: PdfPage, rebuild: bool) -> None:
+    if rebuild:
+        # what every request used to do before the agents moved to start up
+        InvoiceService.setup_agents()
+    await InvoiceService._get_agent1_response(page)  # noqa: SLF001
+
+
+async def _run(calls: int, concurrency: int, rebuild: bool) -> tuple[float, int]:
+    stub = StubServer()
+    server = await asyncio.start_server(stub.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    InvoiceService.set_config(
+        InvoiceSeviceConfig(model1_name="bench", model2_name="bench", max_concurrent_request=concurrency)
+    )
+    InvoiceService.setup_agents()
+    page = PdfPage(page_no=1, data=b"\x89PNG\r\n\x1a\n" + bytes(64 * 1024))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded() -> None:
+        async with semaphore:
+            await _call(page, rebuild)
+
+    await _call(page, rebuild)  # warm up imports and the first connection
+    start_time = time.perf_counter()
+    await asyncio.gather(*(bounded() for _ in range(calls)))
+    elapsed = time.perf_counter() - start_time
+    await InvoiceService.shutdown()
+    server.close()
+    await server.wait_closed()
+    return elapsed, stub.connections
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    print(f"{'mode':>10} {'concurrency':>12} {'ms/call':>10} {'connections':>12}")
+    for concurrency in args.concurrency:
+        for mode, rebuild in (("per-call", True), ("prebuilt", False)):
+            elapsed, connections = asyncio.run(_run(args.calls, concurrency, rebuild))
+            print(f"{mode:>10} {concurrency:>12} {elapsed * 1000 / args.calls:>10.2f} {connections:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# ruff: noqa: T201
+"""
+Measures bytes per page and encode time of each page image encoding on rendered synthetic invoices, once as
+rendered (born-digital) and once with scanner noise added.
+
+Usage: python -m benchmarks.bench_page_encoding --pages 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from pdf2image import convert_from_path
+from PIL import Image as PILImage
+from PIL.Image import Image
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from service.image_encoding import ImageEncoding, encode_image
+from service.pdf2img import RENDER_DPI, fit_image
+
+from .synthetic import make_invoice_pdf
+
+ENCODINGS = {
+    "png": ImageEncoding(),
+    "png optimize": ImageEncoding(optimize=True),
+    "png gray": ImageEncoding(grayscale=True),
+    "png palette 16": ImageEncoding(palette_colors=16),
+    "png gray palette 16": ImageEncoding(grayscale=True, palette_colors=16),
+    "jpeg q85": ImageEncoding(fmt="jpeg", quality=85),
+    "jpeg q70 gray": ImageEncoding(fmt="jpeg", quality=70, grayscale=True),
+    "webp q80": ImageEncoding(fmt="webp", quality=80),
+    "webp q80 gray": ImageEncoding(fmt="webp", quality=80, grayscale=True),
+}
+
+
+def _scanned(image: Image, rng: np.random.Generator) -> Image:
+    pixels = np.asarray(image, dtype=np.int16) + rng.normal(0, 10, (image.height, image.width, 1)).astype(np.int16)
+    return PILImage.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).rotate(0.5, fillcolor=(255, 255, 255))
+
+
+def _measure(images: list[Image], encoding: ImageEncoding) -> tuple[float, float]:
+    total_bytes, start_time = 0, time.perf_counter()
+    for image in images:
+        total_bytes += len(encode_image(image, encoding))
+    elapsed = time.perf_counter() - start_time
+    return total_bytes / len(images) / 1024, elapsed * 1000 / len(images)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--max-size", type=int, default=1120)
+    parser.add_argument("--poppler-path", default=os.getenv("POPPLER_PATH") or None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_encoding_") as work_dir:
+        pdf_path = make_invoice_pdf(Path(work_dir) / "synthetic.pdf", args.pages)
+        rendered = convert_from_path(pdf_path, dpi=RENDER_DPI, poppler_path=args.poppler_path)
+    digital = [fit_image(image, args.max_size, args.max_size) for image in rendered]
+    rng = np.random.default_rng(0)
+    samples = {"digital": digital, "scanned": [_scanned(image, rng) for image in digital]}
+
+    print(f"{'encoding':>20} {'sample':>8} {'KB/page':>9} {'ms/page':>9}")
+    for name, encoding in ENCODINGS.items():
+        for sample, images in samples.items():
+            kb_per_page, ms_per_page = _measure(images, encoding)
+            print(f"{name:>20} {sample:>8} {kb_per_page:>9.1f} {ms_per_page:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
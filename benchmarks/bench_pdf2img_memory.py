@@ -0,0 +1,65 @@
+# ruff: noqa: T201
+"""
+Measures the peak RSS of Pdf2ImgService.convert on a large synthetic PDF for different
+PDF2IMG_MAX_PAGES_IN_MEMORY windows, each run happens in a fresh process.
+
+Usage: python -m benchmarks.bench_pdf2img_memory --pages 300 --windows 0 1 4 16
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from .synthetic import make_invoice_pdf
+
+
+def _convert_once(pdf_path: Path, output_path: Path, window: int, poppler_path: str | None, result: dict) -> None:
+    from service.pdf2img import Pdf2ImgConfig, Pdf2ImgService
+
+    Pdf2ImgService.set_config(
+        Pdf2ImgConfig(poppler_path=poppler_path, output_path=output_path, max_pages_in_memory=window)
+    )
+    start_time = time.perf_counter()
+    asyncio.run(Pdf2ImgService.convert(pdf_path))
+    result["seconds"] = time.perf_counter() - start_time
+    # ru_maxrss is reported in kilobytes on linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--windows", type=int, nargs="+", default=[0, 1, 4, 16])
+    parser.add_argument("--poppler-path", default=os.getenv("POPPLER_PATH") or None)
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_pdf2img_mem_"))
+    context = multiprocessing.get_context("spawn")
+    try:
+        pdf_path = make_invoice_pdf(work_dir / "synthetic.pdf", args.pages)
+        print(f"{'window':>8} {'seconds':>10} {'peak MB':>10}")
+        with context.Manager() as manager:
+            for window in args.windows:
+                result = manager.dict()
+                process = context.Process(
+                    target=_convert_once,
+                    args=(pdf_path, work_dir / f"out_{window}", window, args.poppler_path, result),
+                )
+                process.start()
+                process.join()
+                print(f"{window:>8} {result['seconds']:>10.3f} {result['peak_rss_mb']:>10.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# ruff: noqa: T201
+"""
+Measures pages/sec of Pdf2ImgService.convert as the number of render workers grows.
+
+Usage: python -m benchmarks.bench_pdf2img_parallel --pages 80 --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from service.executors import ExecutorConfig, ExecutorService
+from service.pdf2img import Pdf2ImgConfig, Pdf2ImgService
+
+from .synthetic import make_invoice_pdf
+
+
+async def _run(pdf_path: Path, output_path: Path, worker_count: int, poppler_path: str | None) -> float:
+    Pdf2ImgService.set_config(
+        Pdf2ImgConfig(poppler_path=poppler_path, output_path=output_path, worker_count=worker_count)
+    )
+    ExecutorService.set_config(ExecutorConfig(process_workers=worker_count))
+    if worker_count > 1:
+        # spawn the workers up front so their start up is not part of the measurement
+        await asyncio.gather(*(ExecutorService.run_cpu(os.getpid) for _ in range(worker_count)))
+    start_time = time.perf_counter()
+    await Pdf2ImgService.convert(pdf_path)
+    elapsed = time.perf_counter() - start_time
+    await ExecutorService.shutdown()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=80)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--poppler-path", default=os.getenv("POPPLER_PATH") or None)
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_pdf2img_"))
+    try:
+        pdf_path = make_invoice_pdf(work_dir / "synthetic.pdf", args.pages)
+        print(f"{'workers':>8} {'seconds':>10} {'pages/sec':>10}")
+        for worker_count in sorted(set(args.workers)):
+            elapsed = asyncio.run(_run(pdf_path, work_dir / f"out_{worker_count}", worker_count, args.poppler_path))
+            print(f"{worker_count:>8} {elapsed:>10.3f} {args.pages / elapsed:>10.2f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
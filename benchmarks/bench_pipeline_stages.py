@@ -0,0 +1,167 @@
+# ruff: noqa: T201
+"""
+Times every stage of the document pipeline on its own against a synthetic invoice PDF and writes the
+results as JSON, so runs can be compared over time. --noise 0 generates a born-digital text PDF, any
+other value a scanned PDF with that much gaussian noise.
+
+Usage: python -m benchmarks.bench_pipeline_stages --pages 10 --rows 40 --noise 0 --repeat 3 --output stages.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from pdf2image import convert_from_path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from service.invoice import Invoice, InvoiceData
+from service.invoice.utility import image_to_byte_string, sorted_images
+from service.pdf2img import RENDER_DPI, Pdf2ImgConfig, Pdf2ImgService
+
+from .synthetic import make_invoice_pdf, make_scanned_pdf
+
+
+def _timed(stage: Callable[[], Any], repeat: int, items: int) -> dict:
+    seconds = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        stage()
+        seconds.append(time.perf_counter() - start_time)
+    return {
+        "runs": repeat,
+        "items": items,
+        "min_seconds": round(min(seconds), 6),
+        "median_seconds": round(statistics.median(seconds), 6),
+        "mean_seconds": round(statistics.fmean(seconds), 6),
+        "per_item_ms": round(min(seconds) * 1000 / max(items, 1), 3),
+    }
+
+
+def _invoice_data(pages: int, rows: int) -> dict:
+    return InvoiceData(
+        details=[
+            Invoice(
+                invoice_number=f"SYN-{page_no:05}",
+                invoice_date="21-MAR-2022",
+                items=[
+                    {"slno": row + 1, "description": f"FREIGHT CHARGE LINE {row + 1}", "price": f"{row * 125.5:.2f}"}
+                    for row in range(rows)
+                ],
+                total_amount=sum(row * 125.5 for row in range(rows)),
+                page_no=page_no,
+            )
+            for page_no in range(1, pages + 1)
+        ]
+    ).model_dump()
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(  # noqa: S603
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stages(work_dir: Path, args: argparse.Namespace) -> dict:
+    pdf_path = work_dir / "synthetic.pdf"
+    if args.noise > 0:
+        make_scanned_pdf(pdf_path, args.pages, rows=args.rows, noise=args.noise)
+    else:
+        make_invoice_pdf(pdf_path, args.pages, rows=args.rows)
+    output_folder = work_dir / "pages"
+    output_folder.mkdir()
+    Pdf2ImgService.set_config(Pdf2ImgConfig(poppler_path=args.poppler_path, output_path=work_dir))
+    stages = {}
+
+    images = []
+
+    def convert() -> None:
+        images[:] = convert_from_path(pdf_path, dpi=RENDER_DPI, poppler_path=args.poppler_path)
+
+    stages["convert_from_path"] = _timed(convert, args.repeat, args.pages)
+
+    async def resize_and_save() -> None:
+        for page_no, image in enumerate(images, start=1):
+            await Pdf2ImgService._resize_and_save(image, output_folder / f"Page_{page_no:02}.png")  # noqa: SLF001
+
+    stages["_resize_and_save"] = _timed(lambda: asyncio.run(resize_and_save()), args.repeat, args.pages)
+    image_paths = sorted(output_folder.glob("*.png"))
+
+    def to_byte_strings() -> None:
+        for image_path in image_paths:
+            image_to_byte_string(image_path)
+
+    stages["image_to_byte_string"] = _timed(to_byte_strings, args.repeat, args.pages)
+
+    async def list_images() -> None:
+        async for _ in sorted_images(output_folder):
+            pass
+
+    stages["sorted_images"] = _timed(lambda: asyncio.run(list_images()), args.repeat, args.pages)
+
+    payload = _invoice_data(args.pages, args.rows)
+    payload_json = json.dumps(payload)
+    invoice_data = InvoiceData.model_validate(payload)
+    stages["InvoiceData.model_validate"] = _timed(lambda: InvoiceData.model_validate(payload), args.repeat, args.pages)
+    stages["InvoiceData.model_validate_json"] = _timed(
+        lambda: InvoiceData.model_validate_json(payload_json), args.repeat, args.pages
+    )
+    stages["InvoiceData.model_dump_json"] = _timed(invoice_data.model_dump_json, args.repeat, args.pages)
+    invoices = invoice_data.details
+    stages["Invoice.model_validate"] = _timed(
+        lambda: [Invoice.model_validate(invoice) for invoice in payload["details"]], args.repeat, len(invoices)
+    )
+    stages["Invoice.model_dump_json"] = _timed(
+        lambda: [invoice.model_dump_json() for invoice in invoices], args.repeat, len(invoices)
+    )
+    return stages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=40, help="item lines per page, the text density")
+    parser.add_argument("--noise", type=float, default=0.0, help="scan noise, 0 generates a born-digital PDF")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=None, help="JSON file, printed to stdout when not given")
+    parser.add_argument("--poppler-path", default=os.getenv("POPPLER_PATH") or None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_stages_") as work_dir:
+        stages = run_stages(Path(work_dir), args)
+    report = {
+        "benchmark": "pipeline_stages",
+        "created_at": datetime.now(tz=timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"pages": args.pages, "rows": args.rows, "noise": args.noise, "repeat": args.repeat},
+        "stages": stages,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        args.output.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
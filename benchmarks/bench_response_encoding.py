@@ -0,0 +1,115 @@
+# ruff: noqa: T201
+"""
+Compares the /process response path that validate_response takes, dumping the InvoiceData to dicts and
+encoding them with the json module, against serializing it straight to JSON bytes with model_dump_json,
+both served through a Quart test client. Then measures size and time of every response compression.
+
+Usage: python -m benchmarks.bench_response_encoding --pages 100 --rows 20 --repeat 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from quart import Quart
+from quart_schema import QuartSchema, document_response, validate_response
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from blueprints.process import _model_response
+from library.extensions.compress_extn import CompressionExtension, brotli
+from service.invoice import Invoice, InvoiceData
+from service.invoice.schemas import Item
+
+LEVELS = [("gzip", 1), ("gzip", 6), ("gzip", 9)]
+if brotli is not None:
+    LEVELS += [("br", 1), ("br", 4), ("br", 11)]
+
+
+def _invoice_data(pages: int, rows: int) -> InvoiceData:
+    return InvoiceData(
+        details=[
+            Invoice(
+                invoice_number=f"SYN-{page_no:05}",
+                invoice_date="21-MAR-2022",
+                items=[
+                    Item(slno=row + 1, description=f"FREIGHT CHARGE LINE {row + 1}", price=f"{row * 125.5:.2f}")
+                    for row in range(rows)
+                ],
+                total_amount=sum(row * 125.5 for row in range(rows)),
+                page_no=page_no,
+            )
+            for page_no in range(1, pages + 1)
+        ]
+    )
+
+
+def _app(invoice_data: InvoiceData) -> Quart:
+    app = Quart(__name__)
+    QuartSchema(app)
+
+    @app.route("/validated")
+    @validate_response(InvoiceData, 201)
+    async def validated() -> tuple:
+        return invoice_data, 201
+
+    @app.route("/fast")
+    @document_response(InvoiceData, 201)
+    async def fast() -> object:
+        return _model_response(invoice_data, 201)
+
+    return app
+
+
+async def _serve(app: Quart, path: str, repeat: int) -> tuple[list[float], int]:
+    seconds, size = [], 0
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+        await client.get(path)
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            response = await client.get(path)
+            size = len(await response.get_data())
+            seconds.append(time.perf_counter() - start_time)
+    return seconds, size
+
+
+def _timed_encode(extension: CompressionExtension, data: bytes, encoding: str, repeat: int) -> tuple[float, int]:
+    seconds = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        compressed = extension.encode(data, encoding)
+        seconds.append(time.perf_counter() - start_time)
+    return min(seconds), len(compressed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=20, help="items per invoice")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    invoice_data = _invoice_data(args.pages, args.rows)
+    app = _app(invoice_data)
+    print(f"{'path':>12} {'KB':>9} {'min ms':>9} {'median ms':>10}")
+    for name, path in (("validated", "/validated"), ("fast", "/fast")):
+        seconds, size = asyncio.run(_serve(app, path, args.repeat))
+        print(f"{name:>12} {size / 1024:>9.1f} {min(seconds) * 1000:>9.2f} {statistics.median(seconds) * 1000:>10.2f}")
+
+    data = invoice_data.model_dump_json().encode()
+    print(f"\n{'encoding':>12} {'KB':>9} {'ratio':>9} {'ms':>9}")
+    for encoding, level in LEVELS:
+        extension = CompressionExtension()
+        extension.gzip_level = extension.brotli_quality = level
+        seconds, size = _timed_encode(extension, data, encoding, args.repeat)
+        print(f"{f'{encoding} {level}':>12} {size / 1024:>9.1f} {size / len(data):>9.3f} {seconds * 1000:>9.2f}")
+    if brotli is None:
+        print("brotli is not installed, only gzip was measured")
+
+
+if __name__ == "__main__":
+    main()
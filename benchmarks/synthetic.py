@@ -0,0 +1,118 @@
+import io
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+from PIL import Image as PILImage
+from PIL import ImageDraw
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US letter in points
+LINE_HEIGHT = 12  # points
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_lines(page_no: int, rows: int = 40) -> list[str]:
+    """rows item lines make up the text density, 40 rows fill a letter page."""
+    lines = [
+        f"INVOICE No. SYN-{page_no:05}",
+        "Seller: SYNTHETIC FREIGHT PVT LTD",
+        "Buyer: EXAMPLE TRADING LIMITED",
+        "",
+    ]
+    lines += [f"{row + 1:>3}  FREIGHT CHARGE LINE {row + 1:<20} {(row + 1) * 125.50:>10.2f} INR" for row in range(rows)]
+    lines.append(f"Total Amount: {sum((row + 1) * 125.50 for row in range(rows)):.2f}")
+    return lines
+
+
+def _content_stream(lines: list[str]) -> bytes:
+    ops = ["BT", "/F1 10 Tf", f"{LINE_HEIGHT} TL", f"50 {PAGE_HEIGHT - 60} Td"]
+    ops += [f"({_escape(line)}) '" for line in lines]
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def _scan_image(lines: list[str], noise: float, dpi: int, rng: np.random.Generator) -> bytes:
+    """The page as a slightly skewed grayscale scan with gaussian noise of standard deviation noise, as JPEG."""
+    scale = dpi / 72
+    image = PILImage.new("L", (int(PAGE_WIDTH * scale), int(PAGE_HEIGHT * scale)), 255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        draw.text((50 * scale, (60 + index * LINE_HEIGHT) * scale), line, fill=0, font_size=10 * scale)
+    image = image.rotate(0.4, fillcolor=255)
+    pixels = np.asarray(image, dtype=np.float32) + rng.normal(0, noise, (image.height, image.width))
+    buffer = io.BytesIO()
+    PILImage.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+# returns the page resources and content stream of a page, plus the image XObject it draws if any
+PageWriter = Callable[[int], tuple[str, bytes, bytes]]
+
+
+def _write_pdf(pdf_path: Path, page_count: int, page_writer: PageWriter) -> Path:
+    """Writes the PDF page by page, memory use does not grow with page_count."""
+    offsets: dict[int, int] = {}
+    with Path(pdf_path).open("wb") as pdf:
+
+        def write_object(obj_no: int, body: bytes) -> None:
+            offsets[obj_no] = pdf.tell()
+            pdf.write(f"{obj_no} 0 obj\n".encode() + body + b"\nendobj\n")
+
+        pdf.write(b"%PDF-1.4\n")
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>")
+        page_refs, next_obj = [], 4
+        for index in range(page_count):
+            resources, stream, image = page_writer(index + 1)
+            page_obj, content_obj, next_obj = next_obj, next_obj + 1, next_obj + 2
+            if image:
+                resources = f"{resources} /XObject << /Im1 {next_obj} 0 R >>"
+                write_object(next_obj, image)
+                next_obj += 1
+            write_object(
+                page_obj,
+                (
+                    f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                    f"/Resources << {resources} >> /Contents {content_obj} 0 R >>"
+                ).encode(),
+            )
+            write_object(content_obj, f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+            page_refs.append(f"{page_obj} 0 R")
+        write_object(2, f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {page_count} >>".encode())
+        xref_offset = pdf.tell()
+        pdf.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+        pdf.writelines(f"{offsets[obj_no]:010} 00000 n \n".encode() for obj_no in sorted(offsets))
+        pdf.write(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+    return pdf_path
+
+
+def make_invoice_pdf(pdf_path: Path, page_count: int, rows: int = 40) -> Path:
+    """Writes a born-digital, text only invoice PDF with rows item lines per page."""
+
+    def text_page(page_no: int) -> tuple[str, bytes, bytes]:
+        return "/Font << /F1 3 0 R >>", _content_stream(_page_lines(page_no, rows)), b""
+
+    return _write_pdf(pdf_path, page_count, text_page)
+
+
+def make_scanned_pdf(pdf_path: Path, page_count: int, rows: int = 40, noise: float = 10.0, dpi: int = 150) -> Path:
+    """Writes an image only invoice PDF, every page a noisy grayscale scan without text layer."""
+    rng = np.random.default_rng(0)
+
+    def scanned_page(page_no: int) -> tuple[str, bytes, bytes]:
+        jpeg = _scan_image(_page_lines(page_no, rows), noise, dpi, rng)
+        width, height = int(PAGE_WIDTH * dpi / 72), int(PAGE_HEIGHT * dpi / 72)
+        image = (
+            (
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceGray "
+                f"/BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>\nstream\n"
+            ).encode()
+            + jpeg
+            + b"\nendstream"
+        )
+        return "", f"q {PAGE_WIDTH} 0 0 {PAGE_HEIGHT} 0 0 cm /Im1 Do Q".encode(), image
+
+    return _write_pdf(pdf_path, page_count, scanned_page)
@@ -8,7 +8,7 @@ app = create_application()
 
 if __name__ == "__main__":
     # ruff: noqa: T201
-    from src.create_app import app_config
+    from configs import app_config
 
     if app_config.DEBUG:
         app.run(debug=True, host="127.0.0.1", port=5001, use_reloader=True)
@@ -1,3 +1,5 @@
+from .batch import bp as batch_bp
+from .jobs import bp as jobs_bp
 from .process import bp
 
-__all__ = ("bp",)
+__all__ = ("batch_bp", "bp", "jobs_bp")
@@ -0,0 +1,137 @@
+import logging
+import time
+from collections.abc import AsyncGenerator
+from typing import Literal, Optional, Union
+
+from pydantic import BaseModel
+from quart import Blueprint, Response, current_app, make_response, request
+from quart.datastructures import FileStorage
+from quart_schema import DataSource, document_response, validate_request
+from quart_schema.pydantic import File
+
+from service import AdmissionService, BatchService, IngestService, InvoiceData
+from service.batch import BatchDocument, total_usage
+from service.invoice.usage import DocumentUsageReport, UsageReport
+from service.metrics import UPLOAD_SAVE_SECONDS
+
+from .process import NDJSON_MIMETYPE, SSE_MIMETYPE, _encode_record, _model_response
+
+bp = Blueprint("batch", __name__, url_prefix="/batch")
+
+logger = logging.getLogger(__name__)
+
+bp.before_request(AdmissionService.check_capacity)
+bp.before_request(IngestService.prepare_batch_request)
+
+
+class BatchReqst(BaseModel):
+    # one part per document, a part named *.zip is an archive of documents
+    documents: Union[list[File], File]
+
+
+class BatchDocumentResult(BaseModel):
+    filename: str
+    status: Literal["COMPLETED", "FAILED"]
+    result: Optional[InvoiceData] = None
+    error: Optional[str] = None
+    elapsed_seconds: float
+    usage: DocumentUsageReport
+
+    @classmethod
+    def from_document(cls, document: BatchDocument) -> "BatchDocumentResult":
+        return BatchDocumentResult(
+            filename=document.document.filename,
+            status="FAILED" if document.error is not None else "COMPLETED",
+            result=document.result,
+            error=document.error,
+            elapsed_seconds=document.elapsed_seconds,
+            usage=document.usage.report(),
+        )
+
+
+class BatchResult(BaseModel):
+    # keyed by file name, in the order the documents completed
+    documents: dict[str, BatchDocumentResult]
+    document_count: int
+    failed_count: int
+    elapsed_seconds: float
+    usage: UsageReport
+
+
+class DocumentRecord(BatchDocumentResult):
+    type: Literal["document"] = "document"
+    name: str
+
+
+class BatchSummary(BaseModel):
+    type: Literal["summary"] = "summary"
+    document_count: int
+    failed_count: int
+    elapsed_seconds: float
+    usage: UsageReport
+
+
+def _uploads(data: BatchReqst) -> list[FileStorage]:
+    return data.documents if isinstance(data.documents, list) else [data.documents]
+
+
+@bp.route("/", methods=["POST"])
+@validate_request(BatchReqst, source=DataSource.FORM_MULTIPART)
+@document_response(BatchResult, 201)
+async def post(data: BatchReqst) -> Response:
+    """
+    Processes several documents, uploaded as documents parts or as a ZIP archive, side by side and returns
+    the results of all of them keyed by file name.
+    """
+    start_time = time.perf_counter()
+    with UPLOAD_SAVE_SECONDS.time():
+        batch = await BatchService.ingest(_uploads(data))
+    logger.info(f"Batch of {len(batch.documents)} documents uploaded ...")
+    try:
+        completed = [document async for document in BatchService.iter_documents(batch.documents)]
+    finally:
+        current_app.add_background_task(BatchService.cleanup, batch)
+    result = BatchResult(
+        documents={document.name: BatchDocumentResult.from_document(document) for document in completed},
+        document_count=len(completed),
+        failed_count=sum(document.error is not None for document in completed),
+        elapsed_seconds=round(time.perf_counter() - start_time, 3),
+        usage=total_usage(completed),
+    )
+    return _model_response(result, 201)
+
+
+@bp.route("/stream", methods=["POST"])
+@validate_request(BatchReqst, source=DataSource.FORM_MULTIPART)
+async def post_stream(data: BatchReqst) -> Response:
+    """
+    Streams every document's result as soon as it completes, as NDJSON or as server-sent events when the
+    client accepts text/event-stream, followed by a summary record.
+    """
+    start_time = time.perf_counter()
+    with UPLOAD_SAVE_SECONDS.time():
+        batch = await BatchService.ingest(_uploads(data))
+    logger.info(f"Batch of {len(batch.documents)} documents uploaded ...")
+    mimetype = request.accept_mimetypes.best_match([NDJSON_MIMETYPE, SSE_MIMETYPE], default=NDJSON_MIMETYPE)
+
+    async def records() -> AsyncGenerator[bytes, None]:
+        completed: list[BatchDocument] = []
+        try:
+            async for document in BatchService.iter_documents(batch.documents):
+                completed.append(document)
+                record = DocumentRecord(name=document.name, **dict(BatchDocumentResult.from_document(document)))
+                yield _encode_record(record, mimetype)
+            summary = BatchSummary(
+                document_count=len(completed),
+                failed_count=sum(document.error is not None for document in completed),
+                elapsed_seconds=round(time.perf_counter() - start_time, 3),
+                usage=total_usage(completed),
+            )
+            yield _encode_record(summary, mimetype)
+        finally:
+            await BatchService.cleanup(batch)
+
+    response = await make_response(records(), 200, {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.mimetype = mimetype
+    response.timeout = None
+    return response
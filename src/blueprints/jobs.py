@@ -0,0 +1,106 @@
+import logging
+from datetime import datetime
+from typing import Optional, Union
+
+from pydantic import BaseModel
+from quart import Blueprint, Response, abort, url_for
+from quart_schema import DataSource, document_response, validate_request, validate_response
+
+from service import IngestService, InvoiceData, JobService
+from service.invoice.usage import DocumentUsageReport
+from service.jobs import Job, JobStatus, PageStatus
+from service.metrics import UPLOAD_SAVE_SECONDS
+
+from .process import Reqst, _model_response
+
+bp = Blueprint("jobs", __name__, url_prefix="/jobs")
+
+logger = logging.getLogger(__name__)
+
+bp.before_request(IngestService.prepare_request)
+
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: JobStatus
+    status_url: str
+
+
+class JobInfo(BaseModel):
+    job_id: str
+    filename: str
+    status: JobStatus
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    page_count: Optional[int] = None
+    pages_completed: int = 0
+    error: Optional[str] = None
+    usage: Optional[DocumentUsageReport] = None
+
+    @classmethod
+    def from_job(cls, job: Job) -> "JobInfo":
+        return JobInfo(
+            job_id=job.job_id,
+            filename=job.filename,
+            status=job.status,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            page_count=job.page_count,
+            pages_completed=len(job.pages),
+            error=job.error,
+            usage=job.usage.report() if job.usage is not None else None,
+        )
+
+
+class PageProgress(BaseModel):
+    page_no: int
+    status: PageStatus
+
+
+class JobPages(BaseModel):
+    job_id: str
+    status: JobStatus
+    page_count: Optional[int] = None
+    pages: list[PageProgress]
+
+
+@bp.route("/", methods=["POST"])
+@validate_request(Reqst, source=DataSource.FORM_MULTIPART)
+@validate_response(JobSubmitted, 202)
+async def post(data: Reqst) -> tuple:
+    if data.document is None or data.document.filename is None:
+        logger.error("Uploaded files is not valid...")
+        return abort(403, "Invalid File Object")
+    with UPLOAD_SAVE_SECONDS.time():
+        document = await IngestService.save(data.document)
+    job = await JobService.submit(document.path, document.filename, document.sha256)
+    status_url = url_for("jobs.get_status", job_id=job.job_id)
+    return JobSubmitted(job_id=job.job_id, status=job.status, status_url=status_url), 202
+
+
+@bp.route("/<job_id>", methods=["GET"])
+@validate_response(JobInfo, 200)
+async def get_status(job_id: str) -> tuple:
+    return JobInfo.from_job(JobService.get(job_id)), 200
+
+
+@bp.route("/<job_id>/pages", methods=["GET"])
+@validate_response(JobPages, 200)
+async def get_pages(job_id: str) -> tuple:
+    job = JobService.get(job_id)
+    pages = [PageProgress(page_no=page_no, status=status) for page_no, status in sorted(job.pages.items())]
+    return JobPages(job_id=job.job_id, status=job.status, page_count=job.page_count, pages=pages), 200
+
+
+@bp.route("/<job_id>/result", methods=["GET"])
+@document_response(InvoiceData, 200)
+@validate_response(JobInfo, 202)
+async def get_result(job_id: str) -> Union[tuple, Response]:
+    job = JobService.get(job_id)
+    if job.status == JobStatus.FAILED:
+        return abort(422, description=f"Job {job_id} failed: {job.error}")
+    if job.status != JobStatus.COMPLETED or job.result is None:
+        return JobInfo.from_job(job), 202
+    return _model_response(job.result, 200)
@@ -1,42 +1,196 @@
+import asyncio
 import logging
+import time
+from collections.abc import AsyncGenerator
 from pathlib import Path
+from typing import Literal, Optional
 
 from pydantic import BaseModel
-from quart import Blueprint, abort, current_app
-from quart_schema import DataSource, validate_request, validate_response
+from quart import Blueprint, Response, abort, current_app, make_response, request
+from quart_schema import DataSource, document_response, validate_request
 from quart_schema.pydantic import File
+from werkzeug.exceptions import HTTPException
 
-from library.extensions import pdf_loader
-from service import InvoiceData, InvoiceService, Pdf2ImgService
-
-from .background_task import cleanup_temp_files
+from service import (
+    AdmissionService,
+    IngestService,
+    Invoice,
+    InvoiceData,
+    InvoiceService,
+    Pdf2ImgService,
+    WorkspaceService,
+)
+from service.admission import Admission
+from service.invoice.usage import DocumentUsageReport, UsageReport
+from service.metrics import UPLOAD_SAVE_SECONDS
+from service.workspace import remove_paths
 
 bp = Blueprint("process", __name__, url_prefix="/process")
 
 logger = logging.getLogger(__name__)
 
+bp.before_request(AdmissionService.check_capacity)
+bp.before_request(IngestService.prepare_request)
+
 
 class Reqst(BaseModel):
     document: File
 
 
+class PageResult(BaseModel):
+    type: Literal["page"] = "page"
+    page_no: int
+    invoice: Optional[Invoice] = None
+    usage: Optional[UsageReport] = None
+
+
+class StreamSummary(BaseModel):
+    type: Literal["summary"] = "summary"
+    page_count: int
+    invoice_count: int
+    no_invoice_pages: list[int]
+    elapsed_seconds: float
+    usage: Optional[DocumentUsageReport] = None
+
+
+class StreamError(BaseModel):
+    type: Literal["error"] = "error"
+    detail: str
+
+
+JSON_MIMETYPE = "application/json"
+NDJSON_MIMETYPE = "application/x-ndjson"
+# the token usage of the document as JSON, sent with every /process response
+USAGE_HEADER = "X-Token-Usage"
+SSE_MIMETYPE = "text/event-stream"
+
+
+async def _admit(uploaded_path: Path) -> Admission:
+    try:
+        return await AdmissionService.admit(uploaded_path)
+    except HTTPException:
+        await WorkspaceService.remove([uploaded_path])
+        raise
+
+
+def _release_with_request(admission: Admission, uploaded_path: Path, cleanup: bool) -> None:
+    """
+    Releases the admission once the task serving the request ends, the streamed body releases it earlier when
+    the document is done. A client gone before the response was sent leaves the body unstarted.
+    """
+
+    def release(_handler: asyncio.Task) -> None:
+        if admission.released:
+            return
+        admission.release()
+        if cleanup:
+            asyncio.get_running_loop().run_in_executor(None, remove_paths, [uploaded_path])
+
+    asyncio.current_task().add_done_callback(release)
+
+
+def _model_response(model: BaseModel, status: int, headers: Optional[dict[str, str]] = None) -> Response:
+    """
+    Serializes a model the services built from validated parts straight to JSON bytes, validate_response
+    would dump it to dicts and encode those with the json module.
+    """
+    return Response(model.model_dump_json(), status, headers, mimetype=JSON_MIMETYPE)
+
+
+def _encode_record(record: BaseModel, mimetype: str) -> bytes:
+    if mimetype == SSE_MIMETYPE:
+        return f"event: {record.type}\ndata: {record.model_dump_json()}\n\n".encode()
+    return record.model_dump_json().encode() + b"\n"
+
+
 @bp.route("/", methods=["POST"])
 @validate_request(Reqst, source=DataSource.FORM_MULTIPART)
-@validate_response(InvoiceData, 201)
-async def post(data: Reqst) -> tuple:
+@document_response(InvoiceData, 201)
+async def post(data: Reqst) -> Response:
     # document = (await request.files).get("file", None)
     logger.info(f"document.filename {data.document.filename}")
     if data.document is None or data.document.filename is None:
         logger.error("Uploaded files is not valid...")
         return abort(403, "Invalid File Object")
 
-    uploaded_file = await pdf_loader.save(data.document)
-    uploaded_path = Path(pdf_loader.path(uploaded_file))
-    logger.info(f"Uploaded files {uploaded_file} ...")
-    image_directory = await Pdf2ImgService.convert(uploaded_path)  # Use await here
-    logger.info(f"Converted to Images {image_directory.name!s} ...")
-    invoices = await InvoiceService.run(image_directory)  # Await if it's async
+    with UPLOAD_SAVE_SECONDS.time():
+        document = await IngestService.save(data.document)
+    uploaded_path = document.path
+    logger.info(f"Uploaded files {uploaded_path.name} ({document.size} bytes) ...")
+    temp_files = [uploaded_path]
+    usage = InvoiceService.new_usage()
+    admission = await _admit(uploaded_path)
+    try:
+        if current_app.config.get("IN_MEMORY_PIPELINE", True):
+            invoices = await InvoiceService.run_pages(
+                Pdf2ImgService.iter_pages(uploaded_path), document.sha256, usage=usage
+            )
+        else:
+            image_directory = await Pdf2ImgService.convert(uploaded_path)  # Use await here
+            logger.info(f"Converted to Images {image_directory.name!s} ...")
+            temp_files.append(image_directory)
+            invoices = await InvoiceService.run(image_directory, usage)  # Await if it's async
+    finally:
+        admission.release()
     logger.info("Agents Completed Extraction ...")
     if current_app.config.get("CLEANUP_TEMP_FILES", False):
-        current_app.add_background_task(cleanup_temp_files, [uploaded_path, image_directory])
-    return invoices, 201
+        current_app.add_background_task(WorkspaceService.remove, temp_files)
+    return _model_response(invoices, 201, {USAGE_HEADER: usage.report().model_dump_json()})
+
+
+@bp.route("/stream", methods=["POST"])
+@validate_request(Reqst, source=DataSource.FORM_MULTIPART)
+async def post_stream(data: Reqst) -> Response:
+    """
+    Streams every page's Invoice as soon as its agents finish, as NDJSON or as server-sent events when
+    the client accepts text/event-stream, followed by a summary record.
+    """
+    if data.document is None or data.document.filename is None:
+        logger.error("Uploaded files is not valid...")
+        return abort(403, "Invalid File Object")
+
+    with UPLOAD_SAVE_SECONDS.time():
+        document = await IngestService.save(data.document)
+    uploaded_path = document.path
+    logger.info(f"Uploaded files {uploaded_path.name} ({document.size} bytes) ...")
+    admission = await _admit(uploaded_path)
+    mimetype = request.accept_mimetypes.best_match([NDJSON_MIMETYPE, SSE_MIMETYPE], default=NDJSON_MIMETYPE)
+    cleanup = current_app.config.get("CLEANUP_TEMP_FILES", False)
+    _release_with_request(admission, uploaded_path, cleanup)
+
+    async def records() -> AsyncGenerator[bytes, None]:
+        start_time = time.perf_counter()
+        page_count, no_invoice_pages = 0, []
+        usage = InvoiceService.new_usage()
+        try:
+            async for page_no, invoice in InvoiceService.iter_invoices(Pdf2ImgService.iter_pages(uploaded_path), usage):
+                page_count += 1
+                if invoice is None:
+                    no_invoice_pages.append(page_no)
+                page = PageResult(page_no=page_no, invoice=invoice, usage=usage.page_report(page_no))
+                yield _encode_record(page, mimetype)
+            summary = StreamSummary(
+                page_count=page_count,
+                invoice_count=page_count - len(no_invoice_pages),
+                no_invoice_pages=sorted(no_invoice_pages),
+                elapsed_seconds=round(time.perf_counter() - start_time, 3),
+                usage=usage.report(),
+            )
+            logger.info("Agents Completed Extraction ...")
+            yield _encode_record(summary, mimetype)
+        except HTTPException as e:
+            yield _encode_record(StreamError(detail=e.description or e.name), mimetype)
+        except Exception as e:
+            # the 200 status is already sent, the client only learns of the failure from this record
+            logger.error(f"Streaming {uploaded_path.name} failed: {e}")
+            yield _encode_record(StreamError(detail=str(e) or type(e).__name__), mimetype)
+        finally:
+            admission.release()
+            if cleanup:
+                await WorkspaceService.remove([uploaded_path])
+
+    response = await make_response(records(), 200, {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.mimetype = mimetype
+    # the body is produced while the document is processed, quart's default 60s would cut it off
+    response.timeout = None
+    return response
@@ -1,7 +1,7 @@
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
-from pydantic import Field, PositiveInt, field_validator
+from pydantic import Field, NonNegativeFloat, NonNegativeInt, PositiveFloat, PositiveInt, field_validator
 from pydantic_settings import BaseSettings
 
 
@@ -12,11 +12,185 @@ class FeatureConfig(BaseSettings):
         description="Allowed extensions for the uploaded files", default_factory=lambda: ["pdf", "PDF", "png", "PNG"]
     )
     CLEANUP_TEMP_FILES: bool = Field(description="Cleanup temporary files", default=True)
+    IN_MEMORY_PIPELINE: bool = Field(
+        description="Hand encoded page images straight to the agents instead of a PNG directory", default=True
+    )
     MAX_IMG_WIDTH: PositiveInt = Field(description="Maximum image width", default=1120)
     MAX_IMG_HEIGHT: PositiveInt = Field(description="Maximum image height", default=1120)
+    PDF2IMG_WORKERS: PositiveInt = Field(
+        description="Number of worker processes rendering page ranges in parallel, 1 renders in process", default=1
+    )
+    EXECUTOR_PROCESS_WORKERS: NonNegativeInt = Field(
+        description="Processes of the shared pool rendering and encoding page ranges, 0 uses PDF2IMG_WORKERS",
+        default=0,
+    )
+    EXECUTOR_IO_WORKERS: PositiveInt = Field(
+        description="Threads of the shared pool for file I/O and other blocking calls, also used by asyncio.to_thread",
+        default=16,
+    )
+    EVENT_LOOP_LAG_MONITOR: bool = Field(description="Measure and log how long the event loop is blocked", default=True)
+    EVENT_LOOP_LAG_INTERVAL: PositiveFloat = Field(description="Seconds between two event loop lag probes", default=0.5)
+    EVENT_LOOP_LAG_THRESHOLD: PositiveFloat = Field(
+        description="Event loop lag in seconds above which the loop is reported as blocked", default=0.1
+    )
+    PDF2IMG_THREAD_COUNT: PositiveInt = Field(
+        description="Number of pdftoppm processes pdf2image may spawn per render call", default=1
+    )
+    PDF2IMG_MAX_PAGES_IN_MEMORY: NonNegativeInt = Field(
+        description="Pages decoded at once per render worker when streaming, 0 decodes the whole document", default=8
+    )
+    PDF2IMG_SIZE_AWARE: bool = Field(
+        description="Render each page directly at the resolution fitting MAX_IMG_WIDTH/MAX_IMG_HEIGHT", default=True
+    )
+    TEXT_LAYER_ENABLED: bool = Field(
+        description="Read pages with a usable embedded text layer directly instead of through agent1", default=False
+    )
+    TEXT_LAYER_MIN_CHARS: PositiveInt = Field(
+        description="Minimum non whitespace characters for a text layer to be used", default=200
+    )
+    TEXT_LAYER_MIN_PRINTABLE_RATIO: float = Field(
+        description="Minimum share of printable characters for a text layer to be used", default=0.9, ge=0, le=1
+    )
+    PAGE_FILTER_BLANK: bool = Field(description="Skip rendered pages without content before the agents", default=False)
+    PAGE_FILTER_DUPLICATES: bool = Field(
+        description="Skip rendered pages that copy an earlier page of the document", default=False
+    )
+    PAGE_BLANK_MAX_INK: float = Field(
+        description="A page with at most this share of ink pixels is blank", default=0.0001, ge=0, le=1
+    )
+    PAGE_BLANK_MIN_STD: float = Field(
+        description="A page whose grayscale standard deviation is at most this is blank", default=0.003, ge=0, le=1
+    )
+    PAGE_DUPLICATE_MAX_DISTANCE: float = Field(
+        description="Share of perceptual hash bits in which a page may differ from an earlier one to be "
+        "compared with it",
+        default=0.1,
+        ge=0,
+        le=1,
+    )
+    PAGE_DUPLICATE_MAX_DIFFERENCE: float = Field(
+        description="Largest difference of any thumbnail cell, as a share of the page contrast, between a page "
+        "and an earlier one for it to be skipped as a copy",
+        default=0.1,
+        ge=0,
+        le=1,
+    )
+    PAGE_IMAGE_FORMAT: Literal["png", "jpeg", "webp"] = Field(
+        description="Encoding of the page images sent to agent1", default="png"
+    )
+    PAGE_IMAGE_QUALITY: int = Field(description="JPEG/WebP quality of the page images", default=85, ge=1, le=100)
+    PAGE_IMAGE_GRAYSCALE: bool = Field(description="Encode the page images in grayscale", default=False)
+    PAGE_IMAGE_PALETTE_COLORS: int = Field(
+        description="Reduce PNG/WebP page images to this many colours, 0 keeps full colour", default=0, ge=0, le=256
+    )
+    PAGE_IMAGE_OPTIMIZE: bool = Field(description="Spend more encode time on smaller page images", default=False)
+    PDF2IMG_SAVE_PAGES: bool = Field(
+        description="Also write page images to disk in the in memory pipeline, for debugging only", default=False
+    )
     MODEL1_NAME: str = Field(default="us.meta.llama3-2-90b-instruct-v1:0")
     MODEL2_NAME: str = Field(default="gpt-4o")
     MAX_CONCURRENT_REQUEST: PositiveInt = Field(description="Maximum number of calls to the model", default=10)
+    LLM_HTTP_MAX_CONNECTIONS: PositiveInt = Field(
+        description="Maximum open connections of the shared model HTTP client", default=20
+    )
+    LLM_HTTP_MAX_KEEPALIVE: PositiveInt = Field(
+        description="Maximum idle keep-alive connections of the shared model HTTP client", default=10
+    )
+    LLM_HTTP_KEEPALIVE_EXPIRY: PositiveFloat = Field(
+        description="Seconds an idle keep-alive connection is kept open", default=60.0
+    )
+    LLM_HTTP2: bool = Field(description="Use HTTP/2 to the model endpoint when h2 is installed", default=True)
+    LLM_HTTP_TIMEOUT: PositiveFloat = Field(description="Read timeout of a model call in seconds", default=600.0)
+    AGENT2_BATCH_ENABLED: bool = Field(description="Structure several pages per agent2 call", default=False)
+    AGENT2_BATCH_TOKEN_BUDGET: PositiveInt = Field(
+        description="Estimated prompt plus completion tokens of one batched agent2 call", default=8000
+    )
+    AGENT2_BATCH_MAX_PAGES: PositiveInt = Field(description="Maximum pages of one batched agent2 call", default=10)
+    LLM_MAX_PAGES_IN_FLIGHT: PositiveInt = Field(
+        description="Rendered pages of one document held for the agents at a time, the renderer waits for more",
+        default=20,
+    )
+    UPLOAD_STREAMING: bool = Field(
+        description="Hash, size check and write uploads to disk while the request body arrives", default=True
+    )
+    UPLOAD_MAX_BYTES: NonNegativeInt = Field(
+        description="Largest accepted document in bytes, 0 for no limit", default=100 * 1024 * 1024
+    )
+    UPLOAD_SPOOL_MAX_BYTES: NonNegativeInt = Field(
+        description="Documents up to this size are held in memory while uploading, 0 writes every upload to disk",
+        default=0,
+    )
+    UPLOAD_BATCH_MAX_BYTES: NonNegativeInt = Field(
+        description="Largest accepted batch upload, several documents or one ZIP archive, in bytes, also the limit of "
+        "all documents extracted from the archive together, 0 for no limit",
+        default=1024 * 1024 * 1024,
+    )
+    LLM_DOCUMENT_TOKEN_BUDGET: NonNegativeInt = Field(
+        description="Tokens one document may use before no further LLM call is made for it, 0 for no limit", default=0
+    )
+    LLM_PRICE_INPUT_PER_MTOK: NonNegativeFloat = Field(description="Price of a million input tokens", default=0.0)
+    LLM_PRICE_CACHED_INPUT_PER_MTOK: NonNegativeFloat = Field(
+        description="Price of a million input tokens served from the prompt cache", default=0.0
+    )
+    LLM_PRICE_OUTPUT_PER_MTOK: NonNegativeFloat = Field(description="Price of a million output tokens", default=0.0)
+    JOB_QUEUE_SIZE: PositiveInt = Field(description="Maximum number of documents waiting in the job queue", default=100)
+    JOB_WORKERS: PositiveInt = Field(description="Number of documents processed concurrently by the jobs", default=2)
+    JOB_RETENTION: PositiveInt = Field(description="Seconds a finished job and its result are kept", default=3600)
+    BATCH_MAX_DOCUMENTS: PositiveInt = Field(description="Maximum number of documents in one batch", default=500)
+    BATCH_MAX_CONCURRENT_DOCUMENTS: PositiveInt = Field(
+        description="Documents of one batch processed side by side, their pages share the LLM concurrency limit",
+        default=4,
+    )
+    ADMISSION_ENABLED: bool = Field(
+        description="Turn /process and /batch documents away while the worker is full", default=True
+    )
+    ADMISSION_MAX_INFLIGHT_PAGES: NonNegativeInt = Field(
+        description="Pages of admitted documents in flight above which documents get a 429, 0 for no limit",
+        default=200,
+    )
+    ADMISSION_MAX_LLM_QUEUE: NonNegativeInt = Field(
+        description="LLM calls waiting for a slot above which requests get a 503, 0 for no limit", default=200
+    )
+    ADMISSION_MAX_DOCUMENT_PAGES: NonNegativeInt = Field(
+        description="Pages a document may have, larger documents get a 413, 0 for no limit", default=0
+    )
+    ADMISSION_RETRY_AFTER: PositiveInt = Field(
+        description="Seconds sent in the Retry-After header of a rejected request", default=10
+    )
+    WORKSPACE_JANITOR_ENABLED: bool = Field(
+        description="Periodically remove old uploads and page images under UPLOADS_DEFAULT_DEST", default=True
+    )
+    WORKSPACE_JANITOR_INTERVAL: PositiveInt = Field(description="Seconds between two janitor sweeps", default=600)
+    WORKSPACE_MAX_AGE: PositiveInt = Field(
+        description="Seconds an upload or page image directory is kept", default=24 * 3600
+    )
+    WORKSPACE_MAX_BYTES: NonNegativeInt = Field(
+        description="Total size of uploads and page images above which the oldest are removed, 0 for no limit",
+        default=0,
+    )
+    WORKSPACE_ORPHAN_AGE: NonNegativeInt = Field(
+        description="Age in seconds after which files left by a previous run or a stopped worker are removed at "
+        "start up, no entry younger than this is removed for the size limit",
+        default=3600,
+    )
+    RESULT_CACHE_ENABLED: bool = Field(description="Cache document and page level agent results on disk", default=False)
+    RESULT_CACHE_PATH: Optional[str] = Field(
+        description="SQLite file of the result cache, defaults to UPLOADS_DEFAULT_DEST/cache", default=None
+    )
+    RESULT_CACHE_MAX_ENTRIES: PositiveInt = Field(description="Maximum cached entries per cache level", default=10000)
+    RESULT_CACHE_TTL: PositiveInt = Field(description="Lifetime of a cached result in seconds", default=7 * 24 * 3600)
+    COMPRESS_ENABLED: bool = Field(
+        description="Compress JSON and text response bodies with brotli or gzip as negotiated from Accept-Encoding",
+        default=True,
+    )
+    COMPRESS_MIN_BYTES: NonNegativeInt = Field(description="Smallest response body that is compressed", default=1024)
+    COMPRESS_GZIP_LEVEL: int = Field(description="gzip level, 1 fastest to 9 smallest", default=6, ge=1, le=9)
+    COMPRESS_BROTLI_QUALITY: int = Field(
+        description="brotli quality, 0 fastest to 11 smallest, used when the brotli package is installed",
+        default=4,
+        ge=0,
+        le=11,
+    )
 
     @field_validator("UPLOADS_DEFAULT_DEST", mode="before")
     @classmethod
@@ -27,10 +27,21 @@ class LoggingConfig(BaseSettings):
     )
     LOG_FORMAT: str = Field(
         description="Format string for log messages",
-        default="%(asctime)s.%(msecs)03d %(levelname)s [%(threadName)s] [%(filename)s:%(lineno)d] - %(message)s",
+        default="%(asctime)s.%(msecs)03d %(levelname)s [%(threadName)s] [%(req_id)s] [%(filename)s:%(lineno)d]"
+        " - %(message)s",
     )
 
     LOG_DATEFORMAT: Optional[str] = Field(
         description="Date format string for log timestamps",
         default=None,
     )
+
+    LOG_QUEUE: bool = Field(
+        description="Hand log records to a listener thread that formats and writes them, logging never blocks the"
+        " event loop on a slow console or disk.",
+        default=True,
+    )
+    LOG_JSON: bool = Field(
+        description="Write one JSON object per log record and line instead of LOG_FORMAT.",
+        default=False,
+    )
@@ -1,65 +1,62 @@
-# ruff: noqa: LOG015
-import logging
-import time
-
 from application import InvoiceInferApp
-from configs import app_config
-
-
-def _register_extensions(app: InvoiceInferApp, bebug: bool = False) -> None:
-    from set_up import (
-        api_schema,
-        envvar_setup,
-        health_setup,
-        lifespan_setup,
-        logging_setup,
-        timezone_setup,
-        uploads_setup,
-        warning_setup,
-    )
-
-    extensions = [
-        timezone_setup,
-        logging_setup,
-        warning_setup,
-        envvar_setup,
-        api_schema,
-        health_setup,
-        lifespan_setup,
-        uploads_setup,
-    ]
-    for extension in extensions:
-        logging.info(f"Registering {extension.__name__} ...")
-        start_time = time.perf_counter()
-        extension.register_app(app)
-        if bebug:
-            logging.info(
-                f"{extension.__name__} registered , latency: {round((time.perf_counter() - start_time) * 1000, 3)}ms"
-            )
+from library.extensions import startup_extn
+
+EXTENSIONS = (
+    "timezone_setup",
+    "logging_setup",
+    "warning_setup",
+    "envvar_setup",
+    "api_schema",
+    "health_setup",
+    "metrics_setup",
+    "compress_setup",
+    "startup_setup",
+    "lifespan_setup",
+    "uploads_setup",
+)
+SERVICES = (
+    "ExecutorService",
+    "WorkspaceService",
+    "CacheService",
+    "IngestService",
+    "Pdf2ImgService",
+    "InvoiceService",
+    "JobService",
+    "BatchService",
+    "AdmissionService",
+)
+BLUEPRINTS = ("bp", "jobs_bp", "batch_bp")
+
+
+def _register_extensions(app: InvoiceInferApp) -> None:
+    for name in EXTENSIONS:
+        extension = startup_extn.import_module(f"set_up.{name}")
+        with startup_extn.phase(f"register {name}"):
+            extension.register_app(app)
 
 
 def _register_services(app: InvoiceInferApp) -> None:
-    from service import InvoiceService, Pdf2ImgService
-
-    Pdf2ImgService.configure_from_app(app)
-    InvoiceService.configure_from_app(app)
+    service = startup_extn.import_module("service")
+    for name in SERVICES:
+        with startup_extn.phase(f"register {name}"):
+            getattr(service, name).configure_from_app(app)
 
 
 def _register_blueprints(app: InvoiceInferApp) -> None:
-    from blueprints import bp
-
-    app.register_blueprint(bp)
+    blueprints = startup_extn.import_module("blueprints")
+    with startup_extn.phase("register blueprints"):
+        for name in BLUEPRINTS:
+            app.register_blueprint(getattr(blueprints, name))
 
 
 def create_application() -> InvoiceInferApp:
-    start_time = time.perf_counter()
-    app = InvoiceInferApp(__name__)
-    app.config.from_mapping(app_config.model_dump())
-    debug_ = app.config.get("DEBUG", False)
-    _register_extensions(app, debug_)
+    # the settings are read from the environment when configs is imported
+    configs = startup_extn.import_module("configs")
+    with startup_extn.phase("load config"):
+        app = InvoiceInferApp(__name__)
+        app.config.from_mapping(configs.app_config.model_dump())
+    _register_extensions(app)
     _register_services(app)
     _register_blueprints(app)
-    if debug_:
-        latency = round((time.perf_counter() - start_time) * 1000, 3)
-        logging.info(f"Application created in {latency} seconds")
+    startup_extn.report("Application created")
     return app
@@ -1,7 +1,19 @@
+from .compress_extn import compress_extn
 from .health_extn import health_extn
 from .lifespan_extn import lifespan_extn
 from .logging_extn import logging_extn
+from .metrics_extn import metrics_extn
+from .startup_extn import startup_extn
 from .time_extn import timezone_extn
 from .upload_extn import pdf_loader
 
-__all__ = ("health_extn", "lifespan_extn", "logging_extn", "pdf_loader", "timezone_extn")
+__all__ = (
+    "compress_extn",
+    "health_extn",
+    "lifespan_extn",
+    "logging_extn",
+    "metrics_extn",
+    "pdf_loader",
+    "startup_extn",
+    "timezone_extn",
+)
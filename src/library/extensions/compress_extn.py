@@ -0,0 +1,94 @@
+import asyncio
+import gzip
+from typing import Optional
+
+from quart import Quart, Response, request
+from quart.wrappers.response import DataBody
+
+from .health_extn import health_extn
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, without it only gzip is offered
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = frozenset({"application/json", "text/plain", "text/html", "text/csv"})
+# bodies from this size on are compressed on a thread, zlib and brotli release the GIL while they work
+THREAD_MIN_BYTES = 256 * 1024
+
+
+class CompressionExtension:
+    """
+    Compresses response bodies of at least min_bytes with brotli or gzip, whichever the client prefers in
+    Accept-Encoding, brotli only when the brotli package is installed. Streamed responses are sent as they
+    are, compressing them would hold back every record until the compressor flushes.
+    """
+
+    def __init__(self, app: Optional[Quart] = None):
+        self.enabled = True
+        self.min_bytes = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        self.encodings: tuple[str, ...] = ("gzip",)
+        self._responses: dict[str, int] = {}
+        self._bytes_in = 0
+        self._bytes_out = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Quart) -> None:
+        self.enabled = app.config.get("COMPRESS_ENABLED", True)
+        self.min_bytes = app.config.get("COMPRESS_MIN_BYTES", 1024)
+        self.gzip_level = app.config.get("COMPRESS_GZIP_LEVEL", 6)
+        self.brotli_quality = app.config.get("COMPRESS_BROTLI_QUALITY", 4)
+        # on equal preference of the client the first is used
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+        app.after_request(self._compress)
+        health_extn.register_stats("compression", self.snapshot)
+
+    def _compressible(self, response: Response) -> bool:
+        return (
+            self.enabled
+            and isinstance(response.response, DataBody)
+            and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and "Content-Encoding" not in response.headers
+            and len(response.response.data) >= self.min_bytes
+        )
+
+    def encode(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    async def _compress(self, response: Response) -> Response:
+        if not self._compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+        data = response.response.data
+        if len(data) >= THREAD_MIN_BYTES:
+            compressed = await asyncio.to_thread(self.encode, data, encoding)
+        else:
+            compressed = self.encode(data, encoding)
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        self._responses[encoding] = self._responses.get(encoding, 0) + 1
+        self._bytes_in += len(data)
+        self._bytes_out += len(compressed)
+        return response
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "encodings": list(self.encodings),
+            "min_bytes": self.min_bytes,
+            "responses": dict(self._responses),
+            "bytes_in": self._bytes_in,
+            "bytes_out": self._bytes_out,
+            "ratio": round(self._bytes_out / self._bytes_in, 4) if self._bytes_in else None,
+        }
+
+
+compress_extn = CompressionExtension()
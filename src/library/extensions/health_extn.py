@@ -1,5 +1,6 @@
 import os
 import threading
+from collections.abc import Callable
 from typing import Optional
 
 from quart import Quart
@@ -8,9 +9,19 @@ from quart_schema import hide
 
 class HealthExtension:
     def __init__(self, app: Optional[Quart] = None):
+        self._stats_providers: dict[str, Callable[[], dict]] = {}
+        self._readiness_checks: dict[str, Callable[[], Optional[str]]] = {}
         if app is not None:
             self.init_app(app)
 
+    def register_stats(self, name: str, provider: Callable[[], dict]) -> None:
+        """provider is called on every /stats request, its result is reported under name."""
+        self._stats_providers[name] = provider
+
+    def register_readiness(self, name: str, check: Callable[[], Optional[str]]) -> None:
+        """check is called on every /health/ready request, it returns why the worker is not ready or None."""
+        self._readiness_checks[name] = check
+
     def init_app(self, app: Quart) -> None:
         @app.route("/health")
         @hide
@@ -23,6 +34,13 @@ class HealthExtension:
             }
             return resonse_, 201
 
+        @app.route("/health/ready")
+        @hide
+        async def get_readiness_info() -> tuple[dict, int]:
+            reasons = {name: reason for name, check in self._readiness_checks.items() if (reason := check())}
+            resonse_ = {"pid": os.getpid(), "status": "not_ready" if reasons else "ready", "reasons": reasons}
+            return resonse_, 503 if reasons else 200
+
         @app.route("/threads")
         @hide
         async def get_threads_info() -> tuple[dict[str, str], int]:
@@ -46,5 +64,11 @@ class HealthExtension:
             reponse_ = {"pid": os.getpid(), "thread_num": num_threads, "threads": thread_list}
             return reponse_, 201
 
+        @app.route("/stats")
+        @hide
+        async def get_stats_info() -> tuple[dict[str, dict], int]:
+            reponse_ = {name: provider() for name, provider in self._stats_providers.items()}
+            return {"pid": os.getpid(), **reponse_}, 200
+
 
 health_extn = HealthExtension()
@@ -1,38 +1,113 @@
+import atexit
+import json
 import logging
+import os
+import queue
 import sys
+import time
 import uuid
-from logging.handlers import RotatingFileHandler
+from collections.abc import Callable
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from typing import Optional
 
-from quart import Quart, g
+from quart import Quart, Response, g, request
 
+REQUEST_ID_HEADER = "X-Request-ID"
+# an incoming request id longer than this is replaced by a generated one
+MAX_REQUEST_ID_LENGTH = 64
+# the UTC offset of a timezone only changes on a quarter hour
+OFFSET_BUCKET_SECONDS = 900
 
-def get_request_id() -> str:
-    if getattr(g, "request_id", None):
-        return g.request_id
+# the id of the request a log record is written for, tasks started while handling the request inherit it
+request_id: ContextVar[str] = ContextVar("request_id", default="")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:10]
 
-    new_uuid = uuid.uuid4().hex[:10]
-    g.request_id = new_uuid
 
-    return new_uuid
+def get_request_id() -> str:
+    return request_id.get()
 
 
 class RequestIdFilter(logging.Filter):
     def filter(self, record: logging.LogRecord) -> bool:
-        record.req_id = get_request_id() if g.has_request_context() else ""
+        record.req_id = request_id.get()
         return True
 
 
+class CachedTimezoneConverter:
+    """
+    Converts record timestamps to the local time of timezone, the UTC offset is looked up once per quarter
+    hour instead of building a timezone aware datetime for every record.
+    """
+
+    def __init__(self, timezone: str):
+        import pytz
+
+        self._timezone = pytz.timezone(timezone)
+        self._bucket = -1
+        self._offset = 0
+
+    def __call__(self, seconds: Optional[float] = None) -> time.struct_time:
+        seconds = time.time() if seconds is None else seconds
+        bucket = int(seconds // OFFSET_BUCKET_SECONDS)
+        if bucket != self._bucket:
+            utc_offset = datetime.fromtimestamp(bucket * OFFSET_BUCKET_SECONDS, tz=self._timezone).utcoffset()
+            self._offset = int(utc_offset.total_seconds()) if utc_offset is not None else 0
+            self._bucket = bucket
+        return time.gmtime(seconds + self._offset)
+
+
+def time_converter(timezone: str) -> Callable[[Optional[float]], time.struct_time]:
+    """time.localtime when the process already runs in timezone, see timezone_extn, a cached converter otherwise."""
+    if os.environ.get("TZ") == timezone and hasattr(time, "tzset"):
+        return time.localtime
+    return CachedTimezoneConverter(timezone)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record and line, for log shippers that do not parse the text format."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": f"{self.formatTime(record, self.datefmt)}.{int(record.msecs):03d}",
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "req_id": getattr(record, "req_id", ""),
+            "file": f"{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
 class LoggingExtension:
+    """
+    Sets up the root logger. With LOG_QUEUE the records are only put on a queue by the thread that logs them,
+    formatting and writing to the console and the log file happen on a listener thread so the event loop
+    never blocks on a slow stdout or disk.
+    """
+
     def __init__(self, app: Optional[Quart] = None):
         self._log_file = None
         self._log_lvl = "INFO"
         self._log_fmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
         self._maxbytes = 20
         self._backup_count = 5
-        self._datafmt = ""
+        self._datefmt = None
         self._timezone = "UTC"
+        self._queue = True
+        self._json = False
+        self._listener: Optional[QueueListener] = None
         if app is not None:
             self.init_app(app)
 
@@ -40,12 +115,38 @@ class LoggingExtension:
         self._log_file = app.config.get("LOG_FILE", self._log_file)
         self._log_lvl = app.config.get("LOG_LEVEL", self._log_lvl)
         self._log_fmt = app.config.get("LOG_FORMAT", self._log_fmt)
-        self._maxbytes_ = app.config.get("LOG_FILE_MAX_SIZE", self._maxbytes)
+        self._maxbytes = app.config.get("LOG_FILE_MAX_SIZE", self._maxbytes)
         self._backup_count = app.config.get("LOG_FILE_BACKUP_COUNT", self._backup_count)
-        self._datefmt = app.config.get("LOG_DATE_FORMAT", self._datafmt)
+        self._datefmt = app.config.get("LOG_DATEFORMAT", self._datefmt)
         self._timezone = app.config.get("TIMEZONE", self._timezone)
+        self._queue = app.config.get("LOG_QUEUE", self._queue)
+        self._json = app.config.get("LOG_JSON", self._json)
 
         self._setup_logger()
+        app.before_request(self._bind_request_id)
+        app.after_request(self._add_request_id_header)
+
+    @staticmethod
+    async def _bind_request_id() -> None:
+        incoming = request.headers.get(REQUEST_ID_HEADER, "")
+        valid = 0 < len(incoming) <= MAX_REQUEST_ID_LENGTH and incoming.isprintable()
+        g.request_id = incoming if valid else new_request_id()
+        request_id.set(g.request_id)
+
+    @staticmethod
+    async def _add_request_id_header(response: Response) -> Response:
+        if getattr(g, "request_id", None):
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+    def _build_formatter(self) -> logging.Formatter:
+        if self._json:
+            formatter = JsonFormatter(datefmt=self._datefmt or "%Y-%m-%dT%H:%M:%S")
+        else:
+            formatter = logging.Formatter(self._log_fmt, self._datefmt or "%Y-%m-%d %H:%M:%S")
+        if self._timezone:
+            formatter.converter = time_converter(self._timezone)
+        return formatter
 
     def _setup_logger(self) -> None:
         log_handlers: list[logging.Handler] = []
@@ -61,35 +162,37 @@ class LoggingExtension:
             )
 
         # Always add StreamHandler to log to console
-        sh = logging.StreamHandler(sys.stdout)
-        # sh.addFilter(RequestIdFilter())
-        log_handlers.append(sh)
+        log_handlers.append(logging.StreamHandler(sys.stdout))
+
+        formatter = self._build_formatter()
+        for handler in log_handlers:
+            handler.setFormatter(formatter)
+
+        self.stop()
+        root_handlers = log_handlers
+        if self._queue:
+            log_queue: queue.SimpleQueue = queue.SimpleQueue()
+            queue_handler = QueueHandler(log_queue)
+            # the record is merged with its args here, the sinks format it on the listener thread
+            queue_handler.setFormatter(logging.Formatter("%(message)s"))
+            self._listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+            self._listener.start()
+            atexit.unregister(self.stop)
+            atexit.register(self.stop)
+            root_handlers = [queue_handler]
+        # the request id is read where the record is logged, the context of the listener thread has none
+        for handler in root_handlers:
+            handler.addFilter(RequestIdFilter())
 
         logging.getLogger("requests").setLevel(logging.WARNING)
         logging.getLogger("httpx").setLevel(logging.WARNING)
-        logging.basicConfig(
-            level=self._log_lvl,
-            format=self._log_fmt,
-            datefmt=self._datefmt,
-            handlers=log_handlers,
-            force=True,
-        )
-        if self._timezone:
-            from datetime import datetime
-            from time import struct_time
-
-            import pytz
-
-            timezone = pytz.timezone(self._timezone)
-
-            def time_converter(seconds: Optional[float]) -> struct_time:
-                if seconds is None:
-                    return datetime.now(tz=timezone).timetuple()
-                return datetime.fromtimestamp(seconds, tz=timezone).timetuple()
+        logging.basicConfig(level=self._log_lvl, handlers=root_handlers, force=True)
 
-            for handler in logging.root.handlers:
-                if handler.formatter:
-                    handler.formatter.converter = time_converter
+    def stop(self) -> None:
+        """Writes the records still on the queue and stops the listener thread."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
 
 
 logging_extn = LoggingExtension()
@@ -0,0 +1,208 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Iterator
+from typing import ClassVar, Optional
+
+from quart import Quart, Response
+from quart_schema import hide
+
+# seconds, from a cached lookup up to a slow multi page model call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeValue(CounterValue):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class HistogramTimer:
+    __slots__ = ("_histogram", "_start_time")
+
+    def __init__(self, histogram: "HistogramValue"):
+        self._histogram = histogram
+        self._start_time = 0.0
+
+    def __enter__(self) -> "HistogramTimer":
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self._histogram.observe(time.perf_counter() - self._start_time)
+
+
+class HistogramValue:
+    """Bucket counts are preallocated, an observation is one bisect and two additions."""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        # one count per bound and a last one for +Inf, made cumulative only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> HistogramTimer:
+        return HistogramTimer(self)
+
+
+class Metric(ABC):
+    """
+    A metric family, labels(*values) returns the value of one label combination. Values are plain
+    attributes updated from the event loop thread, so recording takes no lock.
+    """
+
+    kind: ClassVar[str]
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], object] = {}
+
+    @abstractmethod
+    def _new_value(self) -> object:
+        """A new value of one label combination, recorded from then on."""
+
+    def labels(self, *values: str) -> object:
+        value = self._values.get(values)
+        if value is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            value = self._values[values] = self._new_value()
+        return value
+
+    def _samples(self) -> Iterator[str]:
+        for values, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value.value)}"
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_value(self) -> CounterValue:
+        return CounterValue()
+
+    def labels(self, *values: str) -> CounterValue:
+        return super().labels(*values)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_value(self) -> GaugeValue:
+        return GaugeValue()
+
+    def labels(self, *values: str) -> GaugeValue:
+        return super().labels(*values)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def labels(self, *values: str) -> HistogramValue:
+        return super().labels(*values)
+
+    def _samples(self) -> Iterator[str]:
+        for values, value in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), value.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(value.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsExtension:
+    def __init__(self, app: Optional[Quart] = None):
+        self._metrics: dict[str, Metric] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics.values() for line in metric.render()) + "\n"
+
+    def init_app(self, app: Quart) -> None:
+        @app.route("/metrics")
+        @hide
+        async def get_metrics() -> Response:
+            # the values of this worker process only, every worker is scraped on its own
+            return Response(self.render(), status=200, content_type=CONTENT_TYPE)
+
+
+metrics_extn = MetricsExtension()
@@ -0,0 +1,163 @@
+import asyncio
+import builtins
+import importlib
+import importlib.util
+import logging
+import sys
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Optional
+
+from quart import Quart
+
+from .health_extn import health_extn
+
+logger = logging.getLogger(__name__)
+
+# the slowest module imports reported, by their own time without the modules they import
+SLOWEST_IMPORTS = 15
+
+
+class StartupExtension:
+    """
+    Profiles the start up of a worker, the import of every package, the config load and the registration of
+    every extension, service and blueprint is timed as a phase. Within an import phase every module loaded
+    is timed on its own, like python -X importtime does, with and without the modules it imports in turn.
+    Warmup hooks, registered by the services, run in the background once the worker serves, /health/ready
+    reports the worker not ready until they ran.
+    """
+
+    def __init__(self, app: Optional[Quart] = None):
+        self._phases: dict[str, float] = {}
+        # module name to its own and its cumulative import time
+        self._imports: dict[str, tuple[float, float]] = {}
+        self._warmups: dict[str, Callable[[], Awaitable[None]]] = {}
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._ready = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Quart) -> None:
+        app.before_serving(self._start_warmup)
+        app.after_serving(self._stop_warmup)
+        health_extn.register_stats("startup", self.snapshot)
+        health_extn.register_readiness("warmup", self.readiness)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases[name] = self._phases.get(name, 0.0) + time.perf_counter() - start_time
+
+    def import_module(self, name: str) -> ModuleType:
+        """Imports the module as a phase, the modules it imports first are part of its time."""
+        with self.phase(f"import {name}"), self._timed_imports():
+            return importlib.import_module(name)
+
+    @contextmanager
+    def _timed_imports(self) -> Iterator[None]:
+        """Times every import statement loading a new module while the block runs."""
+        original_import = builtins.__import__
+        if getattr(original_import, "__wrapped__", None) is not None:
+            yield
+            return
+        # the time spent in nested imports, per import statement running
+        nested_times: list[float] = []
+
+        def timed_import(
+            name: str,
+            globals_: Optional[dict[str, Any]] = None,
+            locals_: Optional[dict[str, Any]] = None,
+            fromlist: tuple[str, ...] = (),
+            level: int = 0,
+        ) -> ModuleType:
+            package = (globals_ or {}).get("__package__")
+            module = importlib.util.resolve_name("." * level + name, package) if level and package else name
+            # a new module, or the submodules a from import of a loaded package brings in
+            candidates = [module] if module not in sys.modules else [f"{module}.{item}" for item in fromlist or ()]
+            candidates = [candidate for candidate in candidates if candidate not in sys.modules]
+            if not candidates:
+                return original_import(name, globals_, locals_, fromlist, level)
+            nested_times.append(0.0)
+            start_time = time.perf_counter()
+            try:
+                return original_import(name, globals_, locals_, fromlist, level)
+            finally:
+                seconds = time.perf_counter() - start_time
+                nested = nested_times.pop()
+                if nested_times:
+                    nested_times[-1] += seconds
+                loaded = [candidate for candidate in candidates if candidate in sys.modules]
+                if loaded:
+                    self._imports[", ".join(loaded)] = (seconds - nested, seconds)
+
+        timed_import.__wrapped__ = original_import
+        builtins.__import__ = timed_import
+        try:
+            yield
+        finally:
+            builtins.__import__ = original_import
+
+    def slowest_imports(self, count: int = SLOWEST_IMPORTS) -> list[tuple[str, float, float]]:
+        """The modules taking the most time to import themselves, with their own and cumulative seconds."""
+        imports = sorted(self._imports.items(), key=lambda item: item[1][0], reverse=True)[:count]
+        return [(name, own, cumulative) for name, (own, cumulative) in imports]
+
+    def register_warmup(self, name: str, warmup: Callable[[], Awaitable[None]]) -> None:
+        """warmup runs once when the worker starts serving, in registration order, a failing warmup is logged."""
+        self._warmups[name] = warmup
+
+    def readiness(self) -> Optional[str]:
+        return None if self._ready else "the worker is warming up"
+
+    def report(self, title: str) -> None:
+        phases = sorted(self._phases.items(), key=lambda item: item[1], reverse=True)
+        total = sum(seconds for name, seconds in phases if not name.startswith("warmup "))
+        logger.info(f"{title} in {total * 1000:.1f}ms")
+        for name, seconds in phases:
+            logger.debug(f"  {name}: {seconds * 1000:.1f}ms")
+        for name, own, cumulative in self.slowest_imports():
+            logger.debug(f"  module {name}: {own * 1000:.1f}ms, {cumulative * 1000:.1f}ms with its imports")
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self._ready,
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in self._phases.items()},
+            "slowest_imports": [
+                {"module": name, "own_ms": round(own * 1000, 3), "cumulative_ms": round(cumulative * 1000, 3)}
+                for name, own, cumulative in self.slowest_imports()
+            ],
+        }
+
+    async def _start_warmup(self) -> None:
+        self._ready = not self._warmups
+        if self._warmups:
+            self._warmup_task = asyncio.create_task(self._warm_up(), name="warmup")
+
+    async def _stop_warmup(self) -> None:
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+            await asyncio.gather(self._warmup_task, return_exceptions=True)
+            self._warmup_task = None
+
+    async def _run_warmup(self, name: str, warmup: Callable[[], Awaitable[None]]) -> None:
+        with self.phase(f"warmup {name}"):
+            try:
+                await warmup()
+            except Exception as e:
+                logger.error(f"Warmup {name} failed: {e}")
+
+    async def _warm_up(self) -> None:
+        start_time = time.perf_counter()
+        # one after the other, the imports of a warmup are CPU bound and hold the GIL
+        for name, warmup in self._warmups.items():
+            await self._run_warmup(name, warmup)
+        self._ready = True
+        logger.info(f"Worker warmed up in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+
+
+startup_extn = StartupExtension()
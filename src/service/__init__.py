@@ -1,4 +1,24 @@
+from .admission import AdmissionService
+from .batch import BatchService
+from .cache import CacheService
+from .executors import ExecutorService
+from .ingest import IngestService
 from .invoice import Invoice, InvoiceData, InvoiceService
-from .pdf2img import Pdf2ImgService
+from .jobs import JobService
+from .pdf2img import Pdf2ImgService, PdfPage
+from .workspace import WorkspaceService
 
-__all__ = ("Invoice", "InvoiceData", "InvoiceService", "Pdf2ImgService")
+__all__ = (
+    "AdmissionService",
+    "BatchService",
+    "CacheService",
+    "ExecutorService",
+    "IngestService",
+    "Invoice",
+    "InvoiceData",
+    "InvoiceService",
+    "JobService",
+    "Pdf2ImgService",
+    "PdfPage",
+    "WorkspaceService",
+)
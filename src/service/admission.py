@@ -0,0 +1,169 @@
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import ClassVar, Optional
+
+from quart import Quart, abort
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+from library.extensions import health_extn
+from service.invoice import InvoiceService
+from service.metrics import ADMISSION_REJECTED, ADMITTED_PAGES
+from service.pdf2img import Pdf2ImgService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class AdmissionConfig:
+    enabled: bool = field(default=True)
+    max_inflight_pages: int = field(default=200)
+    max_llm_queue: int = field(default=200)
+    max_document_pages: int = field(default=0)
+    retry_after: int = field(default=10)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "AdmissionConfig":
+        enabled_ = app.config.get("ADMISSION_ENABLED", True)
+        max_inflight_pages_ = app.config.get("ADMISSION_MAX_INFLIGHT_PAGES", 200)
+        max_llm_queue_ = app.config.get("ADMISSION_MAX_LLM_QUEUE", 200)
+        max_document_pages_ = app.config.get("ADMISSION_MAX_DOCUMENT_PAGES", 0)
+        retry_after_ = app.config.get("ADMISSION_RETRY_AFTER", 10)
+        return AdmissionConfig(
+            enabled=enabled_,
+            max_inflight_pages=max_inflight_pages_,
+            max_llm_queue=max_llm_queue_,
+            max_document_pages=max_document_pages_,
+            retry_after=retry_after_,
+        )
+
+
+@dataclass(slots=True)
+class AdmissionStats:
+    admitted: int = field(default=0)
+    rejected_busy: int = field(default=0)
+    rejected_saturated: int = field(default=0)
+    rejected_too_large: int = field(default=0)
+
+
+@dataclass(slots=True)
+class Admission:
+    """The pages a document holds of the worker's capacity until it is released."""
+
+    pages: int
+    released: bool = field(default=False)
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            AdmissionService.release(self.pages)
+
+
+class AdmissionService:
+    """
+    Sheds load before it reaches the pipeline. Every admitted document reserves its page count, read with
+    pdfinfo, until its request finished. A document is turned away with 429 while the reserved pages would
+    exceed max_inflight_pages, and every request with 503 while more than max_llm_queue LLM calls wait for a
+    slot, both with Retry-After. A document is always admitted to an idle worker, however large it is,
+    unless it holds more than max_document_pages.
+    """
+
+    config: ClassVar[AdmissionConfig]
+    stats: ClassVar[AdmissionStats] = AdmissionStats()
+    inflight_pages: ClassVar[int] = 0
+    inflight_documents: ClassVar[int] = 0
+
+    @classmethod
+    def configure_from_app(cls, app: Quart) -> None:
+        config_ = AdmissionConfig.init_from_app(app)
+        cls.set_config(config_)
+        health_extn.register_stats("admission", cls.snapshot)
+        health_extn.register_readiness("admission", cls.readiness)
+
+    @classmethod
+    def set_config(cls, config: AdmissionConfig) -> None:
+        cls.config = config
+
+    @classmethod
+    def _saturated(cls) -> bool:
+        return bool(cls.config.max_llm_queue) and InvoiceService.scheduler.queue_depth >= cls.config.max_llm_queue
+
+    @classmethod
+    def _busy(cls, pages: int = 0) -> bool:
+        if not cls.config.max_inflight_pages or not cls.inflight_pages:
+            return False
+        return cls.inflight_pages + max(pages, 1) > cls.config.max_inflight_pages
+
+    @classmethod
+    def readiness(cls) -> Optional[str]:
+        """Why the worker should get no new documents, None while it has capacity left."""
+        if not cls.config.enabled:
+            return None
+        if cls._saturated():
+            return f"{InvoiceService.scheduler.queue_depth} LLM calls are waiting for a slot"
+        if cls._busy():
+            return f"{cls.inflight_pages} pages are in flight"
+        return None
+
+    @classmethod
+    async def check_capacity(cls) -> None:
+        """before_request hook, turns requests away before their upload is read when the worker is full."""
+        if cls.config.enabled:
+            cls._check(0)
+
+    @classmethod
+    def _check(cls, pages: int) -> None:
+        if cls._saturated():
+            cls.stats.rejected_saturated += 1
+            ADMISSION_REJECTED.labels("saturated").inc()
+            description = "The model backend is saturated, retry later"
+            raise ServiceUnavailable(description=description, retry_after=cls.config.retry_after)
+        if cls._busy(pages):
+            cls.stats.rejected_busy += 1
+            ADMISSION_REJECTED.labels("busy").inc()
+            description = f"{cls.inflight_pages} pages are in flight, retry later"
+            raise TooManyRequests(description=description, retry_after=cls.config.retry_after)
+
+    @classmethod
+    async def admit(cls, pdf_path: str | Path) -> Admission:
+        """Reserves the pages of the document, the caller releases the admission once the document is done."""
+        if not cls.config.enabled:
+            return Admission(pages=0, released=True)
+        try:
+            pages = await Pdf2ImgService.page_count(pdf_path)
+        except Exception as e:
+            # the pipeline reports the broken document, it is counted as a single page until then
+            logger.warning(f"Could not count the pages of {Path(pdf_path).name}: {e}")
+            pages = 1
+        if cls.config.max_document_pages and pages > cls.config.max_document_pages:
+            cls.stats.rejected_too_large += 1
+            ADMISSION_REJECTED.labels("too_large").inc()
+            limit = cls.config.max_document_pages
+            abort(413, description=f"The document has {pages} pages, at most {limit} are accepted")
+        cls._check(pages)
+        cls.stats.admitted += 1
+        cls.inflight_pages += pages
+        cls.inflight_documents += 1
+        ADMITTED_PAGES.set(cls.inflight_pages)
+        return Admission(pages=pages)
+
+    @classmethod
+    def release(cls, pages: int) -> None:
+        cls.inflight_pages -= pages
+        cls.inflight_documents -= 1
+        ADMITTED_PAGES.set(cls.inflight_pages)
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        return {
+            "enabled": cls.config.enabled,
+            "inflight_pages": cls.inflight_pages,
+            "inflight_documents": cls.inflight_documents,
+            "max_inflight_pages": cls.config.max_inflight_pages,
+            "llm_queue_depth": InvoiceService.scheduler.queue_depth,
+            "max_llm_queue": cls.config.max_llm_queue,
+            "admitted": cls.stats.admitted,
+            "rejected_busy": cls.stats.rejected_busy,
+            "rejected_saturated": cls.stats.rejected_saturated,
+            "rejected_too_large": cls.stats.rejected_too_large,
+        }
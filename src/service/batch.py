@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import ClassVar, Optional
+
+from quart import Quart, abort
+from quart.datastructures import FileStorage
+from werkzeug.exceptions import HTTPException
+
+from service.admission import AdmissionService
+from service.ingest import IngestedDocument, IngestService, is_archive_name
+from service.invoice import InvoiceData, InvoiceService
+from service.invoice.usage import DocumentUsage, TokenUsage, UsageReport
+from service.pdf2img import Pdf2ImgService
+from service.workspace import WorkspaceService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class BatchConfig:
+    max_documents: int = field(default=500)
+    max_concurrent_documents: int = field(default=4)
+    cleanup_temp_files: bool = field(default=True)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "BatchConfig":
+        max_documents_ = app.config.get("BATCH_MAX_DOCUMENTS", 500)
+        max_concurrent_documents_ = app.config.get("BATCH_MAX_CONCURRENT_DOCUMENTS", 4)
+        cleanup_temp_files_ = app.config.get("CLEANUP_TEMP_FILES", True)
+        return BatchConfig(
+            max_documents=max_documents_,
+            max_concurrent_documents=max_concurrent_documents_,
+            cleanup_temp_files=cleanup_temp_files_,
+        )
+
+
+@dataclass(slots=True)
+class BatchDocument:
+    name: str
+    document: IngestedDocument
+    usage: DocumentUsage
+    result: Optional[InvoiceData] = field(default=None)
+    error: Optional[str] = field(default=None)
+    elapsed_seconds: float = field(default=0.0)
+
+
+@dataclass(slots=True)
+class Batch:
+    documents: list[IngestedDocument] = field(default_factory=list)
+    temp_files: list[Path] = field(default_factory=list)
+
+
+def unique_names(filenames: list[str]) -> list[str]:
+    """The filenames as result keys, a repeated name gets a " (2)", " (3)" ... suffix."""
+    seen: dict[str, int] = {}
+    names = []
+    for filename in filenames:
+        seen[filename] = seen.get(filename, 0) + 1
+        names.append(filename if seen[filename] == 1 else f"{filename} ({seen[filename]})")
+    return names
+
+
+def total_usage(documents: list[BatchDocument]) -> UsageReport:
+    total = TokenUsage()
+    for document in documents:
+        total.add(document.usage.total)
+    return total.report(InvoiceService.config.pricing)
+
+
+class BatchService:
+    """
+    Runs the documents of one upload side by side, up to max_concurrent_documents at a time. Their pages
+    share the worker's rasterization pool and LLM scheduler with every other request, so a batch gets a fair
+    share of the model instead of a concurrency limit of its own. Every document is admitted on its own
+    before it runs, a document the worker turns away fails with the reason.
+    """
+
+    config: ClassVar[BatchConfig]
+
+    @classmethod
+    def configure_from_app(cls, app: Quart) -> None:
+        config_ = BatchConfig.init_from_app(app)
+        cls.set_config(config_)
+
+    @classmethod
+    def set_config(cls, config: BatchConfig) -> None:
+        cls.config = config
+
+    @classmethod
+    async def ingest(cls, uploads: list[FileStorage]) -> Batch:
+        """Saves the uploaded documents and extracts the documents of uploaded ZIP archives."""
+        batch = Batch()
+        try:
+            for upload in uploads:
+                document = await IngestService.save(upload)
+                batch.temp_files.append(document.path)
+                if not is_archive_name(upload.filename):
+                    batch.documents.append(document)
+                    continue
+                remaining = cls.config.max_documents - len(batch.documents)
+                target_dir, documents = await IngestService.extract_archive(document, max(remaining, 1))
+                batch.temp_files.append(target_dir)
+                batch.documents.extend(documents)
+            if not batch.documents:
+                abort(422, description="The upload holds no PDF document")
+            if len(batch.documents) > cls.config.max_documents:
+                abort(413, description=f"A batch holds at most {cls.config.max_documents} documents")
+        except BaseException:
+            await cls.cleanup(batch)
+            raise
+        return batch
+
+    @classmethod
+    async def cleanup(cls, batch: Batch) -> None:
+        if cls.config.cleanup_temp_files and batch.temp_files:
+            await WorkspaceService.remove(batch.temp_files)
+
+    @classmethod
+    async def iter_documents(cls, documents: list[IngestedDocument]) -> AsyncGenerator[BatchDocument, None]:
+        """Yields every document as soon as it went through the pipeline, a failed document carries its error."""
+        slots = asyncio.Semaphore(cls.config.max_concurrent_documents)
+        names = unique_names([document.filename for document in documents])
+        tasks = [
+            asyncio.create_task(cls._run_document(name, document, slots)) for name, document in zip(names, documents)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @classmethod
+    async def _run_document(cls, name: str, document: IngestedDocument, slots: asyncio.Semaphore) -> BatchDocument:
+        outcome = BatchDocument(name=name, document=document, usage=InvoiceService.new_usage())
+        async with slots:
+            start_time = time.perf_counter()
+            admission = None
+            try:
+                admission = await AdmissionService.admit(document.path)
+                outcome.result = await InvoiceService.run_pages(
+                    Pdf2ImgService.iter_pages(document.path), document.sha256, usage=outcome.usage
+                )
+            except HTTPException as e:
+                outcome.error = e.description or e.name
+            except Exception as e:
+                logger.error(f"Batch document {name} failed: {e}")
+                outcome.error = str(e)
+            finally:
+                if admission is not None:
+                    admission.release()
+            outcome.elapsed_seconds = round(time.perf_counter() - start_time, 3)
+        return outcome
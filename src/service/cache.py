@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import ClassVar, Optional
+
+from quart import Quart
+
+from library.extensions import health_extn
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_file(file_path: str | Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with Path(file_path).open("rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True, slots=True)
+class CacheConfig:
+    enabled: bool = field(default=False)
+    db_path: Path = field(default_factory=lambda: Path("result_cache.sqlite3"))
+    max_entries: int = field(default=10000)
+    ttl_seconds: int = field(default=7 * 24 * 3600)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "CacheConfig":
+        enabled_ = app.config.get("RESULT_CACHE_ENABLED", False)
+        db_path_ = app.config.get("RESULT_CACHE_PATH", None)
+        if not db_path_:
+            db_path_ = Path(app.config.get("UPLOADS_DEFAULT_DEST", "")) / Path("cache") / Path("result_cache.sqlite3")
+        max_entries_ = app.config.get("RESULT_CACHE_MAX_ENTRIES", 10000)
+        ttl_seconds_ = app.config.get("RESULT_CACHE_TTL", 7 * 24 * 3600)
+        return CacheConfig(enabled=enabled_, db_path=Path(db_path_), max_entries=max_entries_, ttl_seconds=ttl_seconds_)
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = field(default=0)
+    misses: int = field(default=0)
+    evictions: int = field(default=0)
+
+
+class SqliteCache:
+    """
+    Key/value store on a local SQLite file, entries are namespaced and each namespace keeps at most
+    max_entries entries younger than ttl_seconds, the least recently used ones are evicted first.
+    """
+
+    def __init__(self, db_path: Path, max_entries: int, ttl_seconds: int):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self._ttl_seconds:
+                self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+            )
+            return row[0]
+
+    def set(self, namespace: str, key: str, value: bytes) -> int:
+        """Stores the value and returns the number of entries evicted from the namespace."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, now, now),
+            )
+            expired = self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND created_at < ?", (namespace, now - self._ttl_seconds)
+            ).rowcount
+            overflow = self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (namespace, namespace, self._max_entries),
+            ).rowcount
+            return expired + overflow
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CacheService:
+    config: ClassVar[CacheConfig]
+    stats: ClassVar[dict[str, CacheStats]] = {}
+    _store: ClassVar[Optional[SqliteCache]] = None
+
+    @classmethod
+    def configure_from_app(cls, app: Quart) -> None:
+        config_ = CacheConfig.init_from_app(app)
+        cls.set_config(config_)
+        app.after_serving(cls.shutdown)
+        health_extn.register_stats("result_cache", cls.snapshot)
+
+    @classmethod
+    def set_config(cls, config: CacheConfig) -> None:
+        cls.config = config
+        cls._store = SqliteCache(config.db_path, config.max_entries, config.ttl_seconds) if config.enabled else None
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        if cls._store is not None:
+            cls._store.close()
+            cls._store = None
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        return {namespace: asdict(stats) for namespace, stats in cls.stats.items()}
+
+    @classmethod
+    async def get(cls, namespace: str, key: str) -> Optional[bytes]:
+        if cls._store is None:
+            return None
+        value = await asyncio.to_thread(cls._store.get, namespace, key)
+        stats = cls.stats.setdefault(namespace, CacheStats())
+        if value is None:
+            stats.misses += 1
+        else:
+            stats.hits += 1
+            logger.info(f"Cache hit in {namespace} for {key[:12]} ...")
+        return value
+
+    @classmethod
+    async def set(cls, namespace: str, key: str, value: bytes) -> None:
+        if cls._store is None:
+            return
+        evicted = await asyncio.to_thread(cls._store.set, namespace, key, value)
+        cls.stats.setdefault(namespace, CacheStats()).evictions += evicted
@@ -0,0 +1,155 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Optional, TypeVar
+
+from quart import Quart
+
+from library.extensions import health_extn
+from service.metrics import EVENT_LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True, slots=True)
+class ExecutorConfig:
+    process_workers: int = field(default=1)
+    io_workers: int = field(default=16)
+    lag_monitor: bool = field(default=True)
+    lag_interval: float = field(default=0.5)
+    lag_threshold: float = field(default=0.1)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "ExecutorConfig":
+        process_workers_ = app.config.get("EXECUTOR_PROCESS_WORKERS", 0) or app.config.get("PDF2IMG_WORKERS", 1)
+        io_workers_ = app.config.get("EXECUTOR_IO_WORKERS", 16)
+        lag_monitor_ = app.config.get("EVENT_LOOP_LAG_MONITOR", True)
+        lag_interval_ = app.config.get("EVENT_LOOP_LAG_INTERVAL", 0.5)
+        lag_threshold_ = app.config.get("EVENT_LOOP_LAG_THRESHOLD", 0.1)
+        return ExecutorConfig(
+            process_workers=process_workers_,
+            io_workers=io_workers_,
+            lag_monitor=lag_monitor_,
+            lag_interval=lag_interval_,
+            lag_threshold=lag_threshold_,
+        )
+
+
+@dataclass(slots=True)
+class LoopLagStats:
+    samples: int = field(default=0)
+    slow: int = field(default=0)
+    last_lag: float = field(default=0.0)
+    max_lag: float = field(default=0.0)
+
+    def observe(self, lag: float) -> None:
+        self.samples += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+
+
+class ExecutorService:
+    """
+    The executors blocking work runs on, shared by every request of the worker. CPU bound work, rendering
+    and encoding whole page ranges, goes to a process pool of process_workers, file I/O and short calls
+    into C libraries go to a thread pool of io_workers that is also the loop's default executor, so
+    asyncio.to_thread uses it as well. A lag monitor measures how late the loop wakes up from a sleep,
+    every wake up later than lag_threshold is logged as a blocked loop.
+    """
+
+    config: ClassVar[ExecutorConfig] = ExecutorConfig()
+    lag_stats: ClassVar[LoopLagStats] = LoopLagStats()
+    _process_pool: ClassVar[Optional[ProcessPoolExecutor]] = None
+    _io_pool: ClassVar[Optional[ThreadPoolExecutor]] = None
+    _lag_monitor: ClassVar[Optional[asyncio.Task]] = None
+
+    @classmethod
+    def configure_from_app(cls, app: Quart) -> None:
+        config_ = ExecutorConfig.init_from_app(app)
+        cls.set_config(config_)
+        app.before_serving(cls.start)
+        app.after_serving(cls.shutdown)
+        health_extn.register_stats("executors", cls.snapshot)
+
+    @classmethod
+    def set_config(cls, config: ExecutorConfig) -> None:
+        cls.config = config
+
+    @classmethod
+    async def start(cls) -> None:
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(cls._get_io_pool())
+        # in asyncio debug mode the callbacks blocking the loop are logged by name past this duration
+        loop.slow_callback_duration = cls.config.lag_threshold
+        if cls.config.lag_monitor:
+            cls._lag_monitor = asyncio.create_task(cls._monitor_lag(), name="event-loop-lag-monitor")
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        if cls._lag_monitor is not None:
+            cls._lag_monitor.cancel()
+            await asyncio.gather(cls._lag_monitor, return_exceptions=True)
+            cls._lag_monitor = None
+        if cls._process_pool is not None:
+            cls._process_pool.shutdown(wait=False, cancel_futures=True)
+            cls._process_pool = None
+        # the thread pool is the loop's default executor, the loop shuts it down once it is closed
+        cls._io_pool = None
+
+    @classmethod
+    def _get_process_pool(cls) -> ProcessPoolExecutor:
+        # started on first use, a worker that never renders in parallel never spawns the processes
+        if cls._process_pool is None:
+            cls._process_pool = ProcessPoolExecutor(
+                max_workers=cls.config.process_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return cls._process_pool
+
+    @classmethod
+    def _get_io_pool(cls) -> ThreadPoolExecutor:
+        if cls._io_pool is None:
+            cls._io_pool = ThreadPoolExecutor(max_workers=cls.config.io_workers, thread_name_prefix="io")
+        return cls._io_pool
+
+    @classmethod
+    def run_cpu(cls, func: Callable[..., T], *args: Any) -> asyncio.Future[T]:
+        """Runs func in the process pool, func and its arguments have to be picklable."""
+        return asyncio.get_running_loop().run_in_executor(cls._get_process_pool(), func, *args)
+
+    @classmethod
+    async def run_io(cls, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Runs func in the thread pool, like asyncio.to_thread it sees the caller's context variables."""
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(cls._get_io_pool(), call)
+
+    @classmethod
+    async def _monitor_lag(cls) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start_time = loop.time()
+            await asyncio.sleep(cls.config.lag_interval)
+            lag = max(loop.time() - start_time - cls.config.lag_interval, 0.0)
+            cls.lag_stats.observe(lag)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            if lag > cls.config.lag_threshold:
+                cls.lag_stats.slow += 1
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f}ms")
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        return {
+            "process_workers": cls.config.process_workers,
+            "process_pool_started": cls._process_pool is not None,
+            "io_workers": cls.config.io_workers,
+            "lag_samples": cls.lag_stats.samples,
+            "slow_wakeups": cls.lag_stats.slow,
+            "last_lag_seconds": round(cls.lag_stats.last_lag, 6),
+            "max_lag_seconds": round(cls.lag_stats.max_lag, 6),
+        }
@@ -0,0 +1,69 @@
+import io
+from dataclasses import dataclass, field
+
+from PIL import Image as PILImage
+from PIL.Image import Image
+from quart import Quart
+
+# format name: (Pillow format, media type, file suffix)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png", ".png"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "webp": ("WEBP", "image/webp", ".webp"),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class ImageEncoding:
+    """
+    How page images are encoded for the agents. quality applies to JPEG and WebP, palette_colors reduces
+    PNG and WebP pages to that many colours (0 keeps full colour), optimize trades encode time for size.
+    """
+
+    fmt: str = field(default="png")
+    quality: int = field(default=85)
+    grayscale: bool = field(default=False)
+    palette_colors: int = field(default=0)
+    optimize: bool = field(default=False)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "ImageEncoding":
+        fmt_ = app.config.get("PAGE_IMAGE_FORMAT", "png")
+        quality_ = app.config.get("PAGE_IMAGE_QUALITY", 85)
+        grayscale_ = app.config.get("PAGE_IMAGE_GRAYSCALE", False)
+        palette_colors_ = app.config.get("PAGE_IMAGE_PALETTE_COLORS", 0)
+        optimize_ = app.config.get("PAGE_IMAGE_OPTIMIZE", False)
+        return ImageEncoding(
+            fmt=fmt_, quality=quality_, grayscale=grayscale_, palette_colors=palette_colors_, optimize=optimize_
+        )
+
+    def __post_init__(self) -> None:
+        if self.fmt not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported page image format {self.fmt}, expected one of {sorted(IMAGE_FORMATS)}")
+
+    @property
+    def media_type(self) -> str:
+        return IMAGE_FORMATS[self.fmt][1]
+
+    @property
+    def suffix(self) -> str:
+        return IMAGE_FORMATS[self.fmt][2]
+
+
+def encode_image(image: Image, encoding: ImageEncoding = ImageEncoding()) -> bytes:
+    save_format, _, _ = IMAGE_FORMATS[encoding.fmt]
+    if encoding.grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if encoding.palette_colors and encoding.fmt != "jpeg":
+        image = image.quantize(colors=encoding.palette_colors, dither=PILImage.Dither.NONE)
+    if encoding.fmt == "png":
+        options = {"optimize": encoding.optimize}
+    elif encoding.fmt == "jpeg":
+        options = {"quality": encoding.quality, "optimize": encoding.optimize}
+    else:
+        options = {"quality": encoding.quality, "method": 6 if encoding.optimize else 4}
+    buffer = io.BytesIO()
+    image.save(buffer, save_format, **options)
+    return buffer.getvalue()
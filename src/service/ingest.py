@@ -0,0 +1,405 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import sys
+import zipfile
+from collections.abc import AsyncIterable, AsyncIterator
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import IO, ClassVar, Optional
+
+from quart import Quart, abort, request
+from quart.datastructures import FileStorage
+from quart.formparser import FormDataParser
+from quart.wrappers import Body
+from werkzeug.datastructures import MultiDict
+from werkzeug.utils import secure_filename
+
+from library.extensions import pdf_loader
+from service.cache import sha256_file
+from service.executors import ExecutorService
+from service.workspace import WorkspaceService, unique_name
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b"%PDF-"
+# readers accept the header anywhere in the first KiB of the file
+PDF_MAGIC_WINDOW = 1024
+ZIP_MAGIC = b"PK\x03\x04"
+ARCHIVE_SUFFIX = ".zip"
+ARCHIVE_CHUNK_BYTES = 1024 * 1024
+# headers and boundaries of the multipart body around the document
+MULTIPART_OVERHEAD = 64 * 1024
+# chunks of one upload being written at a time, the body is read on once fewer are pending
+MAX_PENDING_WRITES = 16
+MULTIPART_MIMETYPE = "multipart/form-data"
+
+
+@dataclass(frozen=True, slots=True)
+class IngestConfig:
+    streaming: bool = field(default=True)
+    max_bytes: int = field(default=100 * 1024 * 1024)
+    spool_bytes: int = field(default=0)
+    batch_max_bytes: int = field(default=1024 * 1024 * 1024)
+    upload_dir: Path = field(default_factory=Path)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "IngestConfig":
+        streaming_ = app.config.get("UPLOAD_STREAMING", True)
+        max_bytes_ = app.config.get("UPLOAD_MAX_BYTES", 100 * 1024 * 1024)
+        spool_bytes_ = app.config.get("UPLOAD_SPOOL_MAX_BYTES", 0)
+        batch_max_bytes_ = app.config.get("UPLOAD_BATCH_MAX_BYTES", 1024 * 1024 * 1024)
+        upload_dir_ = Path(app.extensions["uploads"][pdf_loader.name].destination)
+        return IngestConfig(
+            streaming=streaming_,
+            max_bytes=max_bytes_,
+            spool_bytes=spool_bytes_,
+            batch_max_bytes=batch_max_bytes_,
+            upload_dir=upload_dir_,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class IngestedDocument:
+    path: Path
+    filename: str
+    sha256: str
+    size: int
+
+
+class IngestStream:
+    """
+    The stream the multipart parser writes an uploaded file to. Every chunk is counted, hashed and written
+    as it arrives, the upload is rejected as soon as it grows past max_bytes or its first KiB holds no PDF
+    header. Up to spool_bytes stay in memory, larger uploads are written to target. A ZIP archive is
+    accepted instead of a PDF with archive set, its header has to be at the start of the file.
+
+    The parser calls write on the event loop, so the chunks are written to target at their offset on the
+    io threads of the ExecutorService. Writing does not wait for them, the IngestFormDataParser awaits drain
+    before it reads the next chunk of the body. The stream is complete once persist returned.
+    """
+
+    def __init__(self, target: Path, max_bytes: int, spool_bytes: int, archive: bool = False):
+        self.target = target
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.archive = archive
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._head = b""
+        self._magic, self._magic_window = (ZIP_MAGIC, 0) if archive else (PDF_MAGIC, PDF_MAGIC_WINDOW)
+        self._accepted = False
+        self._file: IO[bytes] = io.BytesIO() if spool_bytes else target.open("w+b")
+        self._writes: set[asyncio.Future] = set()
+        self._closing: Optional[asyncio.Task] = None
+
+    @property
+    def in_memory(self) -> bool:
+        return isinstance(self._file, io.BytesIO)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.discard()
+            abort(413, description=f"The {self._kind} is larger than {self.max_bytes} bytes")
+        if not self._accepted:
+            self._check_header(data)
+        self._digest.update(data)
+        if self.in_memory and self.size > self.spool_bytes:
+            self._roll_over()
+        if self.in_memory:
+            return self._file.write(data)
+        self._write_at(data, self.size - len(data))
+        return len(data)
+
+    @property
+    def _kind(self) -> str:
+        return "archive" if self.archive else "document"
+
+    def _reject(self) -> None:
+        self.discard()
+        abort(415, description="The archive is not a ZIP file" if self.archive else "The document is not a PDF")
+
+    def _check_header(self, data: bytes) -> None:
+        self._head = (self._head + data)[: self._magic_window + len(self._magic)]
+        self._accepted = self._magic in self._head
+        if not self._accepted and len(self._head) >= self._magic_window + len(self._magic):
+            self._reject()
+
+    def _roll_over(self) -> None:
+        spooled = self._file
+        self._file = self.target.open("w+b")
+        self._write_at(spooled.getvalue(), 0)
+
+    def _write_spooled(self) -> None:
+        self.target.write_bytes(self._file.getbuffer())
+
+    def _write_at(self, data: bytes, offset: int) -> None:
+        write = asyncio.ensure_future(ExecutorService.run_io(_write_all, self._file.fileno(), data, offset))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+    async def drain(self) -> None:
+        """Waits until fewer than MAX_PENDING_WRITES chunks are being written."""
+        while len(self._writes) >= MAX_PENDING_WRITES:
+            await asyncio.wait(self._writes, return_when=asyncio.FIRST_COMPLETED)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._writes:
+            self._file.close()
+        elif self._closing is None:
+            # the file stays open for the writes still running, its descriptor could be reused otherwise
+            self._closing = asyncio.create_task(self._close_when_written())
+
+    async def _close_when_written(self) -> None:
+        await asyncio.gather(*self._writes, return_exceptions=True)
+        self._file.close()
+
+    def discard(self) -> None:
+        self.close()
+        self.target.unlink(missing_ok=True)
+
+    async def persist(self) -> Path:
+        """Waits for the writes to target, or writes a document still held in memory, and closes the stream."""
+        if not self._accepted:
+            self._reject()
+        if self.in_memory:
+            await ExecutorService.run_io(self._write_spooled)
+        else:
+            try:
+                await asyncio.gather(*self._writes)
+            except OSError:
+                self.discard()
+                raise
+        self._file.close()
+        return self.target
+
+
+def _write_all(fd: int, data: bytes, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view, offset = view[written:], offset + written
+
+
+def is_archive_name(filename: Optional[str]) -> bool:
+    return Path(filename or "").suffix.lower() == ARCHIVE_SUFFIX
+
+
+def _is_document_member(info: zipfile.ZipInfo) -> bool:
+    path = PurePosixPath(info.filename)
+    return (
+        not info.is_dir()
+        and path.suffix.lower() == ".pdf"
+        and not path.name.startswith(".")
+        and "__MACOSX" not in path.parts
+    )
+
+
+def _extract_member(
+    archive: zipfile.ZipFile, info: zipfile.ZipInfo, target: Path, max_bytes: int, remaining_bytes: int
+) -> IngestedDocument:
+    # the sizes in the archive directory are not trusted, the member is counted while it is inflated
+    digest, size = hashlib.sha256(), 0
+    with archive.open(info) as source, target.open("wb") as sink:
+        while chunk := source.read(ARCHIVE_CHUNK_BYTES):
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                abort(413, description=f"{info.filename} is larger than {max_bytes} bytes")
+            if size > remaining_bytes:
+                abort(413, description="The documents of the archive are larger than the batch limit")
+            digest.update(chunk)
+            sink.write(chunk)
+    return IngestedDocument(path=target, filename=info.filename, sha256=digest.hexdigest(), size=size)
+
+
+def extract_archive(
+    archive: Path, target_dir: Path, max_bytes: int, max_documents: int, max_total_bytes: int = 0
+) -> list[IngestedDocument]:
+    """
+    Extracts the PDFs of a ZIP archive into target_dir, flattened and numbered in archive order. The filename
+    of every document is its path in the archive. Every document is limited to max_bytes and all of them
+    together to max_total_bytes, on any error the documents extracted so far are removed again.
+    """
+    targets = []
+    remaining_bytes = max_total_bytes or sys.maxsize
+    try:
+        with zipfile.ZipFile(archive) as zip_file:
+            members = [info for info in zip_file.infolist() if _is_document_member(info)]
+            if max_documents and len(members) > max_documents:
+                abort(413, description=f"The archive holds more than {max_documents} documents")
+            documents = []
+            for index, info in enumerate(members):
+                name = secure_filename(PurePosixPath(info.filename).name) or "document.pdf"
+                targets.append(target_dir / f"{index:04d}_{name}")
+                documents.append(_extract_member(zip_file, info, targets[-1], max_bytes, remaining_bytes))
+                remaining_bytes -= documents[-1].size
+            return documents
+    except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+        _remove_files(targets)
+        abort(415, description=f"The archive can not be read: {e}")
+    except BaseException:
+        _remove_files(targets)
+        raise
+
+
+def _remove_files(paths: list[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+class IngestFormDataParser(FormDataParser):
+    """
+    Parses the uploaded files into IngestStreams. The next chunk of a multipart body is only read once the
+    file being uploaded has fewer than MAX_PENDING_WRITES chunks in writing, a disk slower than the client
+    holds the upload back instead of the chunks piling up in memory.
+    """
+
+    def __init__(self, **kwargs: object):
+        super().__init__(**kwargs, stream_factory=self._open_stream)
+        self._stream: Optional[IngestStream] = None
+
+    def _open_stream(self, *args: Optional[int | str]) -> IngestStream:
+        self._stream = IngestService.open_stream(*args)
+        return self._stream
+
+    async def parse(
+        self, body: Body, mimetype: str, content_length: Optional[int], options: Optional[dict[str, str]] = None
+    ) -> tuple[MultiDict, MultiDict]:
+        # only the multipart parser reads the body chunk by chunk, the others await it whole
+        drained = self._drained(body) if mimetype == MULTIPART_MIMETYPE else body
+        return await super().parse(drained, mimetype, content_length, options)
+
+    async def _drained(self, body: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        async for data in body:
+            if self._stream is not None:
+                await self._stream.drain()
+            yield data
+
+
+class IngestBatchFormDataParser(IngestFormDataParser):
+    def _open_stream(self, *args: Optional[int | str]) -> IngestStream:
+        self._stream = IngestService.open_batch_stream(*args)
+        return self._stream
+
+
+class IngestService:
+    config: ClassVar[IngestConfig]
+
+    @classmethod
+    def configure_from_app(cls, app: Quart) -> None:
+        config_ = IngestConfig.init_from_app(app)
+        cls.set_config(config_)
+
+    @classmethod
+    def set_config(cls, config: IngestConfig) -> None:
+        cls.config = config
+
+    @classmethod
+    async def prepare_request(cls) -> None:
+        """before_request hook of the upload blueprints, the body is parsed into IngestStreams."""
+        if not cls.config.streaming:
+            return
+        if cls.config.max_bytes:
+            # quart rejects a larger Content-Length right away and stops reading a body that outgrows it
+            request.max_content_length = cls.config.max_bytes + MULTIPART_OVERHEAD
+        request.form_data_parser_class = IngestFormDataParser
+
+    @classmethod
+    async def prepare_batch_request(cls) -> None:
+        """before_request hook of the batch blueprint, the body holds several documents or a ZIP archive."""
+        if not cls.config.streaming:
+            return
+        if cls.config.batch_max_bytes:
+            request.max_content_length = cls.config.batch_max_bytes + MULTIPART_OVERHEAD
+        request.form_data_parser_class = IngestBatchFormDataParser
+
+    @classmethod
+    def open_stream(
+        cls,
+        _total_content_length: Optional[int],
+        _content_type: Optional[str],
+        filename: Optional[str],
+        _content_length: Optional[int] = None,
+    ) -> IngestStream:
+        """The stream_factory of the multipart parser, called with the headers of every uploaded file."""
+        return IngestStream(cls._upload_target(filename, ".pdf"), cls.config.max_bytes, cls.config.spool_bytes)
+
+    @classmethod
+    def open_batch_stream(
+        cls,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str],
+        content_length: Optional[int] = None,
+    ) -> IngestStream:
+        """The stream_factory of batch uploads, a file named *.zip is taken as an archive of documents."""
+        if not is_archive_name(filename):
+            return cls.open_stream(total_content_length, content_type, filename, content_length)
+        target = cls._upload_target(filename, ARCHIVE_SUFFIX)
+        return IngestStream(target, cls.config.batch_max_bytes, cls.config.spool_bytes, archive=True)
+
+    @classmethod
+    def _upload_target(cls, filename: Optional[str], suffix: str) -> Path:
+        stem = secure_filename(Path(filename or "").stem) or "document"
+        target = cls.config.upload_dir / f"{unique_name(stem)}{suffix}"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return target
+
+    @classmethod
+    async def save(cls, storage: FileStorage) -> IngestedDocument:
+        """Saves an uploaded document, a streamed upload is already written and hashed and is not read again."""
+        stream = storage.stream
+        if isinstance(stream, IngestStream):
+            path = await stream.persist()
+            return IngestedDocument(path=path, filename=storage.filename, sha256=stream.sha256, size=stream.size)
+        if is_archive_name(storage.filename):
+            # the upload set only takes PDFs
+            path = cls._upload_target(storage.filename, ARCHIVE_SUFFIX)
+            await storage.save(path)
+        else:
+            # named like the streamed uploads, the janitor tells the entries of the workers apart by their name
+            stem = secure_filename(Path(storage.filename or "").stem) or "document"
+            uploaded_file = await pdf_loader.save(storage, name=f"{unique_name(stem)}.")
+            path = Path(pdf_loader.path(uploaded_file))
+        document_hash = await asyncio.to_thread(sha256_file, path)
+        return IngestedDocument(path=path, filename=storage.filename, sha256=document_hash, size=path.stat().st_size)
+
+    @classmethod
+    async def extract_archive(
+        cls, archive: IngestedDocument, max_documents: int
+    ) -> tuple[Path, list[IngestedDocument]]:
+        """Extracts the PDFs of an uploaded ZIP archive into a new scratch directory, returned with them."""
+        target_dir = WorkspaceService.scratch_dir(cls.config.upload_dir, archive.path.stem)
+        try:
+            documents = await asyncio.to_thread(
+                extract_archive,
+                archive.path,
+                target_dir,
+                cls.config.max_bytes,
+                max_documents,
+                cls.config.batch_max_bytes,
+            )
+        except BaseException:
+            await WorkspaceService.remove([target_dir])
+            raise
+        logger.info(f"Extracted {len(documents)} documents from {archive.filename}")
+        return target_dir, documents
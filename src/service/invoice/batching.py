@@ -0,0 +1,160 @@
+import asyncio
+import json
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .prompts import SYSTEM_MESSAGE_2
+from .schemas import Invoice
+
+CHARS_PER_TOKEN = 4  # rough average for English text and JSON, good enough to size a batch
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# what every agent2 call repeats: the system prompt and the JSON schema of the result
+CALL_OVERHEAD_TOKENS = estimate_tokens(SYSTEM_MESSAGE_2) + estimate_tokens(json.dumps(Invoice.model_json_schema()))
+
+
+def page_tokens(page_content: str) -> int:
+    """Estimated prompt plus completion tokens of one page, the structured output is about as long as the text."""
+    return 2 * estimate_tokens(page_content)
+
+
+@dataclass(slots=True)
+class PageBatch:
+    """Page texts waiting for one structured-output call, closed once the token budget or max_pages is reached."""
+
+    token_budget: int
+    max_pages: int
+    pages: list[tuple[int, str]] = field(default_factory=list)
+    tokens: int = field(default=CALL_OVERHEAD_TOKENS)
+
+    def fits(self, page_content: str) -> bool:
+        if not self.pages:
+            return True
+        return len(self.pages) < self.max_pages and self.tokens + page_tokens(page_content) <= self.token_budget
+
+    def add(self, page_no: int, page_content: str) -> None:
+        self.pages.append((page_no, page_content))
+        self.tokens += page_tokens(page_content)
+
+
+@dataclass(slots=True)
+class BatchStats:
+    pages: int = field(default=0)
+    calls: int = field(default=0)
+    batches: int = field(default=0)
+    splits: int = field(default=0)
+    request_tokens: int = field(default=0)
+    response_tokens: int = field(default=0)
+
+    @property
+    def calls_saved(self) -> int:
+        return self.pages - self.calls
+
+    @property
+    def tokens_saved(self) -> int:
+        """Estimated prompt tokens not sent, every saved call would have repeated the system prompt and schema."""
+        return self.calls_saved * CALL_OVERHEAD_TOKENS
+
+    def merge(self, other: "BatchStats") -> None:
+        self.pages += other.pages
+        self.calls += other.calls
+        self.batches += other.batches
+        self.splits += other.splits
+        self.request_tokens += other.request_tokens
+        self.response_tokens += other.response_tokens
+
+    def snapshot(self) -> dict:
+        return {
+            "pages": self.pages,
+            "calls": self.calls,
+            "batches": self.batches,
+            "splits": self.splits,
+            "calls_saved": self.calls_saved,
+            "estimated_tokens_saved": self.tokens_saved,
+            "request_tokens": self.request_tokens,
+            "response_tokens": self.response_tokens,
+        }
+
+
+class PageBatcher:
+    """
+    Collects the agent1 texts of one document into batches for structure(pages, stats). A batch is sent once
+    it is full or no other page of the document is left in agent1, so pages are not held back for the renderer.
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        max_pages: int,
+        structure: Callable[[list[tuple[int, str]], BatchStats], Awaitable[list[tuple[int, Invoice]]]],
+    ):
+        self.token_budget = token_budget
+        self.max_pages = max_pages
+        self.stats = BatchStats()
+        self._structure = structure
+        self._batch = PageBatch(token_budget, max_pages)
+        self._futures: dict[int, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._in_agent1 = 0
+
+    def process(self, page_text: Awaitable[tuple[int, Optional[str]]]) -> Awaitable[tuple[int, Optional[Invoice]]]:
+        """
+        Awaits the agent1 text of a page and returns its invoice once the batch holding it is structured. The
+        page counts as in agent1 from this call on, not from when its task first runs: a text layer page has
+        its text without suspending and would otherwise always find itself the last page in agent1.
+        """
+        self._in_agent1 += 1
+        return self._process(page_text)
+
+    async def _process(self, page_text: Awaitable[tuple[int, Optional[str]]]) -> tuple[int, Optional[Invoice]]:
+        try:
+            page_no, page_content = await page_text
+        except Exception:
+            # the pages waiting in the batch would otherwise wait for a page that never arrives
+            self._in_agent1 -= 1
+            if self._in_agent1 == 0:
+                self.flush()
+            raise
+        self._in_agent1 -= 1
+        future = None
+        if page_content is not None:
+            if not self._batch.fits(page_content):
+                self.flush()
+            self._batch.add(page_no, page_content)
+            future = self._futures[page_no] = asyncio.get_running_loop().create_future()
+        if len(self._batch.pages) >= self.max_pages or self._in_agent1 == 0:
+            self.flush()
+        return page_no, await future if future is not None else None
+
+    def flush(self) -> None:
+        if not self._batch.pages:
+            return
+        futures = {page_no: self._futures.pop(page_no) for page_no, _ in self._batch.pages}
+        task = asyncio.create_task(self._run(self._batch.pages, futures))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._batch = PageBatch(self.token_budget, self.max_pages)
+
+    async def _run(self, pages: list[tuple[int, str]], futures: dict[int, asyncio.Future]) -> None:
+        try:
+            results = dict(await self._structure(pages, self.stats))
+        except asyncio.CancelledError:
+            for future in futures.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            # the error belongs to the pages waiting for the batch, it is raised from their tasks
+            for future in futures.values():
+                future.set_exception(e)
+            return
+        for page_no, future in futures.items():
+            future.set_result(results[page_no])
+
+    def cancel(self) -> None:
+        for task in self._tasks:
+            task.cancel()
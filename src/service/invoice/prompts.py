@@ -1,6 +1,10 @@
 # ruff: noqa: E501
+import hashlib
+import json
 from string import Template
 
+from .schemas import InvoiceData
+
 SYSTEM_MESSAGE_1 = """
 Your primary task is to extract invoice details from image. The extracted details should include the following information. If any detail is not present, use the reserved keyword "NOT_AVAILABLE":
 
@@ -63,3 +67,9 @@ PAGE_TEMPLATE = Template("""
                         Page No $page_no
 $page_content
 """)
+
+# changes whenever any prompt or the output schema changes, part of every result cache key
+PROMPT_VERSION = hashlib.sha256(
+    f"{SYSTEM_MESSAGE_1}{USER_MESSAGE_1}{SYSTEM_MESSAGE_2}{PAGE_TEMPLATE.template}".encode()
+    + json.dumps(InvoiceData.model_json_schema(), sort_keys=True).encode()
+).hexdigest()[:12]
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from library.extensions.metrics_extn import HistogramValue
+
+# the document an LLM call is made for, set once per document and inherited by its page tasks
+current_document: ContextVar[str] = ContextVar("current_document", default="")
+
+
+@dataclass(slots=True)
+class SchedulerStats:
+    granted: int = field(default=0)
+    waited: int = field(default=0)
+    total_wait_seconds: float = field(default=0.0)
+    max_wait_seconds: float = field(default=0.0)
+
+
+class FairScheduler:
+    """
+    Limits the concurrent LLM calls of the worker to capacity. When every slot is taken, callers queue
+    per document and a freed slot goes to the next document in round robin order, so a large document
+    cannot starve the small ones submitted after it.
+    """
+
+    def __init__(self, capacity: int, wait_histogram: Optional[HistogramValue] = None):
+        self.capacity = capacity
+        self.wait_histogram = wait_histogram
+        self.in_use = 0
+        self.stats = SchedulerStats()
+        self._waiters: dict[str, deque[asyncio.Future]] = {}
+        self._turns: deque[str] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "queue_depth": self.queue_depth,
+            "waiting_documents": len(self._waiters),
+            "granted": self.stats.granted,
+            "waited": self.stats.waited,
+            "avg_wait_seconds": round(self.stats.total_wait_seconds / max(self.stats.waited, 1), 4),
+            "max_wait_seconds": round(self.stats.max_wait_seconds, 4),
+        }
+
+    @asynccontextmanager
+    async def slot(self, document_id: str = "") -> AsyncGenerator[None, None]:
+        await self.acquire(document_id or current_document.get())
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, document_id: str) -> None:
+        if self.in_use < self.capacity and not self._turns:
+            self.in_use += 1
+            self.stats.granted += 1
+            if self.wait_histogram is not None:
+                self.wait_histogram.observe(0.0)
+            return
+        start_time = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.get(document_id)
+        if waiters is None:
+            waiters = self._waiters[document_id] = deque()
+            self._turns.append(document_id)
+        waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over just before the cancellation, pass it on
+                self.release()
+            else:
+                self._forget(document_id, future)
+            raise
+        wait_seconds = time.perf_counter() - start_time
+        self.stats.granted += 1
+        self.stats.waited += 1
+        self.stats.total_wait_seconds += wait_seconds
+        self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, wait_seconds)
+        if self.wait_histogram is not None:
+            self.wait_histogram.observe(wait_seconds)
+
+    def release(self) -> None:
+        while self._turns:
+            document_id = self._turns.popleft()
+            waiters = self._waiters[document_id]
+            future = waiters.popleft()
+            if waiters:
+                self._turns.append(document_id)
+            else:
+                del self._waiters[document_id]
+            if not future.done():
+                # the slot moves straight to the waiter, in_use is unchanged
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+    def _forget(self, document_id: str, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(document_id)
+        if waiters is None or future not in waiters:
+            return
+        waiters.remove(future)
+        if not waiters:
+            del self._waiters[document_id]
+            self._turns.remove(document_id)
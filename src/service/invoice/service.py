@@ -1,61 +1,208 @@
 import asyncio
+import contextvars
+import hashlib
+import importlib.util
 import logging
-from collections.abc import AsyncGenerator
+import uuid
+from collections.abc import AsyncGenerator, AsyncIterable, Awaitable, Callable
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, ClassVar
+from typing import TYPE_CHECKING, Any, ClassVar, Optional
 
-from pydantic_ai import Agent, BinaryContent, ModelRetry
-from pydantic_ai.exceptions import ModelHTTPError
-from pydantic_ai.models.openai import OpenAIModel
 from quart import Quart
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
-from .prompts import PAGE_TEMPLATE, SYSTEM_MESSAGE_1, SYSTEM_MESSAGE_2, USER_MESSAGE_1
+from library.extensions import health_extn, startup_extn
+from service.cache import CacheService
+from service.metrics import (
+    AGENT1_SECONDS,
+    AGENT2_BATCH_SECONDS,
+    AGENT2_SECONDS,
+    DOCUMENTS_IN_FLIGHT,
+    LLM_SLOT_WAIT_SECONDS,
+    PAGES_WITH_INVOICE,
+    PAGES_WITHOUT_INVOICE,
+    TOKEN_BUDGET_SKIPPED_PAGES,
+    record_llm_http_error,
+    record_llm_tokens,
+)
+from service.pdf2img import Pdf2ImgService, PdfPage
+
+from .batching import BatchStats, PageBatcher
+from .prompts import PAGE_TEMPLATE, PROMPT_VERSION, SYSTEM_MESSAGE_1, SYSTEM_MESSAGE_2, USER_MESSAGE_1
+from .scheduler import FairScheduler, current_document
 from .schemas import Invoice, InvoiceData
-from .utility import image_to_byte_string, sorted_images
+from .usage import DocumentUsage, TokenBudgetExceededError, TokenPricing, TokenUsage, current_usage
+from .utility import sorted_pages
+
+if TYPE_CHECKING:
+    # pydantic-ai, the OpenAI client and httpx take seconds to import, they are loaded with the agents
+    import httpx
+    from pydantic_ai import Agent
+    from pydantic_ai.agent import AgentRunResult
 
 logger = logging.getLogger(__name__)
 
+DOCUMENT_CACHE = "document"
+AGENT1_CACHE = "agent1"
+AGENT2_CACHE = "agent2"
+
+
+def cache_key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join((PROMPT_VERSION, *parts)).encode()).hexdigest()
+
+
+def _retry_http_error(exception: BaseException) -> bool:
+    """Retries ModelHTTPError and counts every failed attempt by status."""
+    from pydantic_ai.exceptions import ModelHTTPError
+
+    if not isinstance(exception, ModelHTTPError):
+        return False
+    record_llm_http_error(exception.status_code)
+    return True
+
 
 @dataclass(frozen=True, slots=True)
 class InvoiceSeviceConfig:
     model1_name: str = field(default="us.meta.llama3-2-90b-instruct-v1:0")
     model2_name: str = field(default="gpt-4o")
     max_concurrent_request: int = field(default=10)
+    http_max_connections: int = field(default=20)
+    http_max_keepalive: int = field(default=10)
+    http_keepalive_expiry: float = field(default=60.0)
+    http2: bool = field(default=True)
+    http_timeout: float = field(default=600.0)
+    batch_enabled: bool = field(default=False)
+    batch_token_budget: int = field(default=8000)
+    batch_max_pages: int = field(default=10)
+    max_pages_in_flight: int = field(default=20)
+    token_budget: int = field(default=0)
+    pricing: TokenPricing = field(default_factory=TokenPricing)
 
     @classmethod
     def init_from_app(cls, app: Quart) -> "InvoiceSeviceConfig":
         model1_name_ = app.config.get("MODEL1_NAME", "")
         model2_name_ = app.config.get("MODEL2_NAME", "")
         max_call_min_ = app.config.get("MAX_CONCURRENT_REQUEST", 10)
+        http_max_connections_ = app.config.get("LLM_HTTP_MAX_CONNECTIONS", 20)
+        http_max_keepalive_ = app.config.get("LLM_HTTP_MAX_KEEPALIVE", 10)
+        http_keepalive_expiry_ = app.config.get("LLM_HTTP_KEEPALIVE_EXPIRY", 60.0)
+        http2_ = app.config.get("LLM_HTTP2", True)
+        http_timeout_ = app.config.get("LLM_HTTP_TIMEOUT", 600.0)
+        batch_enabled_ = app.config.get("AGENT2_BATCH_ENABLED", False)
+        batch_token_budget_ = app.config.get("AGENT2_BATCH_TOKEN_BUDGET", 8000)
+        batch_max_pages_ = app.config.get("AGENT2_BATCH_MAX_PAGES", 10)
+        max_pages_in_flight_ = app.config.get("LLM_MAX_PAGES_IN_FLIGHT", 20)
+        token_budget_ = app.config.get("LLM_DOCUMENT_TOKEN_BUDGET", 0)
         return InvoiceSeviceConfig(
-            model1_name=model1_name_, model2_name=model2_name_, max_concurrent_request=max_call_min_
+            model1_name=model1_name_,
+            model2_name=model2_name_,
+            max_concurrent_request=max_call_min_,
+            http_max_connections=http_max_connections_,
+            http_max_keepalive=http_max_keepalive_,
+            http_keepalive_expiry=http_keepalive_expiry_,
+            http2=http2_,
+            http_timeout=http_timeout_,
+            batch_enabled=batch_enabled_,
+            batch_token_budget=batch_token_budget_,
+            batch_max_pages=batch_max_pages_,
+            max_pages_in_flight=max_pages_in_flight_,
+            token_budget=token_budget_,
+            pricing=TokenPricing.init_from_app(app),
+        )
+
+    def build_http_client(self) -> "httpx.AsyncClient":
+        """The connection pool shared by every model client, HTTP/2 is used when the h2 package is installed."""
+        import httpx
+
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.http_max_connections,
+                max_keepalive_connections=self.http_max_keepalive,
+                keepalive_expiry=self.http_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.http_timeout, connect=5.0),
+            http2=self.http2 and importlib.util.find_spec("h2") is not None,
+        )
+
+    @property
+    def agent1_model(self) -> str:
+        """The model agent1 runs on, agent1 uses the OpenAI endpoint and model2_name like agent2 for now."""
+        return self.model2_name
+
+    @property
+    def agent2_model(self) -> str:
+        return self.model2_name
+
+    def fingerprint(self) -> str:
+        """The settings that change the result of a document, part of the document cache key."""
+        return repr(
+            (self.agent1_model, self.agent2_model, self.batch_enabled, self.batch_token_budget, self.batch_max_pages)
         )
 
 
 class InvoiceService:
     config: ClassVar[InvoiceSeviceConfig]
-    agent1: Agent[None, str]
-    agent2: Agent[None, Invoice]
+    scheduler: ClassVar[FairScheduler]
+    http_client: ClassVar[Optional["httpx.AsyncClient"]] = None
+    agent1: ClassVar[Optional["Agent[None, str]"]] = None
+    agent2: ClassVar[Optional["Agent[None, Invoice]"]] = None
+    batch_agent: ClassVar[Optional["Agent[None, InvoiceData]"]] = None
+    _agents_ready: ClassVar[Optional[asyncio.Task]] = None
+    batch_stats: ClassVar[BatchStats] = BatchStats()
 
     @classmethod
     def configure_from_app(cls, app: Quart) -> None:
         config_ = InvoiceSeviceConfig.init_from_app(app)
         cls.set_config(config_)
+        app.after_serving(cls.shutdown)
+        startup_extn.register_warmup("agents", cls.ensure_agents)
+        health_extn.register_stats("llm_scheduler", cls.scheduler.snapshot)
+        health_extn.register_stats("agent2_batching", cls.batch_stats.snapshot)
 
     @classmethod
     def set_config(cls, config: InvoiceSeviceConfig) -> None:
         cls.config = config
+        # one scheduler per worker process, shared by every request and job
+        cls.scheduler = FairScheduler(config.max_concurrent_request, LLM_SLOT_WAIT_SECONDS)
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        if cls.http_client is not None:
+            await cls.http_client.aclose()
+            cls.http_client = None
+        cls.agent1 = cls.agent2 = cls.batch_agent = None
+        cls._agents_ready = None
+
+    @classmethod
+    async def ensure_agents(cls) -> None:
+        """
+        Builds the agents on first use, the imports they need run in a thread so the loop keeps serving.
+        The startup warmup calls it before the worker reports ready, concurrent callers share one build.
+        """
+        if cls.agent1 is not None and cls.agent2 is not None:
+            return
+        # a finished build that left no agents failed, the next caller starts another
+        if cls._agents_ready is None or cls._agents_ready.done():
+            cls._agents_ready = asyncio.ensure_future(asyncio.to_thread(cls.setup_agents))
+        await asyncio.shield(cls._agents_ready)
 
     @classmethod
     def setup_agents(cls) -> None:
+        """Builds both agents once per worker, they share one pooled HTTP client to the model endpoint."""
+        from pydantic_ai import Agent, ModelRetry
+        from pydantic_ai.models.openai import OpenAIModel
+        from pydantic_ai.providers.openai import OpenAIProvider
+
+        if cls.http_client is None:
+            cls.http_client = cls.config.build_http_client()
+        provider = OpenAIProvider(http_client=cls.http_client)
         agent1 = Agent(
             # model=BedrockConverseModel(
             #     model_name=cls.config.model1_name,
             #     provider=BedrockProvider(**get_secret_keys()),
             # ),
-            model=OpenAIModel(cls.config.model2_name),
+            model=OpenAIModel(cls.config.agent1_model, provider=provider),
             system_prompt=SYSTEM_MESSAGE_1,
             result_type=str,
             retries=0,
@@ -63,7 +210,7 @@ class InvoiceService:
         )
 
         agent2 = Agent(
-            model=OpenAIModel(cls.config.model2_name),
+            model=OpenAIModel(cls.config.agent2_model, provider=provider),
             system_prompt=SYSTEM_MESSAGE_2,
             result_type=Invoice,
             retries=0,
@@ -76,61 +223,313 @@ class InvoiceService:
                 return result
             return ModelRetry("Final result Format is not Correct ")
 
+        # structures several pages in one call, SYSTEM_MESSAGE_2 and InvoiceData already describe many pages
+        batch_agent = Agent(
+            model=OpenAIModel(cls.config.agent2_model, provider=provider),
+            system_prompt=SYSTEM_MESSAGE_2,
+            result_type=InvoiceData,
+            retries=0,
+            model_settings={"temperature": 0},
+        )
+
         cls.agent1 = agent1
         cls.agent2 = agent2
+        cls.batch_agent = batch_agent
 
     @classmethod
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=3, min=1, max=10),
-        retry=retry_if_exception_type(ModelHTTPError),
+        retry=retry_if_exception(_retry_http_error),
     )
-    async def _get_agent1_response(cls, img_path: Path, page_no: int) -> tuple[str, int]:
-        async with cls.semaphore:
-            logger.info(f"Agent1 Processing Page : {img_path.name}")
-            img_byte, mimetype = image_to_byte_string(img_path.resolve())
+    async def _get_agent1_response(cls, page: PdfPage) -> str:
+        async with cls.scheduler.slot():
+            from pydantic_ai import BinaryContent
+
+            logger.info(f"Agent1 Processing Page : {page.page_no}")
             input_msg = [
                 USER_MESSAGE_1,
-                BinaryContent(data=img_byte, media_type=mimetype),
+                BinaryContent(data=page.data, media_type=page.media_type),
             ]
             result1 = await cls.agent1.run(input_msg)
-            response = PAGE_TEMPLATE.substitute(page_no=page_no, page_content=result1.data)
-            return response, page_no
+            cls._record_usage("agent1", [page.page_no], result1)
+            return result1.data
 
     @classmethod
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=3, min=1, max=10),
-        retry=retry_if_exception_type(ModelHTTPError),
+        retry=retry_if_exception(_retry_http_error),
     )
     async def _get_agent2_response(cls, content: str, page_no: int) -> Invoice:
-        async with cls.semaphore:
+        async with cls.scheduler.slot():
             logger.info(f"Agent2 Processing Page : {page_no}")
             result2 = await cls.agent2.run([content])
+            cls._record_usage("agent2", [page_no], result2)
             return result2.data
 
     @classmethod
-    async def _process_response(cls, agent1_response: list[tuple[str, int]]) -> AsyncGenerator[tuple, None]:
-        agent1_response = sorted(agent1_response, key=lambda x: x[1])
-        for response, page_no in agent1_response:
-            if "NO_INVOICE_FOUND" in response:
-                logger.info(f"Skipped the page {page_no} content - {response}")
-                continue
-            yield response, page_no
-
-    @classmethod
-    async def run(cls, image_dir: str | Path) -> InvoiceData:
-        cls.setup_agents()
-        cls.semaphore = asyncio.Semaphore(cls.config.max_concurrent_request)
-        pdf_content, agent1_task = [], []
-        async for img_path, page_no in sorted_images(image_dir):
-            agent1_task.append(cls._get_agent1_response(img_path, page_no))
-        pdf_content = await asyncio.gather(*agent1_task)
-        logger.info(f"Agent1 has completed the processing of {len(pdf_content)} pages")
-        final_result, agent2_task = [], []
-        cls.semaphore = asyncio.Semaphore(cls.config.max_concurrent_request)
-        async for content, p_no in cls._process_response(pdf_content):
-            agent2_task.append(cls._get_agent2_response(content, p_no))
-        final_result = await asyncio.gather(*agent2_task)
-        final_result = [result for result in final_result if isinstance(result, Invoice)]
-        return InvoiceData(details=final_result)
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=3, min=1, max=10),
+        retry=retry_if_exception(_retry_http_error),
+    )
+    async def _get_agent2_batch_response(cls, pages: list[tuple[int, str]], stats: BatchStats) -> list[Invoice]:
+        async with cls.scheduler.slot():
+            logger.info(f"Agent2 Processing Pages : {[page_no for page_no, _ in pages]}")
+            result = await cls.batch_agent.run(["".join(content for _, content in pages)])
+            usage = cls._record_usage("agent2_batch", [page_no for page_no, _ in pages], result)
+            stats.request_tokens += usage.input_tokens
+            stats.response_tokens += usage.output_tokens
+            return result.data.details
+
+    @classmethod
+    def new_usage(cls) -> DocumentUsage:
+        return DocumentUsage(budget=cls.config.token_budget, pricing=cls.config.pricing)
+
+    @classmethod
+    def _record_usage(cls, agent: str, page_nos: list[int], result: "AgentRunResult") -> TokenUsage:
+        """Adds the usage of one agent run to the metrics and to the pages of the current document."""
+        usage = TokenUsage.from_run(result.usage())
+        record_llm_tokens(
+            agent, usage.input_tokens, usage.output_tokens, usage.cached_tokens, usage.cost(cls.config.pricing)
+        )
+        document_usage = current_usage.get()
+        if document_usage is not None:
+            document_usage.record(page_nos, usage)
+        return usage
+
+    @staticmethod
+    def _check_budget() -> None:
+        document_usage = current_usage.get()
+        if document_usage is not None:
+            document_usage.check()
+
+    @classmethod
+    async def _within_budget(
+        cls, page_no: int, result: Awaitable[tuple[int, Optional[Invoice]]]
+    ) -> tuple[int, Optional[Invoice]]:
+        """A page whose LLM calls were stopped by the token budget of its document is returned without invoice."""
+        try:
+            return await result
+        except TokenBudgetExceededError as e:
+            logger.warning(f"Page {page_no} is not processed, {e}")
+            current_usage.get().skipped_pages.append(page_no)
+            TOKEN_BUDGET_SKIPPED_PAGES.inc()
+            return page_no, None
+
+    @classmethod
+    async def _get_page_content(cls, page: PdfPage) -> str:
+        if page.text is not None:
+            # the text layer of a born-digital page replaces reading its image
+            return page.text
+        key = cache_key(cls.config.agent1_model, hashlib.sha256(page.data).hexdigest())
+        cached = await CacheService.get(AGENT1_CACHE, key)
+        if cached is not None:
+            return cached.decode()
+        cls._check_budget()
+        with AGENT1_SECONDS.time():
+            page_content = await cls._get_agent1_response(page)
+        await CacheService.set(AGENT1_CACHE, key, page_content.encode())
+        return page_content
+
+    @classmethod
+    async def _get_invoice(cls, content: str, page_no: int) -> Invoice:
+        key = cache_key(cls.config.agent2_model, hashlib.sha256(content.encode()).hexdigest())
+        cached = await CacheService.get(AGENT2_CACHE, key)
+        if cached is not None:
+            return Invoice.model_validate_json(cached)
+        cls._check_budget()
+        with AGENT2_SECONDS.time():
+            invoice = await cls._get_agent2_response(content, page_no)
+        await CacheService.set(AGENT2_CACHE, key, invoice.model_dump_json().encode())
+        return invoice
+
+    @classmethod
+    async def _get_invoice_batch(cls, pages: list[tuple[int, str]], stats: BatchStats) -> list[tuple[int, Invoice]]:
+        """
+        Structures the pages in one call, a batch whose result fails validation or does not hold exactly one
+        invoice per page is split in half and retried, a single page falls back to agent2.
+        """
+        if len(pages) == 1:
+            page_no, content = pages[0]
+            stats.calls += 1
+            with AGENT2_SECONDS.time():
+                return [(page_no, await cls._get_agent2_response(content, page_no))]
+        from pydantic_ai.exceptions import UnexpectedModelBehavior
+
+        page_nos = sorted(page_no for page_no, _ in pages)
+        stats.calls += 1
+        try:
+            with AGENT2_BATCH_SECONDS.time():
+                invoices = await cls._get_agent2_batch_response(pages, stats)
+        except UnexpectedModelBehavior as e:
+            logger.warning(f"Agent2 batch of pages {page_nos} failed validation: {e}")
+            invoices = None
+        if invoices is not None and sorted(invoice.page_no for invoice in invoices) == page_nos:
+            stats.batches += 1
+            return [(invoice.page_no, invoice) for invoice in invoices]
+        if invoices is not None:
+            logger.warning(f"Agent2 batch of pages {page_nos} returned pages {[i.page_no for i in invoices]}")
+        stats.splits += 1
+        middle = len(pages) // 2
+        first, second = await asyncio.gather(
+            cls._get_invoice_batch(pages[:middle], stats), cls._get_invoice_batch(pages[middle:], stats)
+        )
+        return first + second
+
+    @classmethod
+    async def _structure_batch(cls, pages: list[tuple[int, str]], stats: BatchStats) -> list[tuple[int, Invoice]]:
+        keys = {
+            page_no: cache_key(cls.config.agent2_model, hashlib.sha256(content.encode()).hexdigest())
+            for page_no, content in pages
+        }
+        results, misses = [], []
+        for page_no, content in pages:
+            cached = await CacheService.get(AGENT2_CACHE, keys[page_no])
+            if cached is not None:
+                results.append((page_no, Invoice.model_validate_json(cached)))
+            else:
+                misses.append((page_no, content))
+        if misses:
+            cls._check_budget()
+            stats.pages += len(misses)
+            for page_no, invoice in await cls._get_invoice_batch(misses, stats):
+                await CacheService.set(AGENT2_CACHE, keys[page_no], invoice.model_dump_json().encode())
+                results.append((page_no, invoice))
+        return results
+
+    @classmethod
+    async def _get_page_text(cls, page: PdfPage) -> tuple[int, Optional[str]]:
+        """Runs agent1 and returns the PAGE_TEMPLATE text of the page, None for pages without invoice content."""
+        if page.skip_reason is not None:
+            logger.info(f"Skipped the page {page.page_no} before the agents - {page.skip_reason}")
+            document_usage = current_usage.get()
+            if document_usage is not None:
+                document_usage.filtered_pages[page.page_no] = page.skip_reason
+            return page.page_no, None
+        page_content = await cls._get_page_content(page)
+        response = PAGE_TEMPLATE.substitute(page_no=page.page_no, page_content=page_content)
+        if "NO_INVOICE_FOUND" in response:
+            logger.info(f"Skipped the page {page.page_no} content - {response}")
+            return page.page_no, None
+        return page.page_no, response
+
+    @classmethod
+    async def _process_page(cls, page: PdfPage) -> tuple[int, Optional[Invoice]]:
+        page_no, response = await cls._get_page_text(page)
+        if response is None:
+            return page_no, None
+        return page_no, await cls._get_invoice(response, page_no)
+
+    @classmethod
+    async def iter_invoices(
+        cls, pages: AsyncIterable[PdfPage], usage: Optional[DocumentUsage] = None
+    ) -> AsyncGenerator[tuple[int, Optional[Invoice]], None]:
+        """
+        Runs every page through agent1 and agent2 as soon as it is rendered and yields (page_no, invoice)
+        in completion order, invoice is None for pages without invoice content. With batching enabled agent2
+        structures several pages per call, batches are sized from AGENT2_BATCH_TOKEN_BUDGET. The tokens of
+        the document are added to usage, a new one from new_usage() is used when not given. At most
+        max_pages_in_flight pages are held with their images, the next page is only pulled from pages once the
+        result of an earlier one was taken.
+        """
+        await cls.ensure_agents()
+        batcher = None
+        if cls.config.batch_enabled:
+            batcher = PageBatcher(cls.config.batch_token_budget, cls.config.batch_max_pages, cls._structure_batch)
+        completed: asyncio.Queue[asyncio.Task] = asyncio.Queue()
+        page_tasks: list[asyncio.Task] = []
+        pages_in_flight = asyncio.Semaphore(cls.config.max_pages_in_flight)
+
+        async def feed_pages() -> None:
+            # a page is only pulled from the renderer once it has a place, the place left after the last is freed
+            await pages_in_flight.acquire()
+            async for page in pages:
+                result = cls._process_page(page) if batcher is None else batcher.process(cls._get_page_text(page))
+                task = asyncio.create_task(cls._within_budget(page.page_no, result))
+                task.add_done_callback(completed.put_nowait)
+                page_tasks.append(task)
+                await pages_in_flight.acquire()
+            pages_in_flight.release()
+
+        # the page tasks inherit the feeder's context and with it the document id used by the scheduler
+        context = contextvars.copy_context()
+        context.run(current_document.set, uuid.uuid4().hex)
+        context.run(current_usage.set, usage if usage is not None else cls.new_usage())
+        feeder = asyncio.create_task(feed_pages(), context=context)
+        feeder.add_done_callback(completed.put_nowait)
+        page_count, received = None, 0
+        DOCUMENTS_IN_FLIGHT.inc()
+        try:
+            while page_count is None or received < page_count:
+                task = await completed.get()
+                if task is feeder:
+                    feeder.result()
+                    page_count = len(page_tasks)
+                    continue
+                received += 1
+                page_no, invoice = task.result()
+                pages_in_flight.release()
+                (PAGES_WITHOUT_INVOICE if invoice is None else PAGES_WITH_INVOICE).inc()
+                yield page_no, invoice
+        finally:
+            DOCUMENTS_IN_FLIGHT.dec()
+            feeder.cancel()
+            for task in page_tasks:
+                task.cancel()
+            if batcher is not None:
+                batcher.cancel()
+                cls._report_batching(batcher.stats)
+
+    @classmethod
+    def _report_batching(cls, stats: BatchStats) -> None:
+        if not stats.pages:
+            return
+        cls.batch_stats.merge(stats)
+        logger.info(
+            f"Agent2 structured {stats.pages} pages in {stats.calls} calls, saved {stats.calls_saved} calls "
+            f"and about {stats.tokens_saved} prompt tokens"
+        )
+
+    @classmethod
+    async def run(cls, image_dir: str | Path, usage: Optional[DocumentUsage] = None) -> InvoiceData:
+        return await cls.run_pages(sorted_pages(image_dir), usage=usage)
+
+    @classmethod
+    def document_key(cls, document_hash: str) -> str:
+        """The same document gives the same result only with the same models and page preparation."""
+        pipeline = Pdf2ImgService.config.fingerprint() if Pdf2ImgService.config is not None else ""
+        return cache_key(cls.config.fingerprint(), pipeline, document_hash)
+
+    @classmethod
+    async def run_pages(
+        cls,
+        pages: AsyncIterable[PdfPage],
+        document_hash: Optional[str] = None,
+        on_page: Optional[Callable[[int, Optional[Invoice]], None]] = None,
+        usage: Optional[DocumentUsage] = None,
+    ) -> InvoiceData:
+        """
+        document_hash is the SHA-256 of the uploaded document, when given the whole result is cached.
+        on_page is called with every page as soon as it has gone through the agents, the tokens the
+        document used are added to usage. A result cut short by the token budget is not cached.
+        """
+        key = None
+        if document_hash is not None:
+            key = cls.document_key(document_hash)
+            cached = await CacheService.get(DOCUMENT_CACHE, key)
+            if cached is not None:
+                return InvoiceData.model_validate_json(cached)
+        results = []
+        usage = usage if usage is not None else cls.new_usage()
+        async for page_no, invoice in cls.iter_invoices(pages, usage):
+            results.append((page_no, invoice))
+            if on_page is not None:
+                on_page(page_no, invoice)
+        logger.info(f"Agents have completed the processing of {len(results)} pages")
+        final_result = [invoice for _, invoice in sorted(results, key=lambda x: x[0]) if isinstance(invoice, Invoice)]
+        invoice_data = InvoiceData(details=final_result)
+        if key is not None and not usage.skipped_pages:
+            await CacheService.set(DOCUMENT_CACHE, key, invoice_data.model_dump_json().encode())
+        return invoice_data
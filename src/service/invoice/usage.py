@@ -0,0 +1,155 @@
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+from pydantic import BaseModel
+from quart import Quart
+
+if TYPE_CHECKING:
+    from pydantic_ai.usage import Usage
+
+# the token usage of the document an LLM call is made for, set next to current_document
+current_usage: ContextVar[Optional["DocumentUsage"]] = ContextVar("current_usage", default=None)
+
+
+class TokenBudgetExceededError(Exception):
+    def __init__(self, budget: int, used: int):
+        super().__init__(f"Document token budget of {budget} exceeded, {used} tokens used")
+        self.budget = budget
+        self.used = used
+
+
+@dataclass(frozen=True, slots=True)
+class TokenPricing:
+    """Prices per million tokens, cached input tokens are billed at cached_input instead of input."""
+
+    input: float = field(default=0.0)
+    cached_input: float = field(default=0.0)
+    output: float = field(default=0.0)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "TokenPricing":
+        input_ = app.config.get("LLM_PRICE_INPUT_PER_MTOK", 0.0)
+        cached_input_ = app.config.get("LLM_PRICE_CACHED_INPUT_PER_MTOK", 0.0)
+        output_ = app.config.get("LLM_PRICE_OUTPUT_PER_MTOK", 0.0)
+        return TokenPricing(input=input_, cached_input=cached_input_, output=output_)
+
+
+class UsageReport(BaseModel):
+    requests: int
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int
+    total_tokens: int
+    cost: float
+
+
+@dataclass(slots=True)
+class TokenUsage:
+    requests: int = field(default=0)
+    input_tokens: int = field(default=0)
+    output_tokens: int = field(default=0)
+    cached_tokens: int = field(default=0)
+
+    @classmethod
+    def from_run(cls, usage: "Usage") -> "TokenUsage":
+        """cached_tokens is the part of the input tokens the endpoint served from its prompt cache."""
+        return TokenUsage(
+            requests=usage.requests,
+            input_tokens=usage.request_tokens or 0,
+            output_tokens=usage.response_tokens or 0,
+            cached_tokens=(usage.details or {}).get("cached_tokens", 0),
+        )
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def add(self, other: "TokenUsage") -> None:
+        self.requests += other.requests
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cached_tokens += other.cached_tokens
+
+    def split(self, parts: int) -> list["TokenUsage"]:
+        """Even shares of a call made for several pages, the remainders go to the first share."""
+        shares = [
+            TokenUsage(
+                requests=0,
+                input_tokens=self.input_tokens // parts,
+                output_tokens=self.output_tokens // parts,
+                cached_tokens=self.cached_tokens // parts,
+            )
+            for _ in range(parts)
+        ]
+        shares[0].requests = self.requests
+        shares[0].input_tokens += self.input_tokens % parts
+        shares[0].output_tokens += self.output_tokens % parts
+        shares[0].cached_tokens += self.cached_tokens % parts
+        return shares
+
+    def cost(self, pricing: TokenPricing) -> float:
+        uncached_tokens = self.input_tokens - self.cached_tokens
+        return (
+            uncached_tokens * pricing.input
+            + self.cached_tokens * pricing.cached_input
+            + self.output_tokens * pricing.output
+        ) / 1_000_000
+
+    def report(self, pricing: TokenPricing) -> UsageReport:
+        return UsageReport(
+            requests=self.requests,
+            input_tokens=self.input_tokens,
+            output_tokens=self.output_tokens,
+            cached_tokens=self.cached_tokens,
+            total_tokens=self.total_tokens,
+            cost=round(self.cost(pricing), 6),
+        )
+
+
+class DocumentUsageReport(UsageReport):
+    budget: Optional[int] = None
+    budget_exceeded: bool = False
+    skipped_pages: list[int] = []
+    filtered_pages: dict[int, str] = {}
+
+
+@dataclass(slots=True)
+class DocumentUsage:
+    """
+    The token usage of one document in total and per page. With budget set, no further LLM call is started
+    once the document used that many tokens, calls already running are still counted so the total can end
+    up above the budget.
+    """
+
+    budget: int = field(default=0)
+    pricing: TokenPricing = field(default_factory=TokenPricing)
+    total: TokenUsage = field(default_factory=TokenUsage)
+    pages: dict[int, TokenUsage] = field(default_factory=dict)
+    skipped_pages: list[int] = field(default_factory=list)
+    filtered_pages: dict[int, str] = field(default_factory=dict)  # page number to the reason of the page filter
+
+    @property
+    def exceeded(self) -> bool:
+        return self.budget > 0 and self.total.total_tokens >= self.budget
+
+    def check(self) -> None:
+        if self.exceeded:
+            raise TokenBudgetExceededError(self.budget, self.total.total_tokens)
+
+    def record(self, page_nos: list[int], usage: TokenUsage) -> None:
+        self.total.add(usage)
+        for page_no, share in zip(page_nos, usage.split(len(page_nos))):
+            self.pages.setdefault(page_no, TokenUsage()).add(share)
+
+    def page_report(self, page_no: int) -> UsageReport:
+        return self.pages.get(page_no, TokenUsage()).report(self.pricing)
+
+    def report(self) -> DocumentUsageReport:
+        return DocumentUsageReport(
+            **self.total.report(self.pricing).model_dump(),
+            budget=self.budget or None,
+            budget_exceeded=self.exceeded,
+            skipped_pages=sorted(self.skipped_pages),
+            filtered_pages=dict(sorted(self.filtered_pages.items())),
+        )
@@ -1,4 +1,4 @@
-import io
+import asyncio
 import os
 import re
 from collections.abc import AsyncGenerator
@@ -7,6 +7,12 @@ from typing import Tuple
 
 from PIL import Image
 
+from service.image_encoding import IMAGE_FORMATS, ImageEncoding, encode_image
+from service.pdf2img import PdfPage
+
+# file suffix: media type of the page images a converted directory can hold
+PAGE_MEDIA_TYPES = {suffix: media_type for _, media_type, suffix in IMAGE_FORMATS.values()}
+
 
 def get_secret_keys() -> dict:
     return {
@@ -16,22 +22,26 @@ def get_secret_keys() -> dict:
     }
 
 
-def image_to_byte_string(image_path: str | Path) -> Tuple[bytes, str]:
+def image_to_byte_string(image_path: str | Path, encoding: ImageEncoding = ImageEncoding()) -> Tuple[bytes, str]:
     image = Image.open(image_path)
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format="PNG")  # or 'JPEG', etc.
-    img_byte_arr = img_byte_arr.getvalue()
-    return img_byte_arr, image.get_format_mimetype() or "image/png"
+    return encode_image(image, encoding), encoding.media_type
 
 
 async def sorted_images(image_dir: str | Path) -> AsyncGenerator[tuple[Path, int], None]:
-    """Returns a list of PNG files sorted by page number."""
-    image_files = list(Path(image_dir).rglob("*.png"))
+    """Returns a list of page image files sorted by page number."""
+    image_files = [file for file in Path(image_dir).rglob("Page_*") if file.suffix in PAGE_MEDIA_TYPES]
 
     # Regex to extract page number
     def extract_page_num(file: Path) -> int:
-        match = re.search(r"Page_(\d+)\.png", file.name)
+        match = re.search(r"Page_(\d+)\.", file.name)
         return int(match.group(1)) if match else 1000000  # Handle non-matching files by placing them at the end
 
     for pg_index, item in enumerate(sorted(image_files, key=extract_page_num)):
         yield item, pg_index + 1
+
+
+async def sorted_pages(image_dir: str | Path) -> AsyncGenerator[PdfPage, None]:
+    """Returns the page images of image_dir as pages, the encoded file content is used as is."""
+    async for img_path, page_no in sorted_images(image_dir):
+        data = await asyncio.to_thread(img_path.read_bytes)
+        yield PdfPage(page_no=page_no, data=data, media_type=PAGE_MEDIA_TYPES[img_path.suffix])
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from enum import Enum
+from pathlib import Path
+from typing import ClassVar, NoReturn, Optional
+
+from quart import Quart, abort
+from werkzeug.exceptions import HTTPException
+
+from library.extensions.logging_extn import get_request_id, request_id
+from service.invoice import Invoice, InvoiceData, InvoiceService
+from service.invoice.usage import DocumentUsage
+from service.pdf2img import Pdf2ImgService
+from service.workspace import WorkspaceService
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+
+class PageStatus(str, Enum):
+    EXTRACTED = "EXTRACTED"
+    NO_INVOICE = "NO_INVOICE"
+
+
+@dataclass(frozen=True, slots=True)
+class JobConfig:
+    queue_size: int = field(default=100)
+    worker_count: int = field(default=2)
+    retention_seconds: int = field(default=3600)
+    cleanup_temp_files: bool = field(default=True)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "JobConfig":
+        queue_size_ = app.config.get("JOB_QUEUE_SIZE", 100)
+        worker_count_ = app.config.get("JOB_WORKERS", 2)
+        retention_seconds_ = app.config.get("JOB_RETENTION", 3600)
+        cleanup_temp_files_ = app.config.get("CLEANUP_TEMP_FILES", True)
+        return JobConfig(
+            queue_size=queue_size_,
+            worker_count=worker_count_,
+            retention_seconds=retention_seconds_,
+            cleanup_temp_files=cleanup_temp_files_,
+        )
+
+
+@dataclass(slots=True)
+class Job:
+    document_path: Path
+    filename: str
+    document_hash: Optional[str] = field(default=None)
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = field(default=JobStatus.QUEUED)
+    created_at: datetime = field(default_factory=lambda: datetime.now(tz=timezone.utc))
+    started_at: Optional[datetime] = field(default=None)
+    finished_at: Optional[datetime] = field(default=None)
+    page_count: Optional[int] = field(default=None)
+    pages: dict[int, PageStatus] = field(default_factory=dict)
+    result: Optional[InvoiceData] = field(default=None)
+    usage: Optional[DocumentUsage] = field(default=None)
+    error: Optional[str] = field(default=None)
+    # the request that submitted the job, the worker logs under it
+    request_id: str = field(default_factory=get_request_id)
+
+
+class JobService:
+    """
+    Runs documents in the background, submitted jobs wait in a bounded queue and are picked up by
+    worker_count document workers, finished jobs are kept for retention_seconds.
+    """
+
+    config: ClassVar[JobConfig]
+    jobs: ClassVar[dict[str, Job]] = {}
+    _queue: ClassVar[Optional[asyncio.Queue[Job]]] = None
+    _workers: ClassVar[list[asyncio.Task]] = []
+
+    @classmethod
+    def configure_from_app(cls, app: Quart) -> None:
+        config_ = JobConfig.init_from_app(app)
+        cls.set_config(config_)
+        app.before_serving(cls.start)
+        app.after_serving(cls.shutdown)
+
+    @classmethod
+    def set_config(cls, config: JobConfig) -> None:
+        cls.config = config
+
+    @classmethod
+    async def start(cls) -> None:
+        cls._queue = asyncio.Queue(maxsize=cls.config.queue_size)
+        cls._workers = [
+            asyncio.create_task(cls._work(), name=f"job-worker-{index}") for index in range(cls.config.worker_count)
+        ]
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        for worker in cls._workers:
+            worker.cancel()
+        await asyncio.gather(*cls._workers, return_exceptions=True)
+        cls._workers = []
+
+    @classmethod
+    def queue_depth(cls) -> int:
+        return cls._queue.qsize() if cls._queue is not None else 0
+
+    @classmethod
+    async def submit(cls, document_path: Path, filename: str, document_hash: Optional[str] = None) -> Job:
+        if cls._queue is None:
+            await cls._reject(document_path, "The JobService is not running")
+        cls._evict_finished()
+        job = Job(document_path=document_path, filename=filename, document_hash=document_hash)
+        try:
+            cls._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            await cls._reject(document_path, "Job queue is full, retry later")
+        cls.jobs[job.job_id] = job
+        logger.info(f"Job {job.job_id} queued for {filename}, queue depth {cls.queue_depth()}")
+        return job
+
+    @classmethod
+    async def _reject(cls, document_path: Path, description: str) -> NoReturn:
+        """Turns a job away with 503, no worker will remove its upload."""
+        if cls.config.cleanup_temp_files:
+            await WorkspaceService.remove([document_path])
+        abort(503, description=description)
+
+    @classmethod
+    def get(cls, job_id: str) -> Job:
+        job = cls.jobs.get(job_id)
+        if job is None:
+            abort(404, description=f"Job {job_id} not found")
+        return job
+
+    @classmethod
+    def _evict_finished(cls) -> None:
+        now = datetime.now(tz=timezone.utc)
+        expired = [
+            job_id
+            for job_id, job in cls.jobs.items()
+            if job.finished_at is not None and (now - job.finished_at).total_seconds() > cls.config.retention_seconds
+        ]
+        for job_id in expired:
+            del cls.jobs[job_id]
+
+    @classmethod
+    async def _work(cls) -> None:
+        while True:
+            job = await cls._queue.get()
+            try:
+                await cls._run(job)
+            finally:
+                cls._queue.task_done()
+
+    @classmethod
+    async def _run(cls, job: Job) -> None:
+        request_id.set(job.request_id)
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.now(tz=timezone.utc)
+        logger.info(f"Job {job.job_id} started ...")
+
+        def on_page(page_no: int, invoice: Optional[Invoice]) -> None:
+            job.pages[page_no] = PageStatus.EXTRACTED if invoice is not None else PageStatus.NO_INVOICE
+
+        try:
+            job.usage = InvoiceService.new_usage()
+            job.page_count = await Pdf2ImgService.page_count(job.document_path)
+            job.result = await InvoiceService.run_pages(
+                Pdf2ImgService.iter_pages(job.document_path), job.document_hash, on_page=on_page, usage=job.usage
+            )
+            job.status = JobStatus.COMPLETED
+        except HTTPException as e:
+            job.status, job.error = JobStatus.FAILED, e.description
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {e}")
+            job.status, job.error = JobStatus.FAILED, str(e)
+        finally:
+            job.finished_at = datetime.now(tz=timezone.utc)
+            if cls.config.cleanup_temp_files:
+                await WorkspaceService.remove([job.document_path])
+        logger.info(f"Job {job.job_id} finished with status {job.status.value}")
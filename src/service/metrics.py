@@ -0,0 +1,69 @@
+from http import HTTPStatus
+
+from library.extensions import metrics_extn
+
+# one observation per call of the stage, the agent stages include the scheduler wait and every retry
+STAGE_SECONDS = metrics_extn.histogram(
+    "invoice_stage_seconds", "Latency of one call of a document pipeline stage in seconds.", ("stage",)
+)
+UPLOAD_SAVE_SECONDS = STAGE_SECONDS.labels("upload_save")
+RASTERIZE_SECONDS = STAGE_SECONDS.labels("rasterize")
+RENDER_JOB_SECONDS = STAGE_SECONDS.labels("render_job")
+RESIZE_SAVE_SECONDS = STAGE_SECONDS.labels("resize_save")
+AGENT1_SECONDS = STAGE_SECONDS.labels("agent1")
+AGENT2_SECONDS = STAGE_SECONDS.labels("agent2")
+AGENT2_BATCH_SECONDS = STAGE_SECONDS.labels("agent2_batch")
+
+PAGES_PROCESSED = metrics_extn.counter(
+    "invoice_pages_processed_total", "Pages that went through the agents, by outcome.", ("outcome",)
+)
+PAGES_WITH_INVOICE = PAGES_PROCESSED.labels("invoice")
+PAGES_WITHOUT_INVOICE = PAGES_PROCESSED.labels("no_invoice")
+
+DOCUMENTS_IN_FLIGHT = metrics_extn.gauge(
+    "invoice_documents_in_flight", "Documents whose pages are currently going through the agents."
+).labels()
+
+LLM_SLOT_WAIT_SECONDS = metrics_extn.histogram(
+    "invoice_llm_slot_wait_seconds",
+    "Time an LLM call waited for a slot of the concurrency limit in seconds.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+).labels()
+
+ADMITTED_PAGES = metrics_extn.gauge(
+    "invoice_admitted_pages", "Pages of the documents admitted by the admission control and not finished yet."
+).labels()
+ADMISSION_REJECTED = metrics_extn.counter(
+    "invoice_admission_rejected_total", "Requests turned away by the admission control, by reason.", ("reason",)
+)
+
+EVENT_LOOP_LAG_SECONDS = metrics_extn.histogram(
+    "event_loop_lag_seconds",
+    "How much later than scheduled the event loop woke up from a sleep, in seconds.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+).labels()
+
+LLM_HTTP_ERRORS = metrics_extn.counter(
+    "invoice_llm_http_errors_total", "Failed model HTTP calls by status, 429 or the status class.", ("status",)
+)
+
+LLM_TOKENS = metrics_extn.counter(
+    "invoice_llm_tokens_total",
+    "Tokens of the model calls by agent and kind, cached is part of input.",
+    ("agent", "kind"),
+)
+LLM_COST = metrics_extn.counter("invoice_llm_cost_total", "Cost of the model calls at the configured prices.").labels()
+TOKEN_BUDGET_SKIPPED_PAGES = metrics_extn.counter(
+    "invoice_token_budget_skipped_pages_total", "Pages not sent to the agents as their document exceeded its budget."
+).labels()
+
+
+def record_llm_tokens(agent: str, input_tokens: int, output_tokens: int, cached_tokens: int, cost: float) -> None:
+    LLM_TOKENS.labels(agent, "input").inc(input_tokens)
+    LLM_TOKENS.labels(agent, "output").inc(output_tokens)
+    LLM_TOKENS.labels(agent, "cached").inc(cached_tokens)
+    LLM_COST.inc(cost)
+
+
+def record_llm_http_error(status_code: int) -> None:
+    LLM_HTTP_ERRORS.labels("429" if status_code == HTTPStatus.TOO_MANY_REQUESTS else f"{status_code // 100}xx").inc()
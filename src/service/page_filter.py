@@ -0,0 +1,164 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from PIL import Image as PILImage
+from PIL.Image import Image
+from quart import Quart
+
+SIGNATURE_SIZE = 128  # blank pages are found on a SIGNATURE_SIZE x SIGNATURE_SIZE grayscale thumbnail
+DCT_SIZE = 32  # the perceptual hash is the DCT of a DCT_SIZE x DCT_SIZE reduction of the thumbnail
+HASH_SIZE = 8  # the lowest HASH_SIZE x HASH_SIZE frequencies form the hash
+HASH_BITS = HASH_SIZE * HASH_SIZE
+INK_CONTRAST = 0.25  # a pixel is ink when it is this much darker than the paper
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """The orthonormal DCT-II matrix, matrix @ pixels @ matrix.T is the 2D DCT of a square image."""
+    frequencies = np.arange(size)[:, None]
+    positions = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * positions + 1) * frequencies / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+DCT_MATRIX = _dct_matrix(DCT_SIZE)
+
+
+@dataclass(frozen=True, slots=True)
+class PageFilterConfig:
+    blank: bool = field(default=False)
+    duplicates: bool = field(default=False)
+    max_ink: float = field(default=0.0001)
+    min_std: float = field(default=0.003)
+    max_distance: float = field(default=0.1)
+    max_difference: float = field(default=0.1)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "PageFilterConfig":
+        blank_ = app.config.get("PAGE_FILTER_BLANK", False)
+        duplicates_ = app.config.get("PAGE_FILTER_DUPLICATES", False)
+        max_ink_ = app.config.get("PAGE_BLANK_MAX_INK", 0.0001)
+        min_std_ = app.config.get("PAGE_BLANK_MIN_STD", 0.003)
+        max_distance_ = app.config.get("PAGE_DUPLICATE_MAX_DISTANCE", 0.1)
+        max_difference_ = app.config.get("PAGE_DUPLICATE_MAX_DIFFERENCE", 0.1)
+        return PageFilterConfig(
+            blank=blank_,
+            duplicates=duplicates_,
+            max_ink=max_ink_,
+            min_std=min_std_,
+            max_distance=max_distance_,
+            max_difference=max_difference_,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.blank or self.duplicates
+
+
+@dataclass(frozen=True, slots=True)
+class PageSignature:
+    """Cheap statistics of a rendered page, computed where the page is rendered and compared in the parent."""
+
+    ink_coverage: float
+    std: float
+    phash: np.ndarray  # packed bits, HASH_BITS // 8 bytes
+    thumbnail: np.ndarray  # SIGNATURE_SIZE x SIGNATURE_SIZE grayscale, uint8
+    paper: float  # the median of the thumbnail, 0 to 1
+    contrast: float  # from the paper to the darkest cell, at least INK_CONTRAST
+
+
+def perceptual_hash(pixels: np.ndarray) -> np.ndarray:
+    """DCT hash of a grayscale image, a bit is set for every low frequency above the median of them."""
+    factor = pixels.shape[0] // DCT_SIZE
+    reduced = pixels.reshape(DCT_SIZE, factor, DCT_SIZE, factor).mean(axis=(1, 3))
+    coefficients = (DCT_MATRIX @ reduced @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # the first coefficient is the mean brightness, it says nothing about the layout
+    return np.packbits(coefficients > np.median(coefficients[1:]))
+
+
+def page_signature(image: Image) -> PageSignature:
+    thumbnail = image.convert("L").resize((SIGNATURE_SIZE, SIGNATURE_SIZE), PILImage.Resampling.BOX)
+    gray = np.asarray(thumbnail, dtype=np.uint8)
+    pixels = gray.astype(np.float32) / 255
+    # the median is the paper colour, which keeps tinted and dark scans comparable
+    paper = np.median(pixels)
+    ink_coverage = float(np.count_nonzero(pixels < paper - INK_CONTRAST)) / pixels.size
+    return PageSignature(
+        ink_coverage=ink_coverage,
+        std=float(pixels.std()),
+        phash=perceptual_hash(pixels),
+        thumbnail=gray,
+        paper=float(paper),
+        contrast=max(float(paper - pixels.min()), INK_CONTRAST),
+    )
+
+
+def _normalized(signature: PageSignature) -> np.ndarray:
+    return (signature.thumbnail.astype(np.float32) / 255 - signature.paper) / signature.contrast
+
+
+def thumbnail_difference(page: PageSignature, earlier: PageSignature) -> float:
+    """Largest difference of two thumbnail cells, both scaled from their paper to their darkest ink."""
+    # the scaling keeps a faded or darker scan of a page close to the page
+    return float(np.abs(_normalized(page) - _normalized(earlier)).max())
+
+
+@dataclass(slots=True)
+class PageFilterStats:
+    checked: int = field(default=0)
+    blank: int = field(default=0)
+    duplicate: int = field(default=0)
+    near_duplicate: int = field(default=0)
+
+    def snapshot(self) -> dict:
+        # every flagged page is one agent1 call less
+        return {
+            "checked": self.checked,
+            "blank": self.blank,
+            "duplicate": self.duplicate,
+            "near_duplicate_kept": self.near_duplicate,
+            "llm_calls_avoided": self.blank + self.duplicate,
+        }
+
+
+class PageFilter:
+    """
+    Flags the blank and duplicate pages of one document. A page is blank when its ink coverage is at most
+    max_ink or its grayscale standard deviation at most min_std. The perceptual hash finds the earlier pages
+    looking alike, those differing in at most max_distance of the hash bits, and a page is dropped as a
+    duplicate of one of them when no cell of their thumbnails differs by more than max_difference. Noise,
+    re-encoding and rescanning shift every cell a little, while invoices of one template that differ in their
+    text, even in a single number, change a few cells a lot. Those look alike to the hash too, they are kept
+    and counted as near duplicates.
+    """
+
+    def __init__(self, config: PageFilterConfig, stats: PageFilterStats):
+        self.config = config
+        self.stats = stats
+        self._page_nos: list[int] = []
+        self._signatures: list[PageSignature] = []
+        self._hashes = np.empty((0, HASH_BITS // 8), dtype=np.uint8)
+
+    def check(self, page_no: int, signature: PageSignature) -> Optional[str]:
+        """Returns why the page is skipped, None for pages that go to the agents."""
+        self.stats.checked += 1
+        config = self.config
+        if config.blank and (signature.ink_coverage <= config.max_ink or signature.std <= config.min_std):
+            self.stats.blank += 1
+            return "blank page"
+        if not config.duplicates:
+            return None
+        if len(self._page_nos):
+            distances = np.bitwise_count(self._hashes ^ signature.phash).sum(axis=1) / HASH_BITS
+            alike = np.flatnonzero(distances <= config.max_distance)
+            for index in alike:
+                if thumbnail_difference(signature, self._signatures[index]) <= config.max_difference:
+                    self.stats.duplicate += 1
+                    return f"duplicate of page {self._page_nos[index]}"
+            if len(alike):
+                self.stats.near_duplicate += 1
+        self._page_nos.append(page_no)
+        self._signatures.append(signature)
+        self._hashes = np.vstack((self._hashes, signature.phash))
+        return None
@@ -1,17 +1,38 @@
 import asyncio
 import logging
-from collections.abc import AsyncGenerator
-from dataclasses import dataclass, field
+import math
+import re
+import subprocess
+from collections import deque
+from collections.abc import AsyncGenerator, Iterator
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import ClassVar
+from typing import ClassVar, Optional, TypeVar
 
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image as PILImage
 from PIL.Image import Image
 from quart import Quart, abort
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
 
+from library.extensions import health_extn, startup_extn
+from service.executors import ExecutorService
+from service.image_encoding import IMAGE_FORMATS, ImageEncoding, encode_image
+from service.metrics import RASTERIZE_SECONDS, RENDER_JOB_SECONDS, RESIZE_SAVE_SECONDS
+from service.page_filter import PageFilter, PageFilterConfig, PageFilterStats, PageSignature, page_signature
+from service.workspace import WorkspaceService
+
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+RENDER_DPI = 200
+# pdftoppm hands raw PPM to pdf2image, no compression on either side of the pipe
+RENDER_FORMAT = "ppm"
+PAGE_SIZE_PATTERN = re.compile(r"([\d.]+) x ([\d.]+) pts")
+TEXT_MEDIA_TYPE = "text/plain"
+
 
 @dataclass(frozen=True, slots=True)
 class Pdf2ImgConfig:
@@ -20,6 +41,30 @@ class Pdf2ImgConfig:
     max_width: int = field(default=1120)
     max_height: int = field(default=1120)
     thread_count: int = field(default=1)
+    worker_count: int = field(default=1)
+    max_pages_in_memory: int = field(default=8)
+    save_pages: bool = field(default=False)
+    size_aware: bool = field(default=True)
+    text_layer: bool = field(default=False)
+    text_min_chars: int = field(default=200)
+    text_min_printable_ratio: float = field(default=0.9)
+    page_filter: PageFilterConfig = field(default_factory=PageFilterConfig)
+    encoding: ImageEncoding = field(default_factory=ImageEncoding)
+
+    def fingerprint(self) -> str:
+        """The settings that decide which pages reach the agents and how they look, part of the document cache key."""
+        return repr(
+            (
+                self.max_width,
+                self.max_height,
+                self.size_aware,
+                self.text_layer,
+                self.text_min_chars,
+                self.text_min_printable_ratio,
+                self.page_filter,
+                self.encoding,
+            )
+        )
 
     @classmethod
     def init_from_app(cls, app: Quart) -> "Pdf2ImgConfig":
@@ -28,85 +73,454 @@ class Pdf2ImgConfig:
         output_path_ = Path(output_path_) / Path("pdf2img")
         if not output_path_.exists():
             output_path_.mkdir(parents=True)
-        max_width_ = app.config.get("max_width", 1120)
-        max_height_ = app.config.get("max_height", 1120)
+        max_width_ = app.config.get("MAX_IMG_WIDTH", 1120)
+        max_height_ = app.config.get("MAX_IMG_HEIGHT", 1120)
+        thread_count_ = app.config.get("PDF2IMG_THREAD_COUNT", 1)
+        worker_count_ = app.config.get("PDF2IMG_WORKERS", 1)
+        max_pages_in_memory_ = app.config.get("PDF2IMG_MAX_PAGES_IN_MEMORY", 8)
+        save_pages_ = app.config.get("PDF2IMG_SAVE_PAGES", False)
+        size_aware_ = app.config.get("PDF2IMG_SIZE_AWARE", True)
+        text_layer_ = app.config.get("TEXT_LAYER_ENABLED", False)
+        text_min_chars_ = app.config.get("TEXT_LAYER_MIN_CHARS", 200)
+        text_min_printable_ratio_ = app.config.get("TEXT_LAYER_MIN_PRINTABLE_RATIO", 0.9)
+        page_filter_ = PageFilterConfig.init_from_app(app)
+        encoding_ = ImageEncoding.init_from_app(app)
         return Pdf2ImgConfig(
-            poppler_path=poppler_path_, output_path=output_path_, max_width=max_width_, max_height=max_height_
+            poppler_path=poppler_path_,
+            output_path=output_path_,
+            max_width=max_width_,
+            max_height=max_height_,
+            thread_count=thread_count_,
+            worker_count=worker_count_,
+            max_pages_in_memory=max_pages_in_memory_,
+            save_pages=save_pages_,
+            size_aware=size_aware_,
+            text_layer=text_layer_,
+            text_min_chars=text_min_chars_,
+            text_min_printable_ratio=text_min_printable_ratio_,
+            page_filter=page_filter_,
+            encoding=encoding_,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class RenderJob:
+    """A contiguous page range of one document, rendered by a single worker process."""
+
+    pdf_path: Path
+    first_page: int
+    last_page: int
+    output_folder: Optional[Path] = field(default=None)
+    poppler_path: Optional[Path] = field(default=None)
+    max_width: int = field(default=1120)
+    max_height: int = field(default=1120)
+    dpi: float = field(default=RENDER_DPI)
+    window: int = field(default=0)
+    signatures: bool = field(default=False)
+    encoding: ImageEncoding = field(default_factory=ImageEncoding)
+
+
+@dataclass(frozen=True, slots=True)
+class PdfPage:
+    """
+    A page handed from the converter to the agents without touching the disk, either an encoded page
+    image or, for a page with a usable text layer, its text and no image data. Pages with a skip_reason
+    are not sent to the agents.
+    """
+
+    page_no: int
+    data: bytes
+    media_type: str = field(default="image/png")
+    text: Optional[str] = field(default=None)
+    signature: Optional[PageSignature] = field(default=None)
+    skip_reason: Optional[str] = field(default=None)
+
+
+def split_pages(first_page: int, last_page: int, size: int) -> list[tuple[int, int]]:
+    """Splits first_page..last_page into consecutive ranges of at most size pages, size 0 keeps one range."""
+    if size <= 0:
+        return [(first_page, last_page)]
+    return [(first, min(first + size - 1, last_page)) for first in range(first_page, last_page + 1, size)]
+
+
+def target_dpi(width_pt: float, height_pt: float, max_width: int, max_height: int) -> float:
+    """The DPI at which poppler renders the page already fitted the way fit_image would resize it."""
+    if width_pt < height_pt:
+        dpi = min(RENDER_DPI, max_height * 72 / height_pt)
+    elif width_pt > height_pt:
+        dpi = min(RENDER_DPI, max_width * 72 / width_pt)
+    else:
+        dpi = RENDER_DPI
+    # round down so pdftoppm's rounding up of the pixel size stays within the bounds
+    return math.floor(dpi * 100) / 100
+
+
+def dpi_segments(
+    dpis: list[float], first_page: int, last_page: int, skip: frozenset[int] = frozenset()
+) -> list[tuple[int, int, float]]:
+    """
+    Groups consecutive pages of first_page..last_page rendered at the same DPI, dpis is indexed by page_no - 1.
+    Pages in skip are left out and end the segment they fall into.
+    """
+    segments: list[tuple[int, int, float]] = []
+    for page_no in range(first_page, last_page + 1):
+        dpi = dpis[page_no - 1]
+        if page_no in skip:
+            continue
+        if segments and segments[-1][2] == dpi and segments[-1][1] == page_no - 1:
+            segments[-1] = (segments[-1][0], page_no, dpi)
+        else:
+            segments.append((page_no, page_no, dpi))
+    return segments
+
+
+def extract_text_layer(pdf_path: str | Path, poppler_path: Optional[str | Path] = None) -> list[str]:
+    """The embedded text of every page, in reading layout, from a single pdftotext run."""
+    command = str(Path(poppler_path) / "pdftotext") if poppler_path else "pdftotext"
+    output = subprocess.run(  # noqa: S603
+        [command, "-layout", "-enc", "UTF-8", "-q", str(pdf_path), "-"], capture_output=True, check=True
+    ).stdout.decode("utf-8", errors="replace")
+    # pdftotext ends every page with a form feed
+    return ["\n".join(line.rstrip() for line in page.splitlines()).strip() for page in output.split("\f")[:-1]]
+
+
+def is_usable_text(text: str, min_chars: int, min_printable_ratio: float) -> bool:
+    """
+    Judges whether a text layer can replace reading the page image. Scanned pages have no text or only an
+    OCR stamp, broken font encodings show up as replacement and control characters.
+    """
+    chars = [char for char in text if not char.isspace()]
+    if len(chars) < min_chars:
+        return False
+    printable = sum(1 for char in chars if char.isprintable() and char != "\ufffd")
+    return printable / len(chars) >= min_printable_ratio
+
+
+def fit_image(image: Image, max_width: int, max_height: int) -> Image:
+    """Downsizes the image along its longer side, keeping the aspect ratio."""
+    width, height = image.size
+    if width < height and height > max_height:
+        new_height = max_height
+        new_width = int(new_height * (width / height))
+        return image.resize((new_width, new_height))
+    if width > height and width > max_width:
+        new_width = max_width
+        new_height = int(new_width * (height / width))
+        return image.resize((new_width, new_height))
+    return image
+
+
+def _iter_fitted_pages(job: RenderJob) -> Iterator[tuple[int, Image]]:
+    """At most job.window pages are decoded at a time when job.window is set."""
+    for first_page, last_page in split_pages(job.first_page, job.last_page, job.window):
+        images = convert_from_path(
+            job.pdf_path,
+            dpi=job.dpi,
+            poppler_path=job.poppler_path,
+            fmt=RENDER_FORMAT,
+            first_page=first_page,
+            last_page=last_page,
         )
+        for page_no, image in enumerate(images, start=first_page):
+            yield page_no, fit_image(image, job.max_width, job.max_height)
+        del images
+
+
+def load_image_plugins() -> None:
+    """PIL imports its format plugins on the first open or save, this imports them up front."""
+    PILImage.init()
+
+
+def render_page_range(job: RenderJob) -> list[Path]:
+    """Renders, resizes and saves the pages of a RenderJob, meant to run inside a worker process."""
+    saved_paths = []
+    for page_no, image in _iter_fitted_pages(job):
+        save_path = job.output_folder / f"Page_{page_no:02}{job.encoding.suffix}"
+        save_path.write_bytes(encode_image(image, job.encoding))
+        saved_paths.append(save_path)
+    return saved_paths
+
+
+def encode_page(
+    page_no: int, image: Image, encoding: ImageEncoding, output_folder: Optional[Path], signatures: bool
+) -> PdfPage:
+    """Encodes a fitted page image, the page is written to output_folder only when it is set."""
+    data = encode_image(image, encoding)
+    if output_folder is not None:
+        (output_folder / f"Page_{page_no:02}{encoding.suffix}").write_bytes(data)
+    signature = page_signature(image) if signatures else None
+    return PdfPage(page_no=page_no, data=data, media_type=encoding.media_type, signature=signature)
+
+
+def render_page_range_to_memory(job: RenderJob) -> list[PdfPage]:
+    """Renders and encodes the pages of a RenderJob, pages are written to job.output_folder only when it is set."""
+    return [
+        encode_page(page_no, image, job.encoding, job.output_folder, job.signatures)
+        for page_no, image in _iter_fitted_pages(job)
+    ]
 
 
 class Pdf2ImgService:
-    config: ClassVar[Pdf2ImgConfig]
+    config: ClassVar[Optional[Pdf2ImgConfig]] = None
+    filter_stats: ClassVar[PageFilterStats] = PageFilterStats()
 
     @classmethod
     def configure_from_app(cls, app: Quart) -> None:
         config_ = Pdf2ImgConfig.init_from_app(app)
         cls.set_config(config_)
+        health_extn.register_stats("page_filter", cls.filter_stats.snapshot)
+        startup_extn.register_warmup("imaging", cls.warm_up)
 
     @classmethod
     def set_config(cls, config: Pdf2ImgConfig) -> None:
         cls.config = config
 
     @classmethod
-    async def get_images(
-        cls, output_folder: Path, pdf_path: str | Path, fmt: str = "png"
-    ) -> AsyncGenerator[tuple[Image, Path], None]:
-        images = convert_from_path(pdf_path, poppler_path=cls.config.poppler_path, fmt=fmt)
-        images_list = [(image, output_folder / f"Page_{index + 1:02}.png") for index, image in enumerate(images)]
-        for item in await asyncio.to_thread(lambda: images_list):
-            yield item
+    async def warm_up(cls) -> None:
+        """Loads the image plugins and, with parallel rendering, starts the render processes up front."""
+        await ExecutorService.run_io(load_image_plugins)
+        if cls.config.worker_count > 1:
+            workers = ExecutorService.config.process_workers
+            await asyncio.gather(*(ExecutorService.run_cpu(load_image_plugins) for _ in range(workers)))
+
+    @classmethod
+    async def page_count(cls, pdf_path: str | Path) -> int:
+        info = await asyncio.to_thread(pdfinfo_from_path, str(pdf_path), poppler_path=cls.config.poppler_path)
+        return int(info["Pages"])
+
+    @classmethod
+    async def page_dpis(cls, pdf_path: str | Path) -> list[float]:
+        """
+        The render DPI of every page, with size_aware set each page is rendered straight at the
+        resolution fitting max_width/max_height instead of at RENDER_DPI and resized afterwards.
+        """
+        if not cls.config.size_aware:
+            return [RENDER_DPI] * await cls.page_count(pdf_path)
+        info = await asyncio.to_thread(
+            pdfinfo_from_path, str(pdf_path), poppler_path=cls.config.poppler_path, first_page=1, last_page=2**31 - 1
+        )
+        dpis = []
+        for page_no in range(1, int(info["Pages"]) + 1):
+            size = PAGE_SIZE_PATTERN.match(info.get(f"Page {page_no:>4} size", ""))
+            if size is None:
+                dpis.append(RENDER_DPI)
+                continue
+            width_pt, height_pt = float(size.group(1)), float(size.group(2))
+            if info.get(f"Page {page_no:>4} rot", "0").strip() in ("90", "270"):
+                width_pt, height_pt = height_pt, width_pt
+            dpis.append(target_dpi(width_pt, height_pt, cls.config.max_width, cls.config.max_height))
+        return dpis
+
+    @classmethod
+    async def text_pages(cls, pdf_path: str | Path) -> dict[int, str]:
+        """The text of every page whose text layer is usable, keyed by page_no."""
+        try:
+            texts = await asyncio.to_thread(extract_text_layer, pdf_path, cls.config.poppler_path)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.warning(f"Could not read the text layer, rendering every page: {e}")
+            return {}
+        pages = {
+            page_no: text
+            for page_no, text in enumerate(texts, start=1)
+            if is_usable_text(text, cls.config.text_min_chars, cls.config.text_min_printable_ratio)
+        }
+        logger.info(f"{len(pages)} of {len(texts)} pages are read from the text layer")
+        return pages
+
+    @staticmethod
+    def _page_ranges(page_count: int, parts: int, window: int = 0) -> list[tuple[int, int]]:
+        """One range per part, ranges are cut to window pages when it is set."""
+        size = math.ceil(page_count / max(parts, 1))
+        return split_pages(1, page_count, min(size, window) if window else size)
+
+    @classmethod
+    def _render_jobs(
+        cls, pdf_path: str | Path, dpis: list[float], output_folder: Optional[Path], skip: frozenset[int] = frozenset()
+    ) -> list[RenderJob]:
+        return [
+            RenderJob(
+                pdf_path=Path(pdf_path),
+                first_page=first_page,
+                last_page=last_page,
+                output_folder=output_folder,
+                poppler_path=cls.config.poppler_path,
+                max_width=cls.config.max_width,
+                max_height=cls.config.max_height,
+                dpi=dpi,
+                window=cls.config.max_pages_in_memory,
+                signatures=cls.config.page_filter.enabled,
+                encoding=cls.config.encoding,
+            )
+            for range_first, range_last in cls._page_ranges(
+                len(dpis), cls.config.worker_count, cls.config.max_pages_in_memory
+            )
+            for first_page, last_page, dpi in dpi_segments(dpis, range_first, range_last, skip)
+        ]
+
+    @classmethod
+    async def _iter_images(
+        cls, pdf_path: str | Path, skip: frozenset[int] = frozenset()
+    ) -> AsyncGenerator[tuple[int, Image], None]:
+        """
+        With max_pages_in_memory set, renders that many pages at a time and only renders the next
+        window once the consumer has pulled every page of the current one. Pages in skip are not rendered.
+        """
+        dpis = await cls.page_dpis(pdf_path)
+        for segment_first, segment_last, dpi in dpi_segments(dpis, 1, len(dpis), skip):
+            for first_page, last_page in split_pages(segment_first, segment_last, cls.config.max_pages_in_memory):
+                with RASTERIZE_SECONDS.time():
+                    images = await asyncio.to_thread(
+                        convert_from_path,
+                        pdf_path,
+                        dpi=dpi,
+                        poppler_path=cls.config.poppler_path,
+                        fmt=RENDER_FORMAT,
+                        first_page=first_page,
+                        last_page=last_page,
+                        thread_count=cls.config.thread_count,
+                    )
+                for page_no, image in enumerate(images, start=first_page):
+                    yield page_no, image
+                del images
+
+    @classmethod
+    async def get_images(cls, output_folder: Path, pdf_path: str | Path) -> AsyncGenerator[tuple[Image, Path], None]:
+        async for page_no, image in cls._iter_images(pdf_path):
+            yield image, output_folder / f"Page_{page_no:02}{cls.config.encoding.suffix}"
+
+    @classmethod
+    async def _convert_to_image(cls, output_folder: Path, pdf_path: str | Path) -> None:
+        async for image, img_path in cls.get_images(output_folder, pdf_path):
+            await cls._resize_and_save(image, img_path, cls.config.encoding.fmt)
+
+    @classmethod
+    async def _convert_parallel(cls, output_folder: Path, pdf_path: str | Path) -> None:
+        dpis = await cls.page_dpis(pdf_path)
+        jobs = cls._render_jobs(pdf_path, dpis, output_folder)
+        logger.info(f"Rendering {len(dpis)} pages in {len(jobs)} ranges ...")
+        await asyncio.gather(*(cls._timed_job(ExecutorService.run_cpu(render_page_range, job)) for job in jobs))
+
+    @classmethod
+    async def iter_pages(cls, pdf_path: str | Path) -> AsyncGenerator[PdfPage, None]:
+        """
+        Yields every page of the document as encoded image bytes in page order, each page is encoded exactly once.
+        Pages are additionally written to disk for debugging when save_pages is set. With text_layer set,
+        pages with a usable text layer come first as text only pages and only the others are rendered.
+        Rendered pages found blank or duplicate by the page filter carry a skip_reason.
+        """
+        if cls.config is None:
+            abort(403, description="The PdfToImageService is not configured")
+        filename = secure_filename(Path(pdf_path).stem)
+        output_folder = None
+        if cls.config.save_pages:
+            output_folder = WorkspaceService.scratch_dir(cls.config.output_path, filename)
+            logger.info(f"Saving page images to {output_folder!s} ...")
+        try:
+            text_pages = await cls.text_pages(pdf_path) if cls.config.text_layer else {}
+            for page_no, text in text_pages.items():
+                yield PdfPage(page_no=page_no, data=b"", media_type=TEXT_MEDIA_TYPE, text=text)
+            page_filter = (
+                PageFilter(cls.config.page_filter, cls.filter_stats) if cls.config.page_filter.enabled else None
+            )
+            async for page in cls._iter_rendered_pages(pdf_path, output_folder, frozenset(text_pages)):
+                if page_filter is None:
+                    yield page
+                    continue
+                skip_reason = page_filter.check(page.page_no, page.signature)
+                if skip_reason is not None:
+                    logger.info(f"Page {page.page_no} is skipped, {skip_reason}")
+                yield replace(page, signature=None, skip_reason=skip_reason)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error While Processing Pdf str{e}")
+            abort(403, description=f"PdfToImageService Error While processing {filename}")
+
+    @classmethod
+    async def _iter_rendered_pages(
+        cls, pdf_path: str | Path, output_folder: Optional[Path], skip: frozenset[int]
+    ) -> AsyncGenerator[PdfPage, None]:
+        if cls.config.worker_count > 1:
+            async for page in cls._iter_pages_parallel(pdf_path, output_folder, skip):
+                yield page
+            return
+        async for page_no, image in cls._iter_images(pdf_path, skip):
+            with RESIZE_SAVE_SECONDS.time():
+                page = await ExecutorService.run_io(cls._fit_and_encode, page_no, image, output_folder)
+            yield page
 
     @classmethod
-    async def _convert_to_image(cls, output_folder: Path, pdf_path: str | Path, fmt: str = "png") -> None:
-        tasks = []
-        async for image, img_path in cls.get_images(output_folder, pdf_path, fmt):
-            tasks.append(cls._resize_and_save(image, img_path, fmt))
-        await asyncio.gather(*tasks)
+    def _fit_and_encode(cls, page_no: int, image: Image, output_folder: Optional[Path]) -> PdfPage:
+        fitted = fit_image(image, cls.config.max_width, cls.config.max_height)
+        return encode_page(page_no, fitted, cls.config.encoding, output_folder, cls.config.page_filter.enabled)
+
+    @classmethod
+    async def _iter_pages_parallel(
+        cls, pdf_path: str | Path, output_folder: Optional[Path], skip: frozenset[int] = frozenset()
+    ) -> AsyncGenerator[PdfPage, None]:
+        """
+        Yields the pages in order while worker_count render jobs run ahead of the consumer, the next job is
+        submitted once the oldest one is taken. A job holds its encoded pages until then, at most
+        max_pages_in_memory of them.
+        """
+        dpis = await cls.page_dpis(pdf_path)
+        jobs = deque(cls._render_jobs(pdf_path, dpis, output_folder, skip))
+        futures: deque[asyncio.Future[list[PdfPage]]] = deque()
+
+        def submit_next() -> None:
+            job = jobs.popleft()
+            futures.append(
+                asyncio.ensure_future(cls._timed_job(ExecutorService.run_cpu(render_page_range_to_memory, job)))
+            )
+
+        try:
+            while jobs and len(futures) < cls.config.worker_count:
+                submit_next()
+            while futures:
+                pages = await futures.popleft()
+                if jobs:
+                    submit_next()
+                for page in pages:
+                    yield page
+        finally:
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    async def _timed_job(future: asyncio.Future[T]) -> T:
+        """A render job runs rasterize, resize and encode of its pages in a worker process, it is timed as a whole."""
+        with RENDER_JOB_SECONDS.time():
+            return await future
 
     @classmethod
     async def _resize_and_save(cls, image: Image, save_path: str | Path, fmt: str = "png") -> None:
-        width, height = image.size
-        if fmt == "png":
-            save_format_ = "PNG"
-        else:
+        if fmt not in IMAGE_FORMATS:
             abort(403, description=f"File format {fmt} not suported")
+        encoding = replace(cls.config.encoding, fmt=fmt)
+        width, height = image.size
         logger.info(f"Processing Images of shape {width}, {height}")
-        if width < height and height > cls.config.max_height:
-            new_height = cls.config.max_height
-            new_width = int(new_height * (width / height))
-            new_image = image.resize((new_width, new_height))
-            logger.info(f"Resized Images to shape {new_image.size}")
-            new_image.save(save_path, save_format_)
-        elif width > height and width > cls.config.max_width:
-            new_width = cls.config.max_width
-            new_height = int(new_width * (height / width))
-            new_image = image.resize((new_width, new_height))
+        with RESIZE_SAVE_SECONDS.time():
+            await ExecutorService.run_io(cls._fit_and_save, image, Path(save_path), encoding)
+
+    @classmethod
+    def _fit_and_save(cls, image: Image, save_path: Path, encoding: ImageEncoding) -> None:
+        new_image = fit_image(image, cls.config.max_width, cls.config.max_height)
+        if new_image is not image:
             logger.info(f"Resized Images to shape {new_image.size}")
-            new_image.save(save_path, save_format_)
-        else:
-            image.save(save_path, save_format_)
+        save_path.write_bytes(encode_image(new_image, encoding))
 
     @classmethod
     async def convert(cls, pdf_path: str | Path) -> Path:
         if cls.config is None:
             abort(403, description="The PdfToImageService is not configured")
         filename = secure_filename(Path(pdf_path).stem)
-        filename = cls._resolve_conflict(filename)
-        output_folder = cls.config.output_path / Path(filename)
-        output_folder.mkdir(parents=True)
+        output_folder = WorkspaceService.scratch_dir(cls.config.output_path, filename)
         try:
-            await cls._convert_to_image(output_folder, pdf_path)
+            if cls.config.worker_count > 1:
+                await cls._convert_parallel(output_folder, pdf_path)
+            else:
+                await cls._convert_to_image(output_folder, pdf_path)
         except Exception as e:
             logger.error(f"Error While Processing Pdf str{e}")
             abort(403, description=f"PdfToImageService Error While processing {filename}")
         return output_folder
-
-    @classmethod
-    def _resolve_conflict(cls, subfolder: str) -> str:
-        if not (cls.config.output_path / Path(subfolder)).exists():
-            return subfolder
-        count = 0
-        while True:
-            count += 1
-            if not (cls.config.output_path / Path(f"{subfolder}_{count}")).exists():
-                return f"{subfolder}_{count}"
@@ -0,0 +1,332 @@
+import asyncio
+import fcntl
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from collections.abc import Iterable
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import IO, ClassVar, Optional
+
+from quart import Quart
+
+from library.extensions import health_extn
+
+logger = logging.getLogger(__name__)
+
+# the lock files of the workers serving from the workspace, one per worker held while it runs
+WORKERS_AREA = ".workers"
+# folders under the workspace root the janitor never touches, cache/ holds the result cache
+EXCLUDED_AREAS = frozenset({"cache", WORKERS_AREA})
+# the worker id and the random part unique_name appends to a stem
+OWNER_PATTERN = re.compile(r"_([0-9a-f]{8})-[0-9a-f]{12}(?:\.[^.]*)?$")
+
+
+def _new_worker_id() -> str:
+    return uuid.uuid4().hex[:8]
+
+
+# every worker process names its entries with its own id, forked workers get a new one
+_worker_id = _new_worker_id()
+
+
+def _reset_worker_id() -> None:
+    global _worker_id  # noqa: PLW0603
+    _worker_id = _new_worker_id()
+
+
+os.register_at_fork(after_in_child=_reset_worker_id)
+
+
+def unique_name(stem: str) -> str:
+    """A name no other upload or scratch directory has, without looking at the file system, owned by this worker."""
+    return f"{stem}_{_worker_id}-{uuid.uuid4().hex[:12]}"
+
+
+def entry_owner(name: str) -> Optional[str]:
+    """The id of the worker that named a workspace entry, None for entries not named by unique_name."""
+    match = OWNER_PATTERN.search(name)
+    return match.group(1) if match else None
+
+
+def live_workers(root: Path, own_id: str) -> set[str]:
+    """
+    The ids of the other workers holding their lock file. The lock files of workers that are gone are removed,
+    their entries are orphans.
+    """
+    workers_dir = root / WORKERS_AREA
+    if not workers_dir.is_dir():
+        return set()
+    live = set()
+    for lock_path in workers_dir.iterdir():
+        if lock_path.name != own_id and _is_locked(lock_path):
+            live.add(lock_path.name)
+    return live
+
+
+def _is_locked(lock_path: Path) -> bool:
+    try:
+        with lock_path.open("rb") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # removed while locked, a worker locking the file meanwhile finds it unlinked once it has the lock
+            lock_path.unlink(missing_ok=True)
+    except FileNotFoundError:
+        return False
+    except BlockingIOError:
+        return True
+    return False
+
+
+def _is_linked(lock_file: IO[bytes], lock_path: Path) -> bool:
+    """Whether lock_path still names the open lock_file."""
+    try:
+        linked = lock_path.stat()
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(lock_file.fileno())
+    return (linked.st_dev, linked.st_ino) == (opened.st_dev, opened.st_ino)
+
+
+def _remove_path(path: Path) -> bool:
+    try:
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.error(f"Error while removing {path}: {e}")
+        return False
+    return True
+
+
+def remove_paths(paths: Iterable[Path]) -> int:
+    """Removes files and directory trees, missing paths are skipped. Returns the number of paths removed."""
+    return sum(_remove_path(path) for path in paths)
+
+
+def _tree_size(path: str) -> int:
+    size = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                size += _tree_size(entry.path)
+            else:
+                size += entry.stat(follow_symlinks=False).st_size
+    return size
+
+
+@dataclass(frozen=True, slots=True)
+class WorkspaceEntry:
+    path: Path
+    modified: float
+    size: int
+    # False for the entries of another live worker
+    removable: bool = field(default=True)
+
+
+def scan_workspace(root: Path, excluded: frozenset[str] = EXCLUDED_AREAS) -> list[WorkspaceEntry]:
+    """Every upload and scratch directory, the entries of the folders directly under root."""
+    entries = []
+    if not root.is_dir():
+        return entries
+    with os.scandir(root) as areas:
+        for area in areas:
+            if area.name in excluded or not area.is_dir(follow_symlinks=False):
+                continue
+            with os.scandir(area.path) as children:
+                for child in children:
+                    try:
+                        stat = child.stat(follow_symlinks=False)
+                        size = _tree_size(child.path) if child.is_dir(follow_symlinks=False) else stat.st_size
+                    except FileNotFoundError:
+                        continue
+                    entries.append(WorkspaceEntry(path=Path(child.path), modified=stat.st_mtime, size=size))
+    return entries
+
+
+def plan_sweep(entries: list[WorkspaceEntry], now: float, max_age: int, max_bytes: int, min_age: int) -> list[Path]:
+    """
+    The removable entries older than max_age, then the oldest of the rest until all entries fit in max_bytes.
+    Entries younger than min_age may belong to a document still being processed and are never chosen.
+    """
+    expired = [entry for entry in entries if entry.removable and now - entry.modified > max_age]
+    kept = sorted(set(entries) - set(expired), key=lambda entry: entry.modified)
+    total_bytes = sum(entry.size for entry in kept)
+    for entry in (entry for entry in kept if entry.removable):
+        if not max_bytes or total_bytes <= max_bytes:
+            break
+        if now - entry.modified < min_age:
+            break
+        expired.append(entry)
+        total_bytes -= entry.size
+    return [entry.path for entry in expired]
+
+
+@dataclass(slots=True)
+class WorkspaceStats:
+    sweeps: int = field(default=0)
+    removed: int = field(default=0)
+    removed_bytes: int = field(default=0)
+    entries: int = field(default=0)
+    total_bytes: int = field(default=0)
+
+    def snapshot(self) -> dict:
+        return {
+            "sweeps": self.sweeps,
+            "removed": self.removed,
+            "removed_bytes": self.removed_bytes,
+            "entries": self.entries,
+            "total_bytes": self.total_bytes,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class WorkspaceConfig:
+    root: Optional[Path] = field(default=None)
+    janitor_enabled: bool = field(default=True)
+    janitor_interval: int = field(default=600)
+    max_age: int = field(default=24 * 3600)
+    max_bytes: int = field(default=0)
+    orphan_age: int = field(default=3600)
+
+    @classmethod
+    def init_from_app(cls, app: Quart) -> "WorkspaceConfig":
+        root_ = app.config.get("UPLOADS_DEFAULT_DEST", "")
+        janitor_enabled_ = app.config.get("WORKSPACE_JANITOR_ENABLED", True)
+        janitor_interval_ = app.config.get("WORKSPACE_JANITOR_INTERVAL", 600)
+        max_age_ = app.config.get("WORKSPACE_MAX_AGE", 24 * 3600)
+        max_bytes_ = app.config.get("WORKSPACE_MAX_BYTES", 0)
+        orphan_age_ = app.config.get("WORKSPACE_ORPHAN_AGE", 3600)
+        return WorkspaceConfig(
+            root=Path(root_) if root_ else None,
+            janitor_enabled=janitor_enabled_,
+            janitor_interval=janitor_interval_,
+            max_age=max_age_,
+            max_bytes=max_bytes_,
+            orphan_age=orphan_age_,
+        )
+
+
+class WorkspaceService:
+    """
+    Owns the uploads and scratch directories under UPLOADS_DEFAULT_DEST. Names are unique by construction,
+    deletions run in bulk on a worker thread, and a janitor removes what requests left behind: entries older
+    than max_age and, over max_bytes, the oldest entries. At start up entries older than orphan_age, left by
+    a previous run, are removed.
+
+    The workers of a deployment share the workspace. Every worker holds a lock file under .workers while it
+    runs and names its entries with its id, the janitor of a worker leaves the entries of the other live
+    workers alone and only counts their size against max_bytes.
+    """
+
+    config: ClassVar[WorkspaceConfig]
+    stats: ClassVar[WorkspaceStats] = WorkspaceStats()
+    _janitor: ClassVar[Optional[asyncio.Task]] = None
+    _lock_file: ClassVar[Optional[IO[bytes]]] = None
+
+    @classmethod
+    def configure_from_app(cls, app: Quart) -> None:
+        config_ = WorkspaceConfig.init_from_app(app)
+        cls.set_config(config_)
+        app.before_serving(cls.start)
+        app.after_serving(cls.shutdown)
+        health_extn.register_stats("workspace", cls.stats.snapshot)
+
+    @classmethod
+    def set_config(cls, config: WorkspaceConfig) -> None:
+        cls.config = config
+
+    @classmethod
+    async def start(cls) -> None:
+        if cls.config.root is None:
+            return
+        await asyncio.to_thread(cls._lock_worker, cls.config.root)
+        if cls.config.janitor_enabled:
+            cls._janitor = asyncio.create_task(cls._run_janitor(), name="workspace-janitor")
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        if cls._janitor is not None:
+            cls._janitor.cancel()
+            await asyncio.gather(cls._janitor, return_exceptions=True)
+            cls._janitor = None
+        if cls._lock_file is not None:
+            Path(cls._lock_file.name).unlink(missing_ok=True)
+            cls._lock_file.close()
+            cls._lock_file = None
+
+    @classmethod
+    def _lock_worker(cls, root: Path) -> None:
+        """
+        Marks this worker live for the janitors of the other workers until it shuts down or dies. A janitor may
+        find the new lock file before it is locked and remove it, the file is created again until the file
+        this worker locked is the one left in place.
+        """
+        lock_path = root / WORKERS_AREA / _worker_id
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            lock_file = lock_path.open("wb")
+            # a janitor checking the file holds its lock for a moment
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if _is_linked(lock_file, lock_path):
+                cls._lock_file = lock_file
+                return
+            lock_file.close()
+
+    @staticmethod
+    def scratch_dir(parent: Path, stem: str) -> Path:
+        path = parent / unique_name(stem)
+        path.mkdir(parents=True)
+        return path
+
+    @staticmethod
+    async def remove(paths: Iterable[Path]) -> None:
+        """Removes the files and directories in one hop to a worker thread."""
+        paths = list(paths)
+        removed = await asyncio.to_thread(remove_paths, paths)
+        logger.info(f"House keeping removed {removed} of {len(paths)} paths")
+
+    @classmethod
+    async def sweep(cls, max_age: Optional[int] = None) -> list[Path]:
+        max_age = cls.config.max_age if max_age is None else max_age
+        return await asyncio.to_thread(cls._sweep, max_age)
+
+    @classmethod
+    def _sweep(cls, max_age: int) -> list[Path]:
+        if cls.config.root is None:
+            return []
+        live = live_workers(cls.config.root, _worker_id)
+        entries = [
+            replace(entry, removable=entry_owner(entry.path.name) not in live)
+            for entry in scan_workspace(cls.config.root)
+        ]
+        now = time.time()
+        expired = plan_sweep(entries, now, max_age, cls.config.max_bytes, cls.config.orphan_age)
+        removed = remove_paths(expired)
+        expired_paths = set(expired)
+        removed_bytes = sum(entry.size for entry in entries if entry.path in expired_paths)
+        cls.stats.sweeps += 1
+        cls.stats.removed += removed
+        cls.stats.removed_bytes += removed_bytes
+        cls.stats.entries = len(entries) - removed
+        cls.stats.total_bytes = sum(entry.size for entry in entries) - removed_bytes
+        if expired:
+            logger.info(f"Workspace janitor removed {removed} entries, {removed_bytes} bytes")
+        return expired
+
+    @classmethod
+    async def _run_janitor(cls) -> None:
+        # the first sweep removes the orphans of a previous run without holding up the start of the worker
+        max_age = cls.config.orphan_age
+        while True:
+            try:
+                await cls.sweep(max_age)
+            except Exception as e:
+                logger.error(f"Workspace janitor failed: {e}")
+            max_age = cls.config.max_age
+            await asyncio.sleep(cls.config.janitor_interval)
@@ -1,5 +1,24 @@
+import asyncio
+from typing import Any, Optional
+
 from quart import Quart
 from quart_schema import Info, QuartSchema
+from quart_schema.openapi import OpenAPIProvider
+
+from library.extensions import startup_extn
+
+
+class CachedOpenAPIProvider(OpenAPIProvider):
+    """Builds the OpenAPI schema once, the routes no longer change once the app serves."""
+
+    def __init__(self, app: Quart, extension: QuartSchema) -> None:
+        super().__init__(app, extension)
+        self._schema: Optional[dict[str, Any]] = None
+
+    def schema(self) -> dict[str, Any]:
+        if self._schema is None:
+            self._schema = super().schema()
+        return self._schema
 
 
 def register_app(app: Quart) -> None:
@@ -7,7 +26,13 @@ def register_app(app: Quart) -> None:
     version_ = app.config.get("API_VERSION", "1.0.0")
     api_schema = QuartSchema(
         info=Info(title=title_, version=version_),
+        openapi_provider_class=CachedOpenAPIProvider,
         # conversion_preference="pydantic",
     )
 
     api_schema.init_app(app)
+
+    async def build_schema() -> None:
+        await asyncio.to_thread(api_schema.openapi_provider.schema)
+
+    startup_extn.register_warmup("openapi_schema", build_schema)
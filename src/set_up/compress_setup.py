@@ -0,0 +1,6 @@
+from application import InvoiceInferApp
+from library.extensions import compress_extn
+
+
+def register_app(app: InvoiceInferApp) -> None:
+    compress_extn.init_app(app)
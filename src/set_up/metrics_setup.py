@@ -0,0 +1,6 @@
+from application import InvoiceInferApp
+from library.extensions import metrics_extn
+
+
+def register_app(app: InvoiceInferApp) -> None:
+    metrics_extn.init_app(app)
@@ -0,0 +1,6 @@
+from application import InvoiceInferApp
+from library.extensions import startup_extn
+
+
+def register_app(app: InvoiceInferApp) -> None:
+    startup_extn.init_app(app)
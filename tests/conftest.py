@@ -0,0 +1,11 @@
+import pytest
+
+from service import InvoiceService, Pdf2ImgService
+
+
+@pytest.fixture(autouse=True)
+def _restore_service_config(monkeypatch: pytest.MonkeyPatch) -> None:
+    # the services keep their configuration on the class, every test gets back the one it started with
+    for service, names in ((InvoiceService, ("config", "scheduler")), (Pdf2ImgService, ("config",))):
+        for name in names:
+            monkeypatch.setattr(service, name, getattr(service, name, None), raising=False)
@@ -0,0 +1,126 @@
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Optional
+
+import pytest
+from werkzeug.exceptions import RequestEntityTooLarge, ServiceUnavailable, TooManyRequests
+
+from service import AdmissionService, BatchService, InvoiceService, Pdf2ImgService
+from service.admission import AdmissionConfig, AdmissionStats
+from service.batch import BatchConfig
+from service.ingest import IngestedDocument
+from service.invoice import InvoiceData
+from service.invoice.scheduler import FairScheduler
+from service.invoice.service import InvoiceSeviceConfig
+
+
+@pytest.fixture
+def page_counts(monkeypatch: pytest.MonkeyPatch) -> dict[str, int]:
+    counts: dict[str, int] = {}
+
+    async def page_count(_cls: type, pdf_path: str) -> int:
+        return counts[pdf_path]
+
+    monkeypatch.setattr(Pdf2ImgService, "page_count", classmethod(page_count))
+    monkeypatch.setattr(InvoiceService, "scheduler", FairScheduler(capacity=1))
+    config = AdmissionConfig(max_inflight_pages=10, retry_after=7)
+    monkeypatch.setattr(AdmissionService, "config", config, raising=False)
+    monkeypatch.setattr(AdmissionService, "stats", AdmissionStats())
+    monkeypatch.setattr(AdmissionService, "inflight_pages", 0)
+    monkeypatch.setattr(AdmissionService, "inflight_documents", 0)
+    return counts
+
+
+def test_idle_worker_admits_a_document_of_any_size(page_counts: dict[str, int]) -> None:
+    page_counts["large.pdf"] = 50
+
+    admission = asyncio.run(AdmissionService.admit("large.pdf"))
+
+    assert AdmissionService.inflight_pages == 50
+    admission.release()
+    admission.release()
+    assert AdmissionService.inflight_pages == 0
+    assert AdmissionService.inflight_documents == 0
+
+
+def test_document_over_the_inflight_pages_waits_for_a_release(page_counts: dict[str, int]) -> None:
+    page_counts |= {"first.pdf": 6, "second.pdf": 5}
+    first = asyncio.run(AdmissionService.admit("first.pdf"))
+
+    with pytest.raises(TooManyRequests) as rejected:
+        asyncio.run(AdmissionService.admit("second.pdf"))
+    assert rejected.value.retry_after == 7
+    assert AdmissionService.readiness() is None
+
+    first.release()
+    second = asyncio.run(AdmissionService.admit("second.pdf"))
+    assert AdmissionService.inflight_pages == 5
+    second.release()
+    assert AdmissionService.stats.rejected_busy == 1
+
+
+def test_requests_are_turned_away_while_the_llm_queue_is_full(
+    page_counts: dict[str, int], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    page_counts["document.pdf"] = 1
+    monkeypatch.setattr(AdmissionService, "config", AdmissionConfig(max_llm_queue=2))
+
+    async def run() -> None:
+        scheduler = InvoiceService.scheduler
+        await scheduler.acquire("busy")
+        waiters = [asyncio.create_task(scheduler.acquire("busy")) for _ in range(2)]
+        await asyncio.sleep(0)
+        try:
+            assert AdmissionService.readiness() == "2 LLM calls are waiting for a slot"
+            with pytest.raises(ServiceUnavailable):
+                await AdmissionService.check_capacity()
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+        assert AdmissionService.readiness() is None
+
+    asyncio.run(run())
+    assert AdmissionService.stats.rejected_saturated == 1
+
+
+def test_document_over_max_document_pages_is_rejected(
+    page_counts: dict[str, int], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    page_counts["large.pdf"] = 51
+    monkeypatch.setattr(AdmissionService, "config", AdmissionConfig(max_document_pages=50))
+
+    with pytest.raises(RequestEntityTooLarge):
+        asyncio.run(AdmissionService.admit("large.pdf"))
+
+    assert AdmissionService.inflight_pages == 0
+
+
+def test_batch_documents_are_admitted_one_by_one(page_counts: dict[str, int], monkeypatch: pytest.MonkeyPatch) -> None:
+    page_counts |= {"small.pdf": 4, "large.pdf": 60}
+    held = []
+
+    async def run_pages(_cls: type, _pages: object, _key: Optional[str], **_: object) -> InvoiceData:
+        held.append(AdmissionService.inflight_pages)
+        return InvoiceData(details=[])
+
+    async def iter_pages(_cls: type, _pdf_path: str) -> AsyncIterator[None]:
+        return
+        yield
+
+    monkeypatch.setattr(InvoiceService, "run_pages", classmethod(run_pages))
+    monkeypatch.setattr(Pdf2ImgService, "iter_pages", classmethod(iter_pages))
+    monkeypatch.setattr(AdmissionService, "config", AdmissionConfig(max_document_pages=50))
+    monkeypatch.setattr(BatchService, "config", BatchConfig(max_concurrent_documents=1), raising=False)
+    InvoiceService.set_config(InvoiceSeviceConfig())
+    documents = [IngestedDocument(path=name, filename=name, sha256=name, size=1) for name in ("small.pdf", "large.pdf")]
+
+    async def run() -> dict[str, Optional[str]]:
+        return {document.name: document.error async for document in BatchService.iter_documents(documents)}
+
+    errors = asyncio.run(run())
+
+    assert errors == {"small.pdf": None, "large.pdf": "The document has 60 pages, at most 50 are accepted"}
+    assert held == [4]
+    assert AdmissionService.inflight_pages == 0
+    assert AdmissionService.inflight_documents == 0
@@ -0,0 +1,199 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from typing import Optional
+
+import pytest
+
+from service.cache import CacheService
+from service.invoice import Invoice, InvoiceService
+from service.invoice.batching import CALL_OVERHEAD_TOKENS, BatchStats, PageBatcher, page_tokens
+from service.invoice.service import InvoiceSeviceConfig
+from service.invoice.usage import DocumentUsage, TokenBudgetExceededError, TokenUsage, current_usage
+from service.pdf2img import PdfPage
+
+TIMEOUT = 5
+
+
+async def _structure(pages: list[tuple[int, str]], stats: BatchStats) -> list[tuple[int, Invoice]]:
+    stats.calls += 1
+    return [(page_no, Invoice(page_no=page_no)) for page_no, _ in pages]
+
+
+async def _text(page_no: int, delay: float = 0.0, error: Optional[Exception] = None) -> tuple[int, Optional[str]]:
+    await asyncio.sleep(delay)
+    if error is not None:
+        raise error
+    return page_no, f"page {page_no}"
+
+
+def test_batches_pages_left_in_agent1_together() -> None:
+    async def run() -> list[tuple[int, Optional[Invoice]]]:
+        batcher = PageBatcher(100_000, 10, _structure)
+        return await asyncio.gather(*(batcher.process(_text(page_no)) for page_no in (1, 2, 3)))
+
+    results = asyncio.run(run())
+    assert [page_no for page_no, _ in results] == [1, 2, 3]
+    assert all(invoice.page_no == page_no for page_no, invoice in results)
+
+
+def test_flushes_when_the_last_page_in_agent1_fails() -> None:
+    async def run() -> list:
+        batcher = PageBatcher(100_000, 10, _structure)
+        failing = _text(2, delay=0.05, error=TokenBudgetExceededError(10, 100))
+        tasks = [batcher.process(_text(1)), batcher.process(failing)]
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), TIMEOUT)
+
+    first, second = asyncio.run(run())
+    assert first[0] == 1
+    assert first[1].page_no == 1
+    assert isinstance(second, TokenBudgetExceededError)
+
+
+def test_budget_cut_document_with_batching_completes(monkeypatch: pytest.MonkeyPatch) -> None:
+    lookups = []
+
+    async def get(_namespace: str, _key: str) -> None:
+        # the second page finds the budget used up once its slow cache lookup returns
+        lookups.append(1)
+        await asyncio.sleep(0.05 * (len(lookups) - 1))
+
+    async def agent1(_cls: type, page: PdfPage) -> str:
+        current_usage.get().record([page.page_no], TokenUsage(requests=1, input_tokens=100))
+        return f"page {page.page_no}"
+
+    async def agent2(_cls: type, _content: str, page_no: int) -> Invoice:
+        return Invoice(page_no=page_no)
+
+    monkeypatch.setattr(CacheService, "get", get)
+    monkeypatch.setattr(InvoiceService, "_get_agent1_response", classmethod(agent1))
+    monkeypatch.setattr(InvoiceService, "_get_agent2_response", classmethod(agent2))
+    monkeypatch.setattr(InvoiceService, "agent1", object())
+    monkeypatch.setattr(InvoiceService, "agent2", object())
+    InvoiceService.set_config(InvoiceSeviceConfig(batch_enabled=True, token_budget=10))
+
+    async def pages() -> AsyncIterator[PdfPage]:
+        for page_no in (1, 2):
+            yield PdfPage(page_no=page_no, data=b"page")
+
+    async def run(usage: DocumentUsage) -> list[tuple[int, Optional[Invoice]]]:
+        return [result async for result in InvoiceService.iter_invoices(pages(), usage)]
+
+    usage = InvoiceService.new_usage()
+    results = asyncio.run(asyncio.wait_for(run(usage), TIMEOUT))
+    assert sorted(page_no for page_no, _ in results) == [1, 2]
+    assert 2 in usage.skipped_pages
+
+
+def _recording_structure(batches: list[list[int]]) -> Callable:
+    async def structure(pages: list[tuple[int, str]], stats: BatchStats) -> list[tuple[int, Invoice]]:
+        batches.append([page_no for page_no, _ in pages])
+        return await _structure(pages, stats)
+
+    return structure
+
+
+def test_batch_is_sent_once_max_pages_is_reached() -> None:
+    batches = []
+
+    async def run() -> None:
+        batcher = PageBatcher(100_000, 2, _recording_structure(batches))
+        await asyncio.gather(*(batcher.process(_text(page_no, delay=0.01 * page_no)) for page_no in range(1, 6)))
+
+    asyncio.run(run())
+    assert batches == [[1, 2], [3, 4], [5]]
+
+
+def test_page_over_the_token_budget_starts_a_new_batch() -> None:
+    batches = []
+    long_text = "x" * 4000
+
+    async def text(page_no: int) -> tuple[int, str]:
+        return page_no, long_text
+
+    async def run() -> None:
+        budget = CALL_OVERHEAD_TOKENS + page_tokens(long_text) + 1
+        batcher = PageBatcher(budget, 10, _recording_structure(batches))
+        await asyncio.gather(*(batcher.process(text(page_no)) for page_no in (1, 2)))
+
+    asyncio.run(run())
+    assert batches == [[1], [2]]
+
+
+def test_pages_without_invoice_content_skip_the_batch() -> None:
+    batches = []
+
+    async def no_invoice(page_no: int) -> tuple[int, None]:
+        return page_no, None
+
+    async def run() -> list[tuple[int, Optional[Invoice]]]:
+        batcher = PageBatcher(100_000, 10, _recording_structure(batches))
+        return await asyncio.gather(batcher.process(_text(1)), batcher.process(no_invoice(2)))
+
+    results = asyncio.run(run())
+    assert results[1] == (2, None)
+    assert batches == [[1]]
+
+
+def test_failed_batch_fails_every_page_in_it() -> None:
+    async def failing(_pages: list[tuple[int, str]], _stats: BatchStats) -> list[tuple[int, Invoice]]:
+        raise ValueError("batch failed")
+
+    async def run() -> list:
+        batcher = PageBatcher(100_000, 10, failing)
+        tasks = [batcher.process(_text(page_no)) for page_no in (1, 2)]
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), TIMEOUT)
+
+    assert [str(result) for result in asyncio.run(run())] == ["batch failed", "batch failed"]
+
+
+def test_batch_missing_a_page_is_split_until_it_validates(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+
+    async def batch_response(_cls: type, pages: list[tuple[int, str]], _stats: BatchStats) -> list[Invoice]:
+        calls.append([page_no for page_no, _ in pages])
+        # the model drops the last page of any batch larger than two
+        kept = pages[:-1] if len(pages) > 2 else pages
+        return [Invoice(page_no=page_no) for page_no, _ in kept]
+
+    monkeypatch.setattr(InvoiceService, "_get_agent2_batch_response", classmethod(batch_response))
+    pages = [(page_no, f"page {page_no}") for page_no in (1, 2, 3, 4)]
+    stats = BatchStats()
+
+    results = asyncio.run(InvoiceService._get_invoice_batch(pages, stats))
+
+    assert sorted(page_no for page_no, _ in results) == [1, 2, 3, 4]
+    assert calls == [[1, 2, 3, 4], [1, 2], [3, 4]]
+    assert (stats.calls, stats.batches, stats.splits) == (3, 2, 1)
+
+
+def test_text_layer_pages_are_batched_together(monkeypatch: pytest.MonkeyPatch) -> None:
+    batches = []
+
+    async def batch_response(_cls: type, pages: list[tuple[int, str]], _stats: BatchStats) -> list[Invoice]:
+        batches.append([page_no for page_no, _ in pages])
+        return [Invoice(page_no=page_no) for page_no, _ in pages]
+
+    async def get(_namespace: str, _key: str) -> None:
+        return None
+
+    async def set_(_namespace: str, _key: str, _value: bytes) -> None:
+        return None
+
+    monkeypatch.setattr(CacheService, "get", get)
+    monkeypatch.setattr(CacheService, "set", set_)
+    monkeypatch.setattr(InvoiceService, "_get_agent2_batch_response", classmethod(batch_response))
+    monkeypatch.setattr(InvoiceService, "agent1", object())
+    monkeypatch.setattr(InvoiceService, "agent2", object())
+    InvoiceService.set_config(InvoiceSeviceConfig(batch_enabled=True))
+
+    async def pages() -> AsyncIterator[PdfPage]:
+        # text layer pages have their text without suspending, like the pages read by Pdf2ImgService.text_pages
+        for page_no in range(1, 7):
+            yield PdfPage(page_no=page_no, data=b"", media_type="text/plain", text=f"invoice {page_no}")
+
+    async def run() -> list[tuple[int, Optional[Invoice]]]:
+        return [result async for result in InvoiceService.iter_invoices(pages())]
+
+    results = asyncio.run(asyncio.wait_for(run(), TIMEOUT))
+    assert sorted(page_no for page_no, _ in results) == [1, 2, 3, 4, 5, 6]
+    assert batches == [[1, 2, 3, 4, 5, 6]]
@@ -0,0 +1,79 @@
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+from service.cache import CacheService
+from service.invoice import InvoiceService
+from service.invoice.service import AGENT1_CACHE, AGENT2_CACHE, InvoiceSeviceConfig
+from service.page_filter import PageFilterConfig
+from service.pdf2img import Pdf2ImgConfig, Pdf2ImgService, PdfPage
+
+DOCUMENT_HASH = "0" * 64
+
+
+@pytest.fixture
+def cache_lookups(monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, str]]:
+    lookups = []
+
+    async def get(namespace: str, key: str) -> bytes:
+        lookups.append((namespace, key))
+        return b'{"page_no": 1}'
+
+    monkeypatch.setattr(CacheService, "get", get)
+    return lookups
+
+
+def _document_key(config: InvoiceSeviceConfig, pdf2img_config: Pdf2ImgConfig) -> str:
+    InvoiceService.set_config(config)
+    Pdf2ImgService.set_config(pdf2img_config)
+    return InvoiceService.document_key(DOCUMENT_HASH)
+
+
+def _agent1_key(config: InvoiceSeviceConfig, cache_lookups: list[tuple[str, str]]) -> str:
+    InvoiceService.set_config(config)
+    asyncio.run(InvoiceService._get_page_content(PdfPage(page_no=1, data=b"page image")))
+    namespace, key = cache_lookups.pop()
+    assert namespace == AGENT1_CACHE
+    return key
+
+
+def _agent2_key(config: InvoiceSeviceConfig, cache_lookups: list[tuple[str, str]]) -> str:
+    InvoiceService.set_config(config)
+    asyncio.run(InvoiceService._get_invoice('{"page_no": 1}', 1))
+    namespace, key = cache_lookups.pop()
+    assert namespace == AGENT2_CACHE
+    return key
+
+
+def test_agent_keys_follow_the_model_the_agents_run_on(cache_lookups: list[tuple[str, str]]) -> None:
+    config = InvoiceSeviceConfig(model1_name="model-a", model2_name="model-b")
+    agent1_key = _agent1_key(config, cache_lookups)
+    # agent1 runs on model2_name, renaming the unused model keeps its results
+    assert _agent1_key(replace(config, model1_name="model-c"), cache_lookups) == agent1_key
+    assert _agent1_key(replace(config, model2_name="model-c"), cache_lookups) != agent1_key
+    agent2_key = _agent2_key(config, cache_lookups)
+    assert _agent2_key(replace(config, model2_name="model-c"), cache_lookups) != agent2_key
+
+
+def test_document_key_is_stable() -> None:
+    assert _document_key(InvoiceSeviceConfig(), Pdf2ImgConfig()) == _document_key(
+        InvoiceSeviceConfig(), Pdf2ImgConfig(poppler_path="/opt/poppler", worker_count=4)
+    )
+
+
+@pytest.mark.parametrize(
+    ("config", "pdf2img_config"),
+    [
+        (InvoiceSeviceConfig(model2_name="other-model"), Pdf2ImgConfig()),
+        (InvoiceSeviceConfig(batch_enabled=True), Pdf2ImgConfig()),
+        (InvoiceSeviceConfig(), Pdf2ImgConfig(text_layer=True)),
+        (InvoiceSeviceConfig(), Pdf2ImgConfig(max_width=800)),
+        (InvoiceSeviceConfig(), Pdf2ImgConfig(page_filter=PageFilterConfig(duplicates=True))),
+        (InvoiceSeviceConfig(), Pdf2ImgConfig(encoding=replace(Pdf2ImgConfig().encoding, fmt="jpeg"))),
+    ],
+)
+def test_document_key_changes_with_the_output_settings(
+    config: InvoiceSeviceConfig, pdf2img_config: Pdf2ImgConfig
+) -> None:
+    assert _document_key(config, pdf2img_config) != _document_key(InvoiceSeviceConfig(), Pdf2ImgConfig())
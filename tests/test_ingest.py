@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import os
+import time
+import zipfile
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from service import ingest
+from service.ingest import (
+    MAX_PENDING_WRITES,
+    IngestConfig,
+    IngestFormDataParser,
+    IngestService,
+    IngestStream,
+    extract_archive,
+)
+
+CHUNK_BYTES = 64 * 1024
+DOCUMENT = b"%PDF-1.4\n" + os.urandom(1024 * 1024 + 17)
+
+
+async def _upload(stream: IngestStream, data: bytes) -> Path:
+    for offset in range(0, len(data), CHUNK_BYTES):
+        stream.write(data[offset : offset + CHUNK_BYTES])
+    stream.seek(0)
+    return await stream.persist()
+
+
+@pytest.mark.parametrize("spool_bytes", [0, CHUNK_BYTES, 4 * 1024 * 1024])
+def test_upload_is_written_whole(tmp_path: Path, spool_bytes: int) -> None:
+    stream = IngestStream(tmp_path / "document.pdf", 0, spool_bytes)
+
+    path = asyncio.run(_upload(stream, DOCUMENT))
+
+    assert path.read_bytes() == DOCUMENT
+    assert stream.sha256 == hashlib.sha256(DOCUMENT).hexdigest()
+    assert stream.size == len(DOCUMENT)
+
+
+def test_body_is_read_no_faster_than_the_upload_is_written(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    write_all = ingest._write_all
+
+    def slow_write_all(fd: int, data: bytes, offset: int) -> None:
+        time.sleep(0.002)
+        write_all(fd, data, offset)
+
+    monkeypatch.setattr(ingest, "_write_all", slow_write_all)
+    monkeypatch.setattr(IngestService, "config", IngestConfig(upload_dir=tmp_path), raising=False)
+    parser = IngestFormDataParser()
+    head = b'--boundary\r\nContent-Disposition: form-data; name="document"; filename="document.pdf"\r\n\r\n'
+    multipart = head + DOCUMENT + b"\r\n--boundary--\r\n"
+    pending = []
+
+    async def body() -> AsyncIterator[bytes]:
+        for offset in range(0, len(multipart), 8 * 1024):
+            if parser._stream is not None:
+                pending.append(len(parser._stream._writes))
+            yield multipart[offset : offset + 8 * 1024]
+
+    async def upload() -> Path:
+        _, files = await parser.parse(body(), "multipart/form-data", len(multipart), {"boundary": "boundary"})
+        return await files["document"].stream.persist()
+
+    path = asyncio.run(upload())
+
+    assert path.read_bytes() == DOCUMENT
+    assert max(pending) <= MAX_PENDING_WRITES + 1
+
+
+def test_upload_larger_than_max_bytes_is_removed(tmp_path: Path) -> None:
+    target = tmp_path / "document.pdf"
+    stream = IngestStream(target, 256 * 1024, 0)
+
+    async def upload() -> None:
+        with pytest.raises(RequestEntityTooLarge):
+            await _upload(stream, DOCUMENT)
+        # the file is closed once the writes already started are done
+        await asyncio.sleep(0.1)
+
+    asyncio.run(upload())
+
+    assert not target.exists()
+    assert stream._file.closed
+
+
+def test_upload_without_pdf_header_is_rejected(tmp_path: Path) -> None:
+    target = tmp_path / "document.pdf"
+    stream = IngestStream(target, 0, 0)
+
+    with pytest.raises(UnsupportedMediaType):
+        asyncio.run(_upload(stream, b"hello world" * 500))
+
+    assert not target.exists()
+
+
+def _archive(path: Path, members: dict[str, bytes]) -> Path:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return path
+
+
+def test_archive_documents_are_extracted_in_order(tmp_path: Path) -> None:
+    members = {"b/second.pdf": b"%PDF-2", "a/first.pdf": b"%PDF-1", "__MACOSX/._first.pdf": b"", "notes.txt": b""}
+    archive = _archive(tmp_path / "batch.zip", members)
+    target_dir = tmp_path / "extracted"
+    target_dir.mkdir()
+
+    documents = extract_archive(archive, target_dir, 0, 0)
+
+    assert [document.filename for document in documents] == ["b/second.pdf", "a/first.pdf"]
+    assert [document.path.name for document in documents] == ["0000_second.pdf", "0001_first.pdf"]
+
+
+@pytest.mark.parametrize(
+    ("max_bytes", "max_documents", "max_total_bytes"), [(1024, 0, 0), (0, 2, 0), (0, 0, 2 * 1024 + 512)]
+)
+def test_archive_over_a_limit_leaves_nothing_behind(
+    tmp_path: Path, max_bytes: int, max_documents: int, max_total_bytes: int
+) -> None:
+    # highly compressible members, the archive itself stays small however large they inflate
+    members = {"small.pdf": b"%PDF-1"} | {f"{index}.pdf": b"%PDF-" + b"0" * 2043 for index in range(3)}
+    archive = _archive(tmp_path / "batch.zip", members)
+    target_dir = tmp_path / "extracted"
+    target_dir.mkdir()
+
+    with pytest.raises(RequestEntityTooLarge):
+        extract_archive(archive, target_dir, max_bytes, max_documents, max_total_bytes)
+
+    assert list(target_dir.iterdir()) == []
@@ -0,0 +1,42 @@
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Optional
+
+import pytest
+
+from service.invoice import Invoice, InvoiceService
+from service.invoice.service import InvoiceSeviceConfig
+from service.pdf2img import PdfPage
+
+TIMEOUT = 5
+
+
+def test_renderer_is_held_back_while_pages_are_in_flight(monkeypatch: pytest.MonkeyPatch) -> None:
+    pulled: list[int] = []
+
+    async def process_page(_cls: type, page: PdfPage) -> tuple[int, Optional[Invoice]]:
+        return page.page_no, None
+
+    monkeypatch.setattr(InvoiceService, "_process_page", classmethod(process_page))
+    monkeypatch.setattr(InvoiceService, "agent1", object())
+    monkeypatch.setattr(InvoiceService, "agent2", object())
+    InvoiceService.set_config(InvoiceSeviceConfig(max_pages_in_flight=2))
+
+    async def pages() -> AsyncIterator[PdfPage]:
+        for page_no in range(1, 9):
+            pulled.append(page_no)
+            yield PdfPage(page_no=page_no, data=b"page")
+
+    async def run() -> list[int]:
+        ahead = []
+        consumed = 0
+        async for _ in InvoiceService.iter_invoices(pages()):
+            consumed += 1
+            # the consumer is slow, the renderer may not run away from it meanwhile
+            await asyncio.sleep(0.01)
+            ahead.append(len(pulled) - consumed)
+        return ahead
+
+    ahead = asyncio.run(asyncio.wait_for(run(), TIMEOUT))
+    assert len(ahead) == 8
+    assert max(ahead) <= 2
@@ -0,0 +1,151 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from werkzeug.exceptions import ServiceUnavailable
+
+from service import InvoiceService, JobService, Pdf2ImgService
+from service.invoice import Invoice, InvoiceData
+from service.invoice.service import InvoiceSeviceConfig
+from service.jobs import Job, JobConfig, JobStatus, PageStatus
+
+RETENTION = 60
+
+
+@pytest.fixture(autouse=True)
+def _job_service(monkeypatch: pytest.MonkeyPatch) -> None:
+    config = JobConfig(queue_size=2, worker_count=1, retention_seconds=RETENTION, cleanup_temp_files=False)
+    monkeypatch.setattr(JobService, "config", config, raising=False)
+    monkeypatch.setattr(JobService, "jobs", {})
+    monkeypatch.setattr(JobService, "_queue", None)
+    monkeypatch.setattr(JobService, "_workers", [])
+
+
+def _finished(age: float) -> Job:
+    job = Job(document_path=Path("done.pdf"), filename="done.pdf", status=JobStatus.COMPLETED)
+    job.finished_at = datetime.now(tz=timezone.utc) - timedelta(seconds=age)
+    JobService.jobs[job.job_id] = job
+    return job
+
+
+def test_finished_jobs_are_evicted_after_the_retention() -> None:
+    expired, recent = _finished(RETENTION + 1), _finished(RETENTION - 10)
+    running = Job(document_path=Path("running.pdf"), filename="running.pdf", status=JobStatus.RUNNING)
+    JobService.jobs[running.job_id] = running
+
+    async def run() -> Job:
+        JobService._queue = asyncio.Queue(maxsize=JobService.config.queue_size)
+        return await JobService.submit(Path("new.pdf"), "new.pdf")
+
+    job = asyncio.run(run())
+
+    assert set(JobService.jobs) == {recent.job_id, running.job_id, job.job_id}
+    assert expired.job_id not in JobService.jobs
+
+
+def test_submit_beyond_the_queue_size_is_rejected() -> None:
+    async def run() -> None:
+        JobService._queue = asyncio.Queue(maxsize=JobService.config.queue_size)
+        for index in range(JobService.config.queue_size):
+            await JobService.submit(Path(f"{index}.pdf"), f"{index}.pdf")
+        with pytest.raises(ServiceUnavailable):
+            await JobService.submit(Path("extra.pdf"), "extra.pdf")
+
+    asyncio.run(run())
+    assert len(JobService.jobs) == JobService.config.queue_size
+
+
+def test_rejected_job_leaves_no_upload_behind(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(JobService, "config", JobConfig(queue_size=1, cleanup_temp_files=True))
+    queued, rejected = tmp_path / "queued.pdf", tmp_path / "rejected.pdf"
+    queued.write_bytes(b"%PDF-")
+    rejected.write_bytes(b"%PDF-")
+
+    async def run() -> None:
+        JobService._queue = asyncio.Queue(maxsize=JobService.config.queue_size)
+        await JobService.submit(queued, queued.name)
+        with pytest.raises(ServiceUnavailable):
+            await JobService.submit(rejected, rejected.name)
+
+    asyncio.run(run())
+    assert queued.exists()
+    assert not rejected.exists()
+
+
+def _patch_pipeline(monkeypatch: pytest.MonkeyPatch, error: Optional[Exception] = None) -> None:
+    async def page_count(_cls: type, _pdf_path: Path) -> int:
+        return 2
+
+    async def iter_pages(_cls: type, _pdf_path: Path) -> AsyncIterator[None]:
+        return
+        yield
+
+    async def run_pages(
+        _cls: type, _pages: object, _key: Optional[str], on_page: Callable[[int, Optional[Invoice]], None], **_: object
+    ) -> InvoiceData:
+        on_page(1, Invoice(page_no=1))
+        if error is not None:
+            raise error
+        on_page(2, None)
+        return InvoiceData(details=[Invoice(page_no=1)])
+
+    monkeypatch.setattr(Pdf2ImgService, "page_count", classmethod(page_count))
+    monkeypatch.setattr(Pdf2ImgService, "iter_pages", classmethod(iter_pages))
+    monkeypatch.setattr(InvoiceService, "run_pages", classmethod(run_pages))
+    InvoiceService.set_config(InvoiceSeviceConfig())
+
+
+async def _run_job_without_shutdown() -> Job:
+    await JobService.start()
+    job = await JobService.submit(Path("document.pdf"), "document.pdf")
+    await asyncio.wait_for(JobService._queue.join(), 5)
+    return job
+
+
+async def _run_job() -> Job:
+    try:
+        return await _run_job_without_shutdown()
+    finally:
+        await JobService.shutdown()
+
+
+def test_worker_runs_a_job_to_completion(monkeypatch: pytest.MonkeyPatch) -> None:
+    _patch_pipeline(monkeypatch)
+
+    job = asyncio.run(_run_job())
+
+    assert job.status is JobStatus.COMPLETED
+    assert job.page_count == 2
+    assert job.pages == {1: PageStatus.EXTRACTED, 2: PageStatus.NO_INVOICE}
+    assert job.result.details[0].page_no == 1
+    assert job.finished_at is not None
+
+
+def test_failed_job_keeps_its_error_and_pages(monkeypatch: pytest.MonkeyPatch) -> None:
+    _patch_pipeline(monkeypatch, RuntimeError("model went away"))
+
+    job = asyncio.run(_run_job())
+
+    assert job.status is JobStatus.FAILED
+    assert job.error == "model went away"
+    assert job.pages == {1: PageStatus.EXTRACTED}
+    assert job.finished_at is not None
+
+
+def test_job_failing_to_start_leaves_the_worker_running(monkeypatch: pytest.MonkeyPatch) -> None:
+    _patch_pipeline(monkeypatch)
+    InvoiceService.config = None
+
+    async def run() -> tuple[Job, bool]:
+        job = await _run_job_without_shutdown()
+        alive = not JobService._workers[0].done()
+        await JobService.shutdown()
+        return job, alive
+
+    job, alive = asyncio.run(run())
+
+    assert job.status is JobStatus.FAILED
+    assert alive
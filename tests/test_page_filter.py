@@ -0,0 +1,82 @@
+import io
+from typing import Optional
+
+import numpy as np
+from PIL import Image as PILImage
+from PIL import ImageDraw, ImageFont
+
+from service.image_encoding import ImageEncoding
+from service.page_filter import PageFilter, PageFilterConfig, PageFilterStats
+from service.pdf2img import encode_page
+
+
+def _invoice_page(invoice_number: str, amount: str) -> PILImage.Image:
+    """A page of one invoice template, only the invoice number and the amount differ between pages."""
+    image = PILImage.new("RGB", (850, 1100), "white")
+    draw = ImageDraw.Draw(image)
+    draw.font = ImageFont.load_default(size=20)
+    draw.rectangle((50, 50, 800, 150), outline="black", width=3)
+    draw.text((70, 80), "ACME FREIGHT LTD - TAX INVOICE", fill="black")
+    draw.text((70, 200), f"Invoice number: {invoice_number}", fill="black")
+    for row in range(10):
+        y = 300 + row * 40
+        draw.line((50, y, 800, y), fill="black", width=1)
+        draw.text((70, y + 10), f"Freight charge line {row + 1}", fill="black")
+    draw.text((600, 750), f"Total: {amount}", fill="black")
+    return image
+
+
+def _rescanned(image: PILImage.Image) -> PILImage.Image:
+    """The page printed and scanned again, a little darker, with less contrast and sensor noise."""
+    pixels = np.asarray(image, dtype=np.float32) * 0.9 - 15
+    pixels += np.random.default_rng(7).normal(0, 20, pixels.shape)
+    return PILImage.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def _reencoded(image: PILImage.Image) -> PILImage.Image:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=60)
+    return PILImage.open(io.BytesIO(buffer.getvalue()))
+
+
+def _check(page_filter: PageFilter, page_no: int, image: PILImage.Image) -> Optional[str]:
+    page = encode_page(page_no, image, ImageEncoding(), None, signatures=True)
+    return page_filter.check(page_no, page.signature)
+
+
+def test_distinct_pages_of_one_template_are_kept() -> None:
+    stats = PageFilterStats()
+    page_filter = PageFilter(PageFilterConfig(blank=True, duplicates=True), stats)
+    pages = [_invoice_page(f"INV-2022-{number:04}", f"{number * 137.5:.2f}") for number in range(1, 8)]
+
+    reasons = [_check(page_filter, page_no, image) for page_no, image in enumerate(pages, start=1)]
+
+    assert reasons == [None] * 7
+    assert stats.duplicate == 0
+    assert stats.near_duplicate == 6
+
+
+def test_page_changed_in_its_number_only_is_kept() -> None:
+    page_filter = PageFilter(PageFilterConfig(duplicates=True), PageFilterStats())
+
+    assert _check(page_filter, 1, _invoice_page("INV-2022-0001", "137.50")) is None
+    assert _check(page_filter, 2, _invoice_page("INV-2022-0008", "137.50")) is None
+
+
+def test_rescanned_and_reencoded_copies_are_duplicates() -> None:
+    stats = PageFilterStats()
+    page_filter = PageFilter(PageFilterConfig(duplicates=True), stats)
+    image = _invoice_page("INV-2022-0001", "137.50")
+
+    assert _check(page_filter, 1, image) is None
+    assert _check(page_filter, 2, _invoice_page("INV-2022-0002", "275.00")) is None
+    assert _check(page_filter, 3, _rescanned(image)) == "duplicate of page 1"
+    assert _check(page_filter, 4, _reencoded(image)) == "duplicate of page 1"
+    assert stats.duplicate == 2
+
+
+def test_blank_page_is_flagged() -> None:
+    page_filter = PageFilter(PageFilterConfig(blank=True), PageFilterStats())
+
+    assert _check(page_filter, 1, PILImage.new("RGB", (850, 1100), "white")) == "blank page"
+    assert _check(page_filter, 2, _invoice_page("INV-2022-0001", "137.50")) is None
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from service.executors import ExecutorService
+from service.pdf2img import Pdf2ImgConfig, Pdf2ImgService, PdfPage, RenderJob, dpi_segments, split_pages
+
+
+def test_split_pages_covers_the_range_in_order() -> None:
+    assert split_pages(1, 10, 4) == [(1, 4), (5, 8), (9, 10)]
+    assert split_pages(3, 5, 0) == [(3, 5)]
+
+
+def test_dpi_segments_break_on_dpi_changes_and_skipped_pages() -> None:
+    dpis = [150.0, 150.0, 100.0, 100.0, 100.0, 150.0]
+
+    assert dpi_segments(dpis, 1, 6) == [(1, 2, 150.0), (3, 5, 100.0), (6, 6, 150.0)]
+    assert dpi_segments(dpis, 1, 6, frozenset({4})) == [(1, 2, 150.0), (3, 3, 100.0), (5, 5, 100.0), (6, 6, 150.0)]
+
+
+def test_parallel_render_yields_pages_in_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def page_dpis(_cls: type, _pdf_path: str) -> list[float]:
+        return [150.0] * 7
+
+    async def render(job: RenderJob) -> list[PdfPage]:
+        # the later ranges of the document finish first
+        await asyncio.sleep(0.01 * (8 - job.first_page))
+        return [PdfPage(page_no=page_no, data=b"") for page_no in range(job.first_page, job.last_page + 1)]
+
+    def run_cpu(_cls: type, _func: object, job: RenderJob) -> asyncio.Future:
+        return asyncio.ensure_future(render(job))
+
+    monkeypatch.setattr(Pdf2ImgService, "page_dpis", classmethod(page_dpis))
+    monkeypatch.setattr(ExecutorService, "run_cpu", classmethod(run_cpu))
+    Pdf2ImgService.set_config(Pdf2ImgConfig(worker_count=3))
+
+    async def run() -> list[int]:
+        return [page.page_no async for page in Pdf2ImgService._iter_pages_parallel("document.pdf", None)]
+
+    assert asyncio.run(run()) == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_parallel_render_leaves_out_text_layer_pages(monkeypatch: pytest.MonkeyPatch) -> None:
+    jobs = []
+
+    async def page_dpis(_cls: type, _pdf_path: str) -> list[float]:
+        return [150.0] * 6
+
+    def run_cpu(_cls: type, _func: object, job: RenderJob) -> asyncio.Future:
+        jobs.append((job.first_page, job.last_page))
+        future = asyncio.get_running_loop().create_future()
+        future.set_result([PdfPage(page_no=page_no, data=b"") for page_no in range(job.first_page, job.last_page + 1)])
+        return future
+
+    monkeypatch.setattr(Pdf2ImgService, "page_dpis", classmethod(page_dpis))
+    monkeypatch.setattr(ExecutorService, "run_cpu", classmethod(run_cpu))
+    Pdf2ImgService.set_config(Pdf2ImgConfig(worker_count=2))
+
+    async def run() -> list[int]:
+        pages = Pdf2ImgService._iter_pages_parallel("document.pdf", None, frozenset({2, 5}))
+        return [page.page_no async for page in pages]
+
+    assert asyncio.run(run()) == [1, 3, 4, 6]
+    assert jobs == [(1, 1), (3, 3), (4, 4), (6, 6)]
+
+
+def test_parallel_render_keeps_worker_count_jobs_ahead(monkeypatch: pytest.MonkeyPatch) -> None:
+    jobs, running, most_running = [], set(), []
+
+    async def page_dpis(_cls: type, _pdf_path: str) -> list[float]:
+        return [150.0] * 7
+
+    async def render(job: RenderJob) -> list[PdfPage]:
+        running.add(job.first_page)
+        most_running.append(len(running))
+        await asyncio.sleep(0.01)
+        running.discard(job.first_page)
+        return [PdfPage(page_no=page_no, data=b"") for page_no in range(job.first_page, job.last_page + 1)]
+
+    def run_cpu(_cls: type, _func: object, job: RenderJob) -> asyncio.Future:
+        jobs.append((job.first_page, job.last_page))
+        return asyncio.ensure_future(render(job))
+
+    monkeypatch.setattr(Pdf2ImgService, "page_dpis", classmethod(page_dpis))
+    monkeypatch.setattr(ExecutorService, "run_cpu", classmethod(run_cpu))
+    Pdf2ImgService.set_config(Pdf2ImgConfig(worker_count=2, max_pages_in_memory=2))
+
+    async def run() -> list[int]:
+        return [page.page_no async for page in Pdf2ImgService._iter_pages_parallel("document.pdf", None)]
+
+    assert asyncio.run(run()) == [1, 2, 3, 4, 5, 6, 7]
+    assert jobs == [(1, 2), (3, 4), (5, 6), (7, 7)]
+    assert max(most_running) == 2
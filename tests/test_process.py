@@ -0,0 +1,51 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from pathlib import Path
+
+import pytest
+
+from blueprints.process import _release_with_request
+from service import AdmissionService, InvoiceService, Pdf2ImgService
+from service.admission import AdmissionConfig, AdmissionStats
+from service.invoice.scheduler import FairScheduler
+
+
+@pytest.fixture(autouse=True)
+def _admission_service(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def page_count(_cls: type, _pdf_path: Path) -> int:
+        return 5
+
+    monkeypatch.setattr(Pdf2ImgService, "page_count", classmethod(page_count))
+    monkeypatch.setattr(InvoiceService, "scheduler", FairScheduler(capacity=1))
+    monkeypatch.setattr(AdmissionService, "config", AdmissionConfig(max_inflight_pages=10), raising=False)
+    monkeypatch.setattr(AdmissionService, "stats", AdmissionStats())
+    monkeypatch.setattr(AdmissionService, "inflight_pages", 0)
+    monkeypatch.setattr(AdmissionService, "inflight_documents", 0)
+
+
+def test_stream_never_consumed_releases_its_admission(tmp_path: Path) -> None:
+    uploaded_path = tmp_path / "document.pdf"
+    uploaded_path.write_bytes(b"%PDF-")
+
+    async def handle_request() -> AsyncGenerator[bytes, None]:
+        admission = await AdmissionService.admit(uploaded_path)
+        _release_with_request(admission, uploaded_path, cleanup=True)
+
+        async def records() -> AsyncGenerator[bytes, None]:
+            try:
+                yield b"{}\n"
+            finally:
+                admission.release()
+
+        return records()
+
+    async def run() -> None:
+        # the client is gone before the response is sent, the body is dropped without being started
+        await asyncio.create_task(handle_request())
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    assert AdmissionService.inflight_pages == 0
+    assert AdmissionService.inflight_documents == 0
+    assert not uploaded_path.exists()
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from service.invoice.scheduler import FairScheduler
+
+
+async def _call(scheduler: FairScheduler, document_id: str, order: list[str], release: asyncio.Event) -> None:
+    async with scheduler.slot(document_id):
+        order.append(document_id)
+        await release.wait()
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_freed_slots_go_round_robin_over_documents() -> None:
+    async def run() -> list[str]:
+        scheduler = FairScheduler(capacity=1)
+        order: list[str] = []
+        release = asyncio.Event()
+        # the large document queues all its calls before the small ones arrive
+        tasks = [asyncio.create_task(_call(scheduler, "large", order, release)) for _ in range(4)]
+        await _settle()
+        tasks += [asyncio.create_task(_call(scheduler, name, order, release)) for name in ("small", "tiny")]
+        await _settle()
+        release.set()
+        await asyncio.gather(*tasks)
+        assert scheduler.in_use == 0
+        assert scheduler.queue_depth == 0
+        return order
+
+    assert asyncio.run(run()) == ["large", "large", "small", "tiny", "large", "large"]
+
+
+def test_cancelled_waiter_gives_up_its_place() -> None:
+    async def run() -> None:
+        scheduler = FairScheduler(capacity=1)
+        order: list[str] = []
+        release = asyncio.Event()
+        holder = asyncio.create_task(_call(scheduler, "a", order, release))
+        await _settle()
+        cancelled = asyncio.create_task(_call(scheduler, "b", order, release))
+        waiting = asyncio.create_task(_call(scheduler, "c", order, release))
+        await _settle()
+        assert scheduler.snapshot()["waiting_documents"] == 2
+
+        cancelled.cancel()
+        await _settle()
+        assert scheduler.snapshot()["waiting_documents"] == 1
+
+        release.set()
+        await asyncio.gather(holder, waiting)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert order == ["a", "c"]
+        assert scheduler.in_use == 0
+
+    asyncio.run(run())
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on() -> None:
+    async def run() -> None:
+        scheduler = FairScheduler(capacity=1)
+        await scheduler.acquire("a")
+        handed = asyncio.create_task(scheduler.acquire("b"))
+        waiting = asyncio.create_task(scheduler.acquire("c"))
+        await _settle()
+
+        # the slot goes to b, which is cancelled before it resumes
+        scheduler.release()
+        handed.cancel()
+        await _settle()
+
+        assert waiting.done()
+        assert scheduler.in_use == 1
+        scheduler.release()
+        assert scheduler.in_use == 0
+
+    asyncio.run(run())
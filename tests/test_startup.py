@@ -0,0 +1,37 @@
+import builtins
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from library.extensions.startup_extn import StartupExtension
+
+
+@pytest.fixture
+def package(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    root = tmp_path / "timed_package"
+    root.mkdir()
+    (root / "__init__.py").write_text("from . import first\nfrom .second import VALUE\n")
+    (root / "first.py").write_text("import time\n\ntime.sleep(0.02)\n")
+    (root / "second.py").write_text("from timed_package import third\n\nVALUE = 1\n")
+    (root / "third.py").write_text("import time\n\ntime.sleep(0.04)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "timed_package"
+    for name in [name for name in sys.modules if name.split(".")[0] == "timed_package"]:
+        del sys.modules[name]
+
+
+def test_every_module_loaded_by_an_import_is_timed(package: str) -> None:
+    startup = StartupExtension()
+    original_import = builtins.__import__
+
+    startup.import_module(package)
+
+    imports = {name: (own, cumulative) for name, own, cumulative in startup.slowest_imports()}
+    assert set(imports) == {"timed_package.first", "timed_package.second", "timed_package.third"}
+    assert imports["timed_package.third"][0] >= 0.04
+    # second spends its time importing third
+    assert imports["timed_package.second"][0] < 0.02 <= imports["timed_package.second"][1]
+    assert startup.slowest_imports(1)[0][0] == "timed_package.third"
+    assert builtins.__import__ is original_import
@@ -0,0 +1,122 @@
+import fcntl
+import os
+import threading
+import time
+from pathlib import Path
+from typing import IO
+
+import pytest
+
+from service import workspace
+from service.workspace import (
+    WORKERS_AREA,
+    WorkspaceConfig,
+    WorkspaceEntry,
+    WorkspaceService,
+    WorkspaceStats,
+    entry_owner,
+    live_workers,
+    plan_sweep,
+    unique_name,
+)
+
+SIBLING_ID = "5151b1b1"
+DEAD_ID = "dead0000"
+HOUR = 3600
+
+
+def _entry(name: str, age: float, size: int, removable: bool = True) -> WorkspaceEntry:
+    return WorkspaceEntry(path=Path(name), modified=1_000_000 - age, size=size, removable=removable)
+
+
+def _hold_lock(root: Path, worker_id: str) -> IO[bytes]:
+    (root / WORKERS_AREA).mkdir(parents=True, exist_ok=True)
+    lock_file = (root / WORKERS_AREA / worker_id).open("wb")
+    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    return lock_file
+
+
+def _upload(root: Path, name: str, age: float) -> Path:
+    path = root / "pdf" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"%PDF-" + b"0" * 1024)
+    modified = time.time() - age
+    os.utime(path, (modified, modified))
+    return path
+
+
+def test_unique_names_carry_the_worker_id() -> None:
+    assert entry_owner(f"{unique_name('invoice')}.pdf") == workspace._worker_id
+    assert entry_owner(unique_name("invoice_2022")) == workspace._worker_id
+    assert entry_owner("invoice.pdf") is None
+
+
+def test_sweep_plan_leaves_entries_of_live_workers_but_counts_them() -> None:
+    entries = [
+        _entry("own_old", age=3 * HOUR, size=10),
+        _entry("sibling_old", age=3 * HOUR, size=10, removable=False),
+        _entry("own_oldest", age=2 * HOUR, size=50),
+        _entry("sibling_oldest", age=2.5 * HOUR, size=50, removable=False),
+        _entry("own_new", age=HOUR / 2, size=50),
+    ]
+
+    expired = plan_sweep(entries, 1_000_000, max_age=2.75 * HOUR, max_bytes=120, min_age=HOUR)
+
+    assert expired == [Path("own_old"), Path("own_oldest")]
+
+
+def test_lock_files_tell_live_workers_from_dead_ones(tmp_path: Path) -> None:
+    lock_file = _hold_lock(tmp_path, SIBLING_ID)
+    (tmp_path / WORKERS_AREA / DEAD_ID).touch()
+
+    try:
+        assert live_workers(tmp_path, workspace._worker_id) == {SIBLING_ID}
+    finally:
+        lock_file.close()
+
+    assert not (tmp_path / WORKERS_AREA / DEAD_ID).exists()
+
+
+def test_worker_lock_removed_by_a_janitor_before_it_was_taken_is_created_again(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(WorkspaceService, "_lock_file", None)
+    lock_path = tmp_path / WORKERS_AREA / workspace._worker_id
+    # the janitor of a sibling found the new lock file unlocked and holds it while removing it
+    janitor = _hold_lock(tmp_path, workspace._worker_id)
+    locking = threading.Thread(target=WorkspaceService._lock_worker, args=(tmp_path,))
+    locking.start()
+    time.sleep(0.05)
+    lock_path.unlink()
+    janitor.close()
+    locking.join(5)
+
+    try:
+        assert live_workers(tmp_path, SIBLING_ID) == {workspace._worker_id}
+        assert os.fstat(WorkspaceService._lock_file.fileno()).st_ino == lock_path.stat().st_ino
+    finally:
+        WorkspaceService._lock_file.close()
+
+
+def test_start_up_sweep_spares_the_uploads_of_live_workers(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(WorkspaceService, "config", WorkspaceConfig(root=tmp_path), raising=False)
+    monkeypatch.setattr(WorkspaceService, "stats", WorkspaceStats())
+    monkeypatch.setattr(WorkspaceService, "_lock_file", None)
+    WorkspaceService._lock_worker(tmp_path)
+    lock_file = _hold_lock(tmp_path, SIBLING_ID)
+    (tmp_path / WORKERS_AREA / DEAD_ID).touch()
+    live = _upload(tmp_path, f"queued_{SIBLING_ID}-0123456789ab.pdf", age=2 * HOUR)
+    orphans = [
+        _upload(tmp_path, f"crashed_{DEAD_ID}-0123456789ab.pdf", age=2 * HOUR),
+        _upload(tmp_path, "unnamed.pdf", age=2 * HOUR),
+        _upload(tmp_path, f"{unique_name('own')}.pdf", age=2 * HOUR),
+    ]
+
+    try:
+        expired = WorkspaceService._sweep(WorkspaceService.config.orphan_age)
+    finally:
+        lock_file.close()
+        WorkspaceService._lock_file.close()
+
+    assert sorted(expired) == sorted(orphans)
+    assert live.exists()